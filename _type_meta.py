@@ -2,12 +2,15 @@ import dataclasses
 from typing import (
         Annotated,
         Any,
+        Callable,
+        ClassVar,
         Generic,
         Iterable,
         Literal,
         Optional,
         TypeAlias,
         TypeVar,
+        Self,
         Union,
         get_args,
         get_origin,
@@ -22,14 +25,19 @@ from pydantic import (
         ConfigDict,
         GetCoreSchemaHandler,
         GetJsonSchemaHandler,
+        SerializationInfo,
         SerializerFunctionWrapHandler,
         TypeAdapter,
         ValidationInfo,
+        model_serializer,
+        model_validator,
         )
 from pydantic.json_schema import JsonSchemaValue
 from pydantic.alias_generators import to_camel
 from pydantic_core import core_schema
 
+import localtime
+
 T = TypeVar('T')
 
 # Adapted from pydantic_core._pydantic_core
@@ -109,6 +117,155 @@ class BaseModel(_BaseModel):
                                        )
 
 
+def _is_list_type(annotation: Any) -> bool:
+    origin = get_origin(annotation) or annotation
+    return isinstance(origin, type) and issubclass(origin, list)
+
+
+class TrackedList(list[T]):
+    # A list field of a DirtyTrackingModel.  Changing the list in place goes
+    # through the model's _change_in_place, so the model is marked dirty just
+    # as if the field had been assigned.  It's pickled and deep-copied as a
+    # plain list, and the model it ends up in tracks it again.
+    _owner: 'DirtyTrackingModel'
+    _name: str
+
+    def __init__(self, owner: 'DirtyTrackingModel', name: str,
+                 items: Iterable[T] = ()) -> None:
+        super().__init__(items)
+        self._owner = owner
+        self._name = name
+
+    def __reduce_ex__(self, protocol: Any) -> Any:
+        return list, (list(self),)
+
+
+def _tracking(name: str) -> Callable[..., Any]:
+    method = getattr(list, name)
+
+    def change(self: TrackedList[Any], *args: Any, **kwargs: Any) -> Any:
+        return self._owner._change_in_place(
+                self._name, lambda: method(self, *args, **kwargs))
+    change.__name__ = name
+    return change
+
+
+for _name in ('append', 'extend', 'insert', 'remove', 'pop', 'clear', 'sort',
+              'reverse', '__setitem__', '__delitem__', '__iadd__', '__imul__'):
+    setattr(TrackedList, _name, _tracking(_name))
+del _name
+
+
+class DirtyTrackingModel(BaseModel):
+    # Keeps the JSON-mode serialization of the model, so serializing a tree
+    # of models where only part has changed only re-serializes the changed
+    # models and their ancestors.  Assigning to a field marks the model dirty,
+    # and so does changing one of its list fields in place, as those are kept
+    # as TrackedLists.  Anything else that changes a model in place needs to
+    # call mark_dirty itself.
+
+    _serialized: Optional[dict[tuple[bool, ...], Any]] = None
+    # Counts changes to this model or anything it contains, so other caches
+    # can tell whether they're still current.
+    _generation: int = 0
+    _list_fields: ClassVar[frozenset[str]] = frozenset()
+
+    @classmethod
+    def __pydantic_init_subclass__(cls, **kwargs: Any) -> None:
+        super().__pydantic_init_subclass__(**kwargs)
+        cls._list_fields = frozenset(
+                name for name, field in cls.model_fields.items()
+                if _is_list_type(field.annotation))
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in type(self).__pydantic_fields__:
+            if name in self._list_fields:
+                self.__dict__[name] = self._tracked(name, self.__dict__[name])
+            self.mark_dirty()
+
+    def __copy__(self) -> Self:
+        # The copy shares its lists with this model; give it its own, so
+        # changing them marks the copy dirty.
+        copy = super().__copy__()
+        copy._track_lists()
+        return copy
+
+    def __deepcopy__(self, memo: Optional[dict[int, Any]] = None) -> Self:
+        copy = super().__deepcopy__(memo)
+        copy._track_lists()
+        return copy
+
+    def __setstate__(self, state: dict[Any, Any]) -> None:
+        super().__setstate__(state)
+        self._track_lists()
+
+    @model_validator(mode='after')
+    def _track_lists(self) -> Self:
+        values = self.__dict__
+        for name in self._list_fields & values.keys():
+            value = values[name]
+            if not (isinstance(value, TrackedList) and value._owner is self):
+                values[name] = self._tracked(name, value)
+        return self
+
+    def _tracked(self, name: str, value: Any) -> Any:
+        # The value to store for the field, for code that writes straight to
+        # __dict__.
+        if name not in self._list_fields or value is None:
+            return value
+        return TrackedList(self, name, value)
+
+    def _change_in_place(self, name: str, change: Callable[[], T]) -> T:
+        # Makes a change to the given list field in place.  Subclasses that
+        # keep anything else up to date when a field is assigned should do
+        # the same here.
+        result = change()
+        self.mark_dirty()
+        return result
+
+    def _serialization_parent(self) -> Optional['DirtyTrackingModel']:
+        # The model whose serialization includes this one, if there is one.
+        return None
+
+    @property
+    def dirty(self) -> bool:
+        return self._serialized is None
+
+    def mark_dirty(self) -> None:
+        model: Optional[DirtyTrackingModel] = self
+        while model is not None:
+            model._serialized = None
+            model._generation += 1
+            model = model._serialization_parent()
+
+    @model_serializer(mode='wrap')
+    def _serialize_cached(self,
+                          handler: SerializerFunctionWrapHandler,
+                          info: SerializationInfo,
+                          ) -> Any:
+        # Only plain JSON-mode dumps are cached: with include or exclude the
+        # output isn't a complete fragment, and Python-mode output is mutable
+        # and contains mutable objects that callers might change.
+        if (info.mode != 'json'
+                or info.include is not None
+                or info.exclude is not None):
+            return handler(self)
+        key = (info.by_alias or False,
+               info.exclude_unset,
+               info.exclude_defaults,
+               info.exclude_none,
+               info.round_trip,
+               )
+        if self._serialized is None:
+            self._serialized = {}
+        try:
+            return self._serialized[key]
+        except KeyError:
+            v = self._serialized[key] = handler(self)
+            return v
+
+
 class IntEnumSchema(IntEnum):
     def __str__(self) -> str:
         return self.name
@@ -217,16 +374,15 @@ class ForbidValue(Generic[T]):
         return core_schema.with_info_after_validator_function(
                 self._check_value,
                 schema=handler(source_type),
-                field_name=handler.field_name,
                 )
 
 
 NotZero = Annotated[T, ForbidValue(0)]
 
 
-def make_datetime_aware(dt: datetime) -> AwareDatetime:
-    if dt.tzinfo is None:
-        return dt.astimezone()
-    return dt
+make_datetime_aware = localtime.make_aware
 
 DatetimeToAware = Annotated[datetime, AfterValidator(make_datetime_aware)]
+# Converts the whole list in one pass, rather than a validator call per item.
+DatetimeListToAware = Annotated[list[datetime],
+                                AfterValidator(localtime.make_all_aware)]
@@ -0,0 +1,240 @@
+import argparse
+import json
+import os
+import struct
+import sys
+import zlib
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator, Optional
+from uuid import UUID
+
+from pydantic import AwareDatetime
+
+import localtime
+from _type_meta import make_datetime_aware
+from task import Task, TaskList
+
+# An archive holds ended subtrees moved out of a task list, so the list
+# itself only has to hold live tasks.  Subtrees are stored as JSON in
+# zlib-compressed chunks of about _CHUNK_SIZE bytes, followed by a compressed
+# index from the UUID of every archived task to its chunk:
+#
+#     _MAGIC, chunk, chunk, ..., index, trailer
+#
+# where the trailer gives the offset and length of the index.  Nothing is
+# read until a task is first looked up, and then only the index and the
+# chunk holding that task are.
+
+_MAGIC = b'ASMARCH1'
+_TRAILER = struct.Struct('<QQ')
+_CHUNK_SIZE = 64 * 1024
+
+
+def _subtree(root: Task) -> Iterator[Task]:
+    to_process = [root]
+    while to_process:
+        task = to_process.pop()
+        yield task
+        to_process.extend(task.children)
+
+
+class Archive:
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        # Offset and length of each chunk, and the chunk each task is in.
+        self._chunks: Optional[list[tuple[int, int]]] = None
+        self._task_chunks: dict[UUID, int] = {}
+        # The UUID of the parent each archived subtree was removed from.
+        self._parents: dict[UUID, Optional[UUID]] = {}
+        self._loaded: dict[UUID, Task] = {}
+        self._loaded_chunks: set[int] = set()
+
+    def _read_index(self) -> list[tuple[int, int]]:
+        if self._chunks is not None:
+            return self._chunks
+        try:
+            f = self.path.open('rb')
+        except FileNotFoundError:
+            self._chunks = []
+            return self._chunks
+        with f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                raise ValueError(f'{self.path} is not a task archive')
+            f.seek(-_TRAILER.size, os.SEEK_END)
+            offset, length = _TRAILER.unpack(f.read(_TRAILER.size))
+            f.seek(offset)
+            index = json.loads(zlib.decompress(f.read(length)))
+        self._task_chunks = {UUID(u): i for u, i in index['tasks'].items()}
+        self._parents = {UUID(u): None if p is None else UUID(p)
+                         for u, p in index['parents'].items()}
+        self._chunks = [(offset, length) for offset, length in index['chunks']]
+        return self._chunks
+
+    def _read_chunk(self, i: int) -> list[dict[str, Any]]:
+        offset, length = self._read_index()[i]
+        with self.path.open('rb') as f:
+            f.seek(offset)
+            return json.loads(zlib.decompress(f.read(length)))
+
+    def __contains__(self, uuid: object) -> bool:
+        self._read_index()
+        return uuid in self._task_chunks
+
+    def __len__(self) -> int:
+        self._read_index()
+        return len(self._task_chunks)
+
+    def uuids(self) -> Iterator[UUID]:
+        self._read_index()
+        return iter(self._task_chunks)
+
+    def parent_of(self, uuid: UUID) -> Optional[UUID]:
+        # The UUID of the task the archived subtree rooted at uuid was
+        # removed from, or None if it was a top-level task.
+        self._read_index()
+        return self._parents[uuid]
+
+    def get(self, uuid: UUID) -> Optional[Task]:
+        self._read_index()
+        try:
+            i = self._task_chunks[uuid]
+        except KeyError:
+            return None
+        if i not in self._loaded_chunks:
+            for subtree in self._read_chunk(i):
+                for task in _subtree(Task.model_validate(subtree['task'])):
+                    self._loaded[task.uuid] = task
+            self._loaded_chunks.add(i)
+        return self._loaded[uuid]
+
+    def add(self, subtrees: list[tuple[Optional[UUID], Task]]) -> None:
+        # Rewrites the archive with the given subtrees, each with the UUID
+        # of the task it's being removed from, added to it.  Existing chunks
+        # are copied across without being decompressed.
+        chunks = self._read_index()
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        new_chunks: list[tuple[int, int]] = []
+        task_chunks = dict(self._task_chunks)
+        parents = dict(self._parents)
+
+        with tmp_path.open('wb') as out:
+            out.write(_MAGIC)
+            if chunks:
+                with self.path.open('rb') as f:
+                    for offset, length in chunks:
+                        f.seek(offset)
+                        new_chunks.append((out.tell(), length))
+                        out.write(f.read(length))
+
+            pending: list[dict[str, Any]] = []
+            pending_size = 0
+
+            def flush() -> None:
+                nonlocal pending, pending_size
+                if pending:
+                    data = zlib.compress(json.dumps(pending).encode())
+                    new_chunks.append((out.tell(), len(data)))
+                    out.write(data)
+                pending = []
+                pending_size = 0
+
+            for parent, root in subtrees:
+                task_json = root.model_dump(mode='json')
+                pending.append({'parent': None if parent is None
+                                else str(parent),
+                                'task': task_json})
+                pending_size += len(json.dumps(task_json))
+                parents[root.uuid] = parent
+                for task in _subtree(root):
+                    task_chunks[task.uuid] = len(new_chunks)
+                if pending_size >= _CHUNK_SIZE:
+                    flush()
+            flush()
+
+            index = zlib.compress(json.dumps({
+                'chunks': new_chunks,
+                'tasks': {str(u): i for u, i in task_chunks.items()},
+                'parents': {str(u): None if p is None else str(p)
+                            for u, p in parents.items()},
+                }).encode())
+            index_offset = out.tell()
+            out.write(index)
+            out.write(_TRAILER.pack(index_offset, len(index)))
+        os.replace(tmp_path, self.path)
+
+        self._chunks = new_chunks
+        self._task_chunks = task_chunks
+        self._parents = parents
+
+
+def _ended_before(root: Task, cutoff: AwareDatetime) -> bool:
+    return all(t.ended is not None and t.ended < cutoff
+               for t in _subtree(root))
+
+
+def compact(tasklist: TaskList, archive: Archive, cutoff: AwareDatetime,
+            ) -> int:
+    # Moves every subtree whose tasks all ended before the cutoff out of the
+    # task list and into the archive, and attaches the archive to the list
+    # so the moved tasks can still be found by UUID.  TaskList.load attaches
+    # an archive at default_archive_path again when the list is next read.
+    # Returns the number of tasks moved.
+    subtrees: list[tuple[Optional[UUID], Task]] = []
+    to_process = list(tasklist.tasks)
+    while to_process:
+        task = to_process.pop()
+        if _ended_before(task, cutoff):
+            subtrees.append((None if task._parent is None
+                             else task._parent.uuid, task))
+        else:
+            to_process.extend(task.children)
+
+    tasklist.attach_archive(archive)
+    if not subtrees:
+        return 0
+    archive.add(subtrees)
+    count = 0
+    for _, task in subtrees:
+        count += sum(1 for _ in _subtree(task))
+        tasklist.remove_task(task)
+    return count
+
+
+def default_archive_path(tasklist_path: Path) -> Path:
+    return tasklist_path.with_name(tasklist_path.name + '.archive')
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+            description='Move long-ended tasks into an archive file')
+    parser.add_argument('tasklist', type=Path)
+    parser.add_argument('--archive', type=Path,
+                        help='Archive file; defaults to the task list path '
+                             'with ".archive" appended')
+    cutoff = parser.add_mutually_exclusive_group()
+    cutoff.add_argument('--before', type=datetime.fromisoformat,
+                        help='Archive tasks that ended before this time')
+    cutoff.add_argument('--older-than', type=int, default=365, metavar='DAYS',
+                        help='Archive tasks that ended more than this many '
+                             'days ago (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    if args.before is not None:
+        when = make_datetime_aware(args.before)
+    else:
+        when = localtime.now() - timedelta(days=args.older_than)
+    archive_path = args.archive or default_archive_path(args.tasklist)
+
+    tasklist = TaskList.model_validate_json(args.tasklist.read_bytes())
+    count = compact(tasklist, Archive(archive_path), when)
+    if count:
+        tmp_path = args.tasklist.with_name(args.tasklist.name + '.tmp')
+        tmp_path.write_text(tasklist.model_dump_json())
+        os.replace(tmp_path, args.tasklist)
+    print(f'Archived {count} tasks to {archive_path}')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
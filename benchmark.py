@@ -0,0 +1,504 @@
+import argparse
+import atexit
+import dataclasses
+import gc
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from datetime import datetime, timedelta
+from itertools import islice
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, Iterator, Optional
+
+import ical
+import localtime
+
+from _type_meta import DirtyTrackingModel
+from columnar import ColumnarTaskList
+from parallel import load_parallel
+from precheck import task_list_validator
+from query import Query
+from ranking import UrgencyRanking
+from scheduler import Scheduler
+from store import TaskStore
+from recurrence import ComplexRecurrence, SimpleRecurrence
+from task import TaskList
+from timedelta import RelativeTime
+from watch import Reloader
+from workload import WorkloadSpec, generate_document
+
+# Benchmarks over a synthetic task list from the workload module.  Each run
+# appends one JSON line to the results file, recording the commit it was run
+# against, so runs can be compared across commits with the "compare"
+# command.
+
+DEFAULT_RESULTS = Path(__file__).parent / '.benchmarks' / 'results.jsonl'
+
+Setup = Callable[['Context'], Callable[[], Any]]
+
+_benchmarks: dict[str, Setup] = {}
+_memory_benchmarks: dict[str, Setup] = {}
+
+
+def benchmark(name: str) -> Callable[[Setup], Setup]:
+    # Registers a benchmark.  The decorated function does any setup and
+    # returns the function to time.
+    def decorator(f: Setup) -> Setup:
+        _benchmarks[name] = f
+        return f
+    return decorator
+
+
+def memory_benchmark(name: str) -> Callable[[Setup], Setup]:
+    # Registers a benchmark of memory rather than time.  The decorated
+    # function returns a function that builds something, and what's measured
+    # is how much memory what it returns keeps hold of.
+    def decorator(f: Setup) -> Setup:
+        _memory_benchmarks[name] = f
+        return f
+    return decorator
+
+
+@dataclasses.dataclass(slots=True)
+class Context:
+    spec: WorkloadSpec
+    document: dict[str, Any]
+    document_json: str
+    tasklist: TaskList
+
+
+def _models(tasklist: TaskList) -> Iterator[DirtyTrackingModel]:
+    yield tasklist
+    yield from tasklist.all_tasks()
+    yield from tasklist.all_task_schedules()
+    yield from tasklist.all_task_templates()
+
+
+def _clear_serialization_caches(tasklist: TaskList) -> None:
+    for model in _models(tasklist):
+        model._serialized = None
+
+
+@benchmark('load.validate_python')
+def _load_validate_python(ctx: Context) -> Callable[[], Any]:
+    return lambda: TaskList.model_validate(ctx.document)
+
+
+@benchmark('load.validate_json')
+def _load_validate_json(ctx: Context) -> Callable[[], Any]:
+    return lambda: TaskList.model_validate_json(ctx.document_json)
+
+
+@benchmark('load.validate_parallel')
+def _load_validate_parallel(ctx: Context) -> Callable[[], Any]:
+    # With a pool that's already running, as a long-lived process would
+    # have.  Only worth comparing with load.validate_python on a machine
+    # with several cores.
+    workers = os.cpu_count() or 1
+    executor = ProcessPoolExecutor(workers)
+    atexit.register(executor.shutdown)
+    return lambda: load_parallel(ctx.document, workers, executor)
+
+
+@benchmark('load.precheck')
+def _load_precheck(ctx: Context) -> Callable[[], Any]:
+    # Checking the raw document against the compiled schema, to compare
+    # with load.validate_python.
+    validator = task_list_validator()
+    return lambda: validator.validate(ctx.document)
+
+
+@benchmark('load.store_snapshot')
+def _load_store_snapshot(ctx: Context) -> Callable[[], Any]:
+    # Reading a snapshot through the store, to compare with
+    # load.validate_json.
+    directory = tempfile.mkdtemp()
+    atexit.register(shutil.rmtree, directory, ignore_errors=True)
+    store = TaskStore(Path(directory) / 'tasks.snapshot')
+    store.save(ctx.tasklist, 0)
+    return store.read
+
+
+@benchmark('load.reload.one_edit')
+def _load_reload_one_edit(ctx: Context) -> Callable[[], Any]:
+    # Reloading after a hand edit to one top-level task, alternating between
+    # two versions of the file.
+    edited = dict(ctx.document)
+    edited['tasks'] = list(ctx.document['tasks'])
+    edited['tasks'][0] = dict(edited['tasks'][0], title='Edited by hand')
+    versions = [json.dumps(ctx.document), json.dumps(edited)]
+    reloader = Reloader()
+    for data in versions:
+        reloader.load(data)
+
+    def run() -> None:
+        for data in versions:
+            reloader.load(data)
+    return run
+
+
+def _strip_offsets(value: Any) -> Any:
+    # The same document with every datetime naive, as in a hand-written
+    # file, so they all need converting to the local timezone.
+    if isinstance(value, dict):
+        return {k: _strip_offsets(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_strip_offsets(v) for v in value]
+    if isinstance(value, str) and 'T' in value:
+        try:
+            dt = datetime.fromisoformat(value)
+        except ValueError:
+            return value
+        return dt.replace(tzinfo=None).isoformat()
+    return value
+
+
+@benchmark('load.validate_python.naive')
+def _load_validate_python_naive(ctx: Context) -> Callable[[], Any]:
+    document = _strip_offsets(ctx.document)
+    return lambda: TaskList.model_validate(document)
+
+
+def _naive_datetimes(ctx: Context) -> list[datetime]:
+    return [ctx.spec.now.replace(tzinfo=None) + timedelta(hours=i)
+            for i in range(10000)]
+
+
+@benchmark('datetime.astimezone')
+def _datetime_astimezone(ctx: Context) -> Callable[[], Any]:
+    # What converting naive datetimes cost before the local timezone was
+    # cached, for comparison with datetime.make_all_aware.
+    dts = _naive_datetimes(ctx)
+    return lambda: [dt.astimezone() for dt in dts]
+
+
+@benchmark('datetime.make_all_aware')
+def _datetime_make_all_aware(ctx: Context) -> Callable[[], Any]:
+    dts = _naive_datetimes(ctx)
+    return lambda: localtime.make_all_aware(dts)
+
+
+@benchmark('dump.python')
+def _dump_python(ctx: Context) -> Callable[[], Any]:
+    return ctx.tasklist.model_dump
+
+
+@benchmark('dump.json.cold')
+def _dump_json_cold(ctx: Context) -> Callable[[], Any]:
+    def run() -> str:
+        _clear_serialization_caches(ctx.tasklist)
+        return ctx.tasklist.model_dump_json()
+    return run
+
+
+@benchmark('dump.json.one_edit')
+def _dump_json_one_edit(ctx: Context) -> Callable[[], Any]:
+    # The deepest task, so the whole path to the root needs re-serializing.
+    task = max(ctx.tasklist.all_tasks(), key=lambda t: _depth(t))
+    ctx.tasklist.model_dump_json()
+
+    def run() -> str:
+        task.title = task.title
+        return ctx.tasklist.model_dump_json()
+    return run
+
+
+def _depth(task: Any) -> int:
+    depth = 0
+    while task._parent is not None:
+        depth += 1
+        task = task._parent
+    return depth
+
+
+@benchmark('export.ical')
+def _export_ical(ctx: Context) -> Callable[[], Any]:
+    # Into a sink that throws the data away, so this is just the time to
+    # generate and encode it.
+    class Sink:
+        def write(self, data: bytes) -> int:
+            return len(data)
+    sink = Sink()
+    return lambda: ical.write(ctx.tasklist, sink, ctx.spec.now)
+
+
+@memory_benchmark('memory.tasklist.models')
+def _memory_models(ctx: Context) -> Callable[[], Any]:
+    return lambda: TaskList.model_validate_json(ctx.document_json)
+
+
+@memory_benchmark('memory.tasklist.columnar')
+def _memory_columnar(ctx: Context) -> Callable[[], Any]:
+    return lambda: ColumnarTaskList.from_document(ctx.document)
+
+
+@benchmark('urgency.rank')
+def _urgency_rank(ctx: Context) -> Callable[[], Any]:
+    tasks = [t for t in ctx.tasklist.all_tasks() if t.state == 'todo']
+    return lambda: sorted(tasks, key=lambda t: t.urgency, reverse=True)
+
+
+@benchmark('urgency.rank.cached')
+def _urgency_rank_cached(ctx: Context) -> Callable[[], Any]:
+    # Successive reads an hour apart, as a long-running view would do.
+    ranking = UrgencyRanking(ctx.tasklist)
+    times = [ctx.spec.now + timedelta(hours=i) for i in range(24)]
+    return lambda: [ranking.ranked(t) for t in times]
+
+
+@benchmark('dependencies.blocked_tasks')
+def _blocked_tasks(ctx: Context) -> Callable[[], Any]:
+    tasks = list(islice(ctx.tasklist.all_tasks(), 100))
+    return lambda: [list(t.blocked_tasks()) for t in tasks]
+
+
+@benchmark('dependencies.blocking_tasks')
+def _blocking_tasks(ctx: Context) -> Callable[[], Any]:
+    tasks = list(islice(ctx.tasklist.all_tasks(), 100))
+    return lambda: [list(t.blocking_tasks()) for t in tasks]
+
+
+def _expansion(ctx: Context, kind: type) -> Callable[[], Any]:
+    schedules = [s.schedule for s in ctx.tasklist.all_task_schedules()
+                 if isinstance(s.schedule, kind)]
+    start = ctx.spec.now
+    end = start + timedelta(days=365)
+    return lambda: [s.between(start, end) for s in schedules]
+
+
+@benchmark('recurrence.simple.between')
+def _simple_expansion(ctx: Context) -> Callable[[], Any]:
+    return _expansion(ctx, SimpleRecurrence)
+
+
+@benchmark('recurrence.complex.between')
+def _complex_expansion(ctx: Context) -> Callable[[], Any]:
+    return _expansion(ctx, ComplexRecurrence)
+
+
+@benchmark('scheduler.pop_due')
+def _scheduler_pop_due(ctx: Context) -> Callable[[], Any]:
+    # Arming every schedule, then a week of firings.
+    schedules = list(ctx.tasklist.all_task_schedules())
+    start = ctx.spec.now
+    end = start + timedelta(days=7)
+    return lambda: Scheduler(schedules, start).pop_due(end)
+
+
+@benchmark('relativetime.from_str')
+def _relative_time_parse(ctx: Context) -> Callable[[], Any]:
+    strings = ['P1D', 'P2W', 'P1Y2M3D', 'PT4H', 'P1DT12H30M', 'P-3D',
+               'PT90S', 'P6M'] * 125
+    return lambda: [RelativeTime.from_str(s) for s in strings]
+
+
+@benchmark('query.run')
+def _query_run(ctx: Context) -> Callable[[], Any]:
+    query = Query('state:todo tag:tag1,tag2 due<+7d')
+    return lambda: query.run(ctx.tasklist, ctx.spec.now)
+
+
+@benchmark('search.titles')
+def _search_titles(ctx: Context) -> Callable[[], Any]:
+    # As-you-type lookups, one per keystroke.
+    ctx.tasklist.title_index
+    typed = 'review budget'
+    queries = [typed[:i] for i in range(1, len(typed) + 1)]
+    return lambda: [ctx.tasklist.search_titles(q) for q in queries]
+
+
+def _time(f: Callable[[], Any], repeat: int, min_time: float,
+          ) -> list[float]:
+    # Runs f at least "repeat" times and for at least min_time seconds in
+    # total, returning the time of each run.
+    times: list[float] = []
+    total = 0.0
+    while len(times) < repeat or total < min_time:
+        start = perf_counter()
+        f()
+        elapsed = perf_counter() - start
+        times.append(elapsed)
+        total += elapsed
+    return times
+
+
+def _retained(f: Callable[[], Any]) -> int:
+    # Bytes allocated by f that are still allocated once its result is all
+    # that's left of them.
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before = tracemalloc.get_traced_memory()[0]
+        result = f()
+        gc.collect()
+        size = tracemalloc.get_traced_memory()[0] - before
+    finally:
+        tracemalloc.stop()
+    del result
+    return size
+
+
+def _git_revision() -> tuple[Optional[str], bool]:
+    cwd = Path(__file__).parent
+    try:
+        revision = subprocess.run(['git', 'rev-parse', 'HEAD'],
+                                  cwd=cwd, capture_output=True, text=True,
+                                  check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain',
+                                 '--untracked-files=no'],
+                                cwd=cwd, capture_output=True, text=True,
+                                check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None, False
+    return revision, bool(status.strip())
+
+
+def run(spec: WorkloadSpec,
+        names: Optional[list[str]] = None,
+        repeat: int = 5,
+        min_time: float = 0.2,
+        ) -> dict[str, Any]:
+    document = generate_document(spec)
+    ctx = Context(spec=spec,
+                  document=document,
+                  document_json=json.dumps(document),
+                  tasklist=TaskList.model_validate(document),
+                  )
+    results: dict[str, dict[str, float | int]] = {}
+    for name, setup in _benchmarks.items():
+        if names and not any(n in name for n in names):
+            continue
+        times = _time(setup(ctx), repeat, min_time)
+        results[name] = {'runs': len(times),
+                         'min': min(times),
+                         'median': statistics.median(times),
+                         }
+    for name, setup in _memory_benchmarks.items():
+        if names and not any(n in name for n in names):
+            continue
+        results[name] = {'bytes': _retained(setup(ctx))}
+
+    revision, dirty = _git_revision()
+    return {'revision': revision,
+            'dirty': dirty,
+            'timestamp': datetime.now().astimezone().isoformat(),
+            'python': platform.python_version(),
+            'spec': {k: v.isoformat() if isinstance(v, datetime) else v
+                     for k, v in dataclasses.asdict(spec).items()},
+            'results': results,
+            }
+
+
+def load_results(path: Path) -> list[dict[str, Any]]:
+    try:
+        with path.open() as f:
+            return [json.loads(line) for line in f if line.strip()]
+    except FileNotFoundError:
+        return []
+
+
+def _find_run(runs: list[dict[str, Any]], revision: str) -> dict[str, Any]:
+    # The most recent run whose revision starts with the given prefix.
+    for r in reversed(runs):
+        if (r['revision'] or '').startswith(revision):
+            return r
+    raise LookupError(f'No results for revision {revision!r}')
+
+
+def compare(old: dict[str, Any], new: dict[str, Any]) -> list[str]:
+    lines = [f'{"benchmark":<32} {"old":>10} {"new":>10} {"change":>8}']
+    for name in sorted(old['results'].keys() & new['results'].keys()):
+        old_result = old['results'][name]
+        new_result = new['results'][name]
+        if 'bytes' in old_result:
+            old_value = old_result['bytes']
+            new_value = new_result['bytes']
+            values = (f'{old_value / 2**20:>8.2f}MB '
+                      f'{new_value / 2**20:>8.2f}MB')
+        else:
+            old_value = old_result['min']
+            new_value = new_result['min']
+            values = (f'{old_value * 1000:>8.2f}ms '
+                      f'{new_value * 1000:>8.2f}ms')
+        change = (new_value - old_value) / old_value if old_value else 0
+        lines.append(f'{name:<32} {values} {change:>+8.1%}')
+    return lines
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--results', type=Path, default=DEFAULT_RESULTS)
+    parser = argparse.ArgumentParser(description='Run or compare benchmarks')
+    subparsers = parser.add_subparsers(dest='command')
+
+    run_parser = subparsers.add_parser('run', parents=[common])
+    run_parser.add_argument('names', nargs='*',
+                            help='Only run benchmarks containing these names')
+    for field in dataclasses.fields(WorkloadSpec):
+        if field.type in ('int', 'float', int, float):
+            run_parser.add_argument(
+                    '--' + field.name.replace('_', '-'),
+                    type=int if field.type in ('int', int) else float,
+                    default=field.default)
+    run_parser.add_argument('--repeat', type=int, default=5)
+    run_parser.add_argument('--min-time', type=float, default=0.2)
+    run_parser.add_argument('--no-save', action='store_true')
+
+    compare_parser = subparsers.add_parser('compare', parents=[common])
+    compare_parser.add_argument('old', help='Revision to compare against')
+    compare_parser.add_argument('new', nargs='?',
+                                help='Revision to compare; the latest run if '
+                                     'not given')
+
+    subparsers.add_parser('list')
+
+    if argv is None:
+        argv = sys.argv[1:]
+    if not argv or argv[0] not in ('run', 'compare', 'list', '-h', '--help'):
+        argv = ['run', *argv]
+    args = parser.parse_args(argv)
+
+    if args.command == 'list':
+        for name in (*_benchmarks, *_memory_benchmarks):
+            print(name)
+        return 0
+
+    if args.command == 'compare':
+        runs = load_results(args.results)
+        try:
+            old = _find_run(runs, args.old)
+            new = _find_run(runs, args.new) if args.new else runs[-1]
+        except (LookupError, IndexError) as e:
+            print(e, file=sys.stderr)
+            return 1
+        print('\n'.join(compare(old, new)))
+        return 0
+
+    spec_args = {f.name: getattr(args, f.name)
+                 for f in dataclasses.fields(WorkloadSpec)
+                 if hasattr(args, f.name)}
+    result = run(WorkloadSpec(**spec_args), args.names, args.repeat,
+                 args.min_time)
+    for name, r in result['results'].items():
+        if 'bytes' in r:
+            print(f'{name:<32} {r["bytes"] / 2**20:>10.3f}MB')
+            continue
+        print(f'{name:<32} {r["min"] * 1000:>10.3f}ms '
+              f'(median {r["median"] * 1000:.3f}ms, {r["runs"]} runs)')
+    if not args.no_save:
+        args.results.parent.mkdir(parents=True, exist_ok=True)
+        with args.results.open('a') as f:
+            f.write(json.dumps(result) + '\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
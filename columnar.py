@@ -0,0 +1,404 @@
+import bisect
+import math
+from array import array
+from datetime import date, datetime, timedelta, timezone, tzinfo
+from typing import Any, Hashable, Iterable, Iterator, Optional, Self
+from uuid import UUID
+
+from pydantic import AwareDatetime
+
+from task import Task, TaskList, TaskState
+
+# A compact, read-only form of a task list's tasks, for lists too big to hold
+# comfortably as Task models.  Rather than a model per task, with its own
+# dict, lists and UUID and datetime objects, each field is kept in a column:
+#
+# - states as one byte per task;
+# - UUIDs as 16-byte rows of one bytearray;
+# - created, wait, due and ended as 64-bit microsecond timestamps (or day
+#   ordinals, for dates), with the timezone of each as an index into a
+#   table of the few distinct timezones in the list;
+# - the urgency parameters as doubles, with NaN for None;
+# - children, requires, blocks and tags as offsets into shared arrays, so
+#   an empty one costs nothing beyond its offset.
+#
+# Tasks are stored in depth-first order, parents before children.  TaskView
+# reads a task's fields from the columns as they're asked for; views are
+# created as they're needed rather than kept.  To change anything, convert
+# back to a TaskList.
+
+_STATES: tuple[TaskState, ...] = ('todo', 'placeholder', 'done', 'dropped')
+_STATE_IDS = {s: i for i, s in enumerate(_STATES)}
+
+_NONE = -2**63
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_DATETIME_FIELDS = ('created', 'wait', 'due', 'ended')
+_URGENCY_FIELDS = ('base_urgency', 'age_urgency_factor', 'age_urgency_max')
+
+
+def _alias(name: str) -> str:
+    return Task.model_fields[name].alias or name
+
+
+class _Ragged:
+    # A list of variable-length sequences of ints, stored as one array of
+    # values and one of offsets.
+    __slots__ = ('offsets', 'values')
+
+    def __init__(self, typecode: str) -> None:
+        self.offsets = array('I', [0])
+        self.values = array(typecode)
+
+    def append(self, values: Iterable[int]) -> None:
+        self.values.extend(values)
+        self.offsets.append(len(self.values))
+
+    def __getitem__(self, row: int) -> array:
+        return self.values[self.offsets[row]:self.offsets[row + 1]]
+
+    def __len__(self) -> int:
+        return len(self.offsets) - 1
+
+    def count(self, row: int) -> int:
+        return self.offsets[row + 1] - self.offsets[row]
+
+
+class _TimeColumn:
+    # Datetimes as microseconds since the epoch and dates as day ordinals,
+    # with a flag to tell them apart and the index of each datetime's
+    # timezone.
+    __slots__ = ('values', 'is_date', 'zones')
+
+    def __init__(self) -> None:
+        self.values = array('q')
+        self.is_date = bytearray()
+        self.zones = array('H')
+
+
+class TaskColumns:
+    def __init__(self) -> None:
+        self._uuids = bytearray()
+        self._titles: list[str] = []
+        self._states = bytearray()
+        self._parents = array('i')
+        self._times = {name: _TimeColumn() for name in _DATETIME_FIELDS}
+        self._urgency = {name: array('d') for name in _URGENCY_FIELDS}
+        self._children = _Ragged('I')
+        self._requires = _Ragged('B')
+        self._blocks = _Ragged('B')
+        self._tags = _Ragged('H')
+        self._tag_names: list[str] = []
+        self._tag_ids: dict[str, int] = {}
+        self._zones: list[tzinfo] = []
+        self._zone_ids: dict[Hashable, int] = {}
+        # The rows of the top-level tasks, and every row sorted by UUID for
+        # lookups.
+        self._roots = array('I')
+        self._by_uuid: Optional[array] = None
+
+    def __len__(self) -> int:
+        return len(self._titles)
+
+    def _zone_id(self, tz: tzinfo) -> int:
+        # Fixed offsets are shared by offset, as each parsed datetime has
+        # its own tzinfo object.
+        offset = tz.utcoffset(None)
+        key: Hashable = tz if offset is None else (type(tz), offset)
+        try:
+            return self._zone_ids[key]
+        except KeyError:
+            self._zones.append(tz)
+            i = self._zone_ids[key] = len(self._zones) - 1
+            return i
+
+    def _tag_id(self, name: str) -> int:
+        try:
+            return self._tag_ids[name]
+        except KeyError:
+            self._tag_names.append(name)
+            i = self._tag_ids[name] = len(self._tag_names) - 1
+            return i
+
+    def _append_time(self, name: str, value: date | datetime | None) -> None:
+        column = self._times[name]
+        if value is None:
+            column.values.append(_NONE)
+            column.is_date.append(0)
+            column.zones.append(0)
+        elif isinstance(value, datetime):
+            assert value.tzinfo is not None
+            column.values.append((value - _EPOCH) // timedelta(microseconds=1))
+            column.is_date.append(0)
+            column.zones.append(self._zone_id(value.tzinfo))
+        else:
+            column.values.append(value.toordinal())
+            column.is_date.append(1)
+            column.zones.append(0)
+
+    def _get_time(self, name: str, row: int) -> date | datetime | None:
+        column = self._times[name]
+        value = column.values[row]
+        if value == _NONE:
+            return None
+        if column.is_date[row]:
+            return date.fromordinal(value)
+        return (_EPOCH + timedelta(microseconds=value)).astimezone(
+                self._zones[column.zones[row]])
+
+    def append_tree(self, root: Task) -> None:
+        # Adds a top-level task and everything below it.
+        self._by_uuid = None
+        self._roots.append(len(self))
+        # Each task with its parent's row and its index among the parent's
+        # children, so the parent's slot for it can be filled in.
+        to_process: list[tuple[Task, int, int]] = [(root, -1, 0)]
+        while to_process:
+            task, parent, index = to_process.pop()
+            row = len(self)
+            if parent >= 0:
+                children = self._children
+                children.values[children.offsets[parent] + index] = row
+            self._uuids += task.uuid.bytes
+            self._titles.append(task.title)
+            self._states.append(_STATE_IDS[task.state])
+            self._parents.append(parent)
+            for name in _DATETIME_FIELDS:
+                self._append_time(name, getattr(task, name))
+            for name in _URGENCY_FIELDS:
+                value = getattr(task, name)
+                self._urgency[name].append(math.nan if value is None
+                                           else value)
+            self._children.append([0] * len(task.children))
+            self._requires.append(b''.join(u.bytes for u in task.requires))
+            self._blocks.append(b''.join(u.bytes for u in task.blocks))
+            self._tags.append(self._tag_id(t) for t in task.tags)
+            to_process.extend((c, row, i) for i, c in
+                              reversed(list(enumerate(task.children))))
+
+    def uuid(self, row: int) -> UUID:
+        return UUID(bytes=bytes(self._uuids[row * 16:row * 16 + 16]))
+
+    def row(self, uuid: UUID) -> int:
+        if self._by_uuid is None:
+            self._by_uuid = array('I', sorted(
+                    range(len(self)),
+                    key=lambda r: self._uuids[r * 16:r * 16 + 16]))
+        key = uuid.bytes
+        uuids = self._uuids
+        i = bisect.bisect_left(self._by_uuid, key,
+                               key=lambda r: uuids[r * 16:r * 16 + 16])
+        if (i == len(self._by_uuid)
+                or uuids[self._by_uuid[i] * 16:
+                         self._by_uuid[i] * 16 + 16] != key):
+            raise KeyError(uuid)
+        return self._by_uuid[i]
+
+    def _uuid_list(self, column: _Ragged, row: int) -> tuple[UUID, ...]:
+        data = column[row]
+        if not data:
+            return ()
+        raw = data.tobytes()
+        return tuple(UUID(bytes=raw[i:i + 16]) for i in range(0, len(raw), 16))
+
+
+def _shell(document: dict[str, Any]) -> TaskList:
+    return TaskList.model_validate({**document, 'tasks': []})
+
+
+def _subtree_tags(root: Task) -> set[str]:
+    tags: set[str] = set()
+    to_process = [root]
+    while to_process:
+        task = to_process.pop()
+        tags.update(task.tags)
+        to_process.extend(task.children)
+    return tags
+
+
+class TaskView:
+    # A task in a ColumnarTaskList.  Fields are read from the columns each
+    # time they're accessed.
+    __slots__ = ('_tasklist', '_row')
+
+    def __init__(self, tasklist: 'ColumnarTaskList', row: int) -> None:
+        self._tasklist = tasklist
+        self._row = row
+
+    def __eq__(self, other: object) -> bool:
+        return (isinstance(other, TaskView)
+                and self._tasklist is other._tasklist
+                and self._row == other._row)
+
+    def __hash__(self) -> int:
+        return hash((id(self._tasklist), self._row))
+
+    def __repr__(self) -> str:
+        return f'TaskView({self.uuid}, {self.title!r})'
+
+    @property
+    def _columns(self) -> TaskColumns:
+        return self._tasklist.columns
+
+    @property
+    def uuid(self) -> UUID:
+        return self._columns.uuid(self._row)
+
+    @property
+    def title(self) -> str:
+        return self._columns._titles[self._row]
+
+    @property
+    def state(self) -> TaskState:
+        return _STATES[self._columns._states[self._row]]
+
+    @property
+    def created(self) -> AwareDatetime:
+        created = self._columns._get_time('created', self._row)
+        assert isinstance(created, datetime)
+        return created
+
+    @property
+    def wait(self) -> date | datetime | None:
+        return self._columns._get_time('wait', self._row)
+
+    @property
+    def due(self) -> date | datetime | None:
+        return self._columns._get_time('due', self._row)
+
+    @property
+    def ended(self) -> Optional[AwareDatetime]:
+        return self._columns._get_time('ended', self._row)  # type: ignore
+
+    def _urgency_field(self, name: str, row: int) -> Optional[float]:
+        value = self._columns._urgency[name][row]
+        return None if math.isnan(value) else value
+
+    @property
+    def base_urgency(self) -> Optional[float]:
+        return self._urgency_field('base_urgency', self._row)
+
+    @property
+    def age_urgency_factor(self) -> Optional[float]:
+        return self._urgency_field('age_urgency_factor', self._row)
+
+    @property
+    def age_urgency_max(self) -> Optional[float]:
+        return self._urgency_field('age_urgency_max', self._row)
+
+    @property
+    def parent(self) -> Optional['TaskView']:
+        parent = self._columns._parents[self._row]
+        return None if parent < 0 else TaskView(self._tasklist, parent)
+
+    @property
+    def children(self) -> tuple['TaskView', ...]:
+        rows = self._columns._children[self._row]
+        return tuple(TaskView(self._tasklist, r) for r in rows)
+
+    @property
+    def requires(self) -> tuple[UUID, ...]:
+        return self._columns._uuid_list(self._columns._requires, self._row)
+
+    @property
+    def blocks(self) -> tuple[UUID, ...]:
+        return self._columns._uuid_list(self._columns._blocks, self._row)
+
+    @property
+    def tags(self) -> tuple[str, ...]:
+        names = self._columns._tag_names
+        return tuple(names[i] for i in self._columns._tags[self._row])
+
+    def _inherited(self, name: str) -> Any:
+        columns = self._columns
+        row = self._row
+        while row >= 0:
+            value = self._urgency_field(name, row)
+            if value is not None:
+                return value
+            row = columns._parents[row]
+        return getattr(self._tasklist.shell, name)
+
+    def urgency_at(self, when: AwareDatetime) -> float:
+        # As Task.urgency_at.
+        shell = self._tasklist.shell
+        age_days = (when - self.created) / timedelta(days=1)
+        age_urgency = age_days * self._inherited('age_urgency_factor')
+        age_urgency_max = self._inherited('age_urgency_max')
+        if age_urgency_max is not None:
+            age_urgency = min(age_urgency, age_urgency_max)
+        tag_urgency = shell._tag_urgency(shell.tag_mask(self.tags))
+        return self._inherited('base_urgency') + age_urgency + tag_urgency
+
+    def _document(self) -> dict[str, Any]:
+        document: dict[str, Any] = {'title': self.title,
+                                    'uuid': self.uuid,
+                                    'state': self.state,
+                                    }
+        for name in _DATETIME_FIELDS + _URGENCY_FIELDS:
+            value = getattr(self, name)
+            if value is not None:
+                document[_alias(name)] = value
+        for name in ('requires', 'blocks', 'tags'):
+            value = getattr(self, name)
+            if value:
+                document[name] = list(value)
+        if self._columns._children.count(self._row):
+            document['children'] = [c._document() for c in self.children]
+        return document
+
+    def to_task(self) -> Task:
+        # A Task model of this task and everything below it.
+        return Task.model_validate(self._document())
+
+
+class ColumnarTaskList:
+    # A task list with its tasks in columns.  Everything else -- the
+    # settings, tags and schedules -- is small, and is kept as an ordinary
+    # TaskList with no tasks.
+    def __init__(self, shell: TaskList, columns: TaskColumns) -> None:
+        self.shell = shell
+        self.columns = columns
+
+    @classmethod
+    def from_tasklist(cls, tasklist: TaskList) -> Self:
+        columns = TaskColumns()
+        for task in tasklist.tasks:
+            columns.append_tree(task)
+        return cls(_shell(tasklist.model_dump(mode='json',
+                                              exclude={'tasks'})),
+                   columns)
+
+    @classmethod
+    def from_document(cls, document: dict[str, Any]) -> Self:
+        # Validates the tasks one tree at a time, so only one tree's models
+        # exist at once.
+        tasks = document.get('tasks', [])
+        if not isinstance(tasks, list):
+            tasks = [tasks]
+        shell = _shell(document)
+        columns = TaskColumns()
+        for task_document in tasks:
+            task = Task.model_validate(task_document)
+            # Checks the tags, as indexing it in a TaskList would.
+            shell.tag_mask(_subtree_tags(task))
+            columns.append_tree(task)
+        return cls(shell, columns)
+
+    def __len__(self) -> int:
+        return len(self.columns)
+
+    @property
+    def tasks(self) -> list[TaskView]:
+        return [TaskView(self, r) for r in self.columns._roots]
+
+    def all_tasks(self) -> Iterator[TaskView]:
+        for row in range(len(self.columns)):
+            yield TaskView(self, row)
+
+    def get_task(self, uuid: UUID) -> TaskView:
+        return TaskView(self, self.columns.row(uuid))
+
+    def to_tasklist(self) -> TaskList:
+        document = self.shell.model_dump(mode='json')
+        document['tasks'] = [t._document() for t in self.tasks]
+        return TaskList.model_validate(document)
@@ -0,0 +1,29 @@
+import zoneinfo
+from pathlib import Path
+from typing import Iterator
+
+import pytest
+
+import localtime
+
+
+@pytest.fixture
+def zone_file() -> Path:
+    for directory in zoneinfo.TZPATH:
+        path = Path(directory, 'Europe', 'London')
+        if path.exists():
+            return path
+    pytest.skip('No system zone files')
+
+
+@pytest.fixture
+def etc_localtime(tmp_path: Path,
+                  monkeypatch: pytest.MonkeyPatch) -> Iterator[Path]:
+    # Stands in for /etc/localtime, with TZ unset.  The local zone is looked
+    # up again afterwards.
+    path = tmp_path / 'localtime'
+    monkeypatch.delenv('TZ', raising=False)
+    monkeypatch.setattr(localtime, '_LOCALTIME_PATH', str(path))
+    yield path
+    monkeypatch.undo()
+    localtime.refresh_local_zone()
@@ -0,0 +1,303 @@
+import dataclasses
+from types import MappingProxyType
+from typing import Any, Iterator, Mapping, Optional, Self
+from uuid import UUID
+
+from task import Task, TaskList, TaskState, valid_child_states
+
+# An immutable, structurally shared representation of a task list, for
+# keeping many versions of the same list around cheaply.  Each task is a
+# frozen TaskNode holding its own fields in their JSON form and the UUIDs of
+# its parent and children, and the nodes are held in a persistent map keyed
+# by UUID.  Editing a task makes a new Version that shares everything with
+# the old one except the map nodes on the path to that task, so an edit costs
+# O(log n) time and memory, and a snapshot is just a reference to a Version.
+#
+# Edits are validated as they are made, so every Version is known to be
+# valid, and History can switch between them for undo and redo without
+# validating anything.  Converting back to a TaskList with to_tasklist does
+# validate the whole list.
+
+_BITS = 5
+_MASK = (1 << _BITS) - 1
+
+# A node in the persistent map: slots indexed by successive 5-bit chunks of
+# the key's UUID, each holding either a (key, value) pair or another node.
+_MapNode = dict[int, Any]
+
+
+def _map_get(node: _MapNode, key: UUID) -> Any:
+    bits = key.int
+    while True:
+        entry = node.get(bits & _MASK)
+        if entry is None:
+            raise KeyError(key)
+        if isinstance(entry, dict):
+            node = entry
+            bits >>= _BITS
+        elif entry[0] == key:
+            return entry[1]
+        else:
+            raise KeyError(key)
+
+
+def _map_set(node: _MapNode, key: UUID, value: Any, shift: int = 0,
+             ) -> tuple[_MapNode, bool]:
+    # Returns the new node, and whether the key wasn't already in the map.
+    slot = (key.int >> shift) & _MASK
+    entry = node.get(slot)
+    new_node = dict(node)
+    added = False
+    if entry is None:
+        new_node[slot] = (key, value)
+        added = True
+    elif isinstance(entry, dict):
+        new_node[slot], added = _map_set(entry, key, value, shift + _BITS)
+    elif entry[0] == key:
+        new_node[slot] = (key, value)
+    else:
+        # Two keys in the same slot: push both down a level.  UUIDs are
+        # unique, so they differ somewhere and this ends.
+        child, _ = _map_set({}, entry[0], entry[1], shift + _BITS)
+        new_node[slot], added = _map_set(child, key, value, shift + _BITS)
+    return new_node, added
+
+
+def _freeze(value: Any) -> Any:
+    if isinstance(value, dict):
+        return MappingProxyType({k: _freeze(v) for k, v in value.items()})
+    if isinstance(value, list):
+        return tuple(_freeze(v) for v in value)
+    return value
+
+
+def _thaw(value: Any) -> Any:
+    if isinstance(value, Mapping):
+        return {k: _thaw(v) for k, v in value.items()}
+    if isinstance(value, tuple):
+        return [_thaw(v) for v in value]
+    return value
+
+
+def _tag_name(tag: Any) -> str:
+    # Tags without an urgency factor are stored as just their names.
+    return tag if isinstance(tag, str) else tag['name']
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class TaskNode:
+    uuid: UUID
+    parent: Optional[UUID]
+    # The task's fields in their JSON form, by alias, without uuid and
+    # children.
+    fields: Mapping[str, Any]
+    children: tuple[UUID, ...] = ()
+
+    @property
+    def state(self) -> TaskState:
+        return self.fields['state']
+
+
+class Version:
+    __slots__ = ('_nodes', '_len', 'roots', 'settings')
+
+    def __init__(self, nodes: _MapNode, length: int, roots: tuple[UUID, ...],
+                 settings: Mapping[str, Any]) -> None:
+        self._nodes = nodes
+        self._len = length
+        self.roots = roots
+        # Everything in the task list other than its tasks, in JSON form.
+        self.settings = settings
+
+    @classmethod
+    def from_tasklist(cls, tasklist: TaskList) -> Self:
+        nodes: _MapNode = {}
+        length = 0
+        to_process: list[tuple[Optional[UUID], Task]]
+        to_process = [(None, t) for t in tasklist.tasks]
+        while to_process:
+            parent, task = to_process.pop()
+            node = TaskNode(uuid=task.uuid,
+                            parent=parent,
+                            fields=_freeze(task.model_dump(
+                                mode='json', exclude={'uuid', 'children'},
+                                exclude_defaults=False)),
+                            children=tuple(c.uuid for c in task.children),
+                            )
+            nodes, _ = _map_set(nodes, task.uuid, node)
+            length += 1
+            to_process.extend((task.uuid, c) for c in task.children)
+        return cls(nodes, length,
+                   tuple(t.uuid for t in tasklist.tasks),
+                   _freeze(tasklist.model_dump(mode='json',
+                                               exclude={'tasks'})),
+                   )
+
+    def __len__(self) -> int:
+        return self._len
+
+    def __contains__(self, uuid: object) -> bool:
+        try:
+            _map_get(self._nodes, uuid)  # type: ignore[arg-type]
+        except (KeyError, AttributeError):
+            return False
+        return True
+
+    def task(self, uuid: UUID) -> TaskNode:
+        return _map_get(self._nodes, uuid)
+
+    def tasks(self) -> Iterator[TaskNode]:
+        # All tasks, each before its children, in document order.
+        to_process = list(reversed(self.roots))
+        while to_process:
+            node = self.task(to_process.pop())
+            yield node
+            to_process.extend(reversed(node.children))
+
+    def _with(self, *nodes: TaskNode,
+              roots: Optional[tuple[UUID, ...]] = None) -> 'Version':
+        new_nodes = self._nodes
+        for node in nodes:
+            new_nodes, _ = _map_set(new_nodes, node.uuid, node)
+        return Version(new_nodes, self._len,
+                       self.roots if roots is None else roots,
+                       self.settings)
+
+    def set(self, uuid: UUID, **fields: Any) -> 'Version':
+        # Returns a new version with the given fields of the task changed.
+        # Fields are given by their aliases, in their JSON form, as in the
+        # file.
+        if {'uuid', 'children'} & fields.keys():
+            raise ValueError('Cannot set uuid or children; use move instead')
+        node = self.task(uuid)
+        # Validating the task on its own checks the values and fills in
+        # anything that depends on them, such as the ended time.
+        task = Task.model_validate(_thaw(node.fields) | fields
+                                   | {'uuid': str(uuid)})
+        new_fields = _freeze(task.model_dump(
+            mode='json', exclude={'uuid', 'children'},
+            exclude_defaults=False))
+
+        # Validating the whole list would check these against the rest of
+        # it, so check them here too.
+        known_tags = {_tag_name(t) for t in self.settings.get('tags', ())}
+        unknown = set(task.tags) - known_tags
+        if unknown:
+            raise ValueError(f'Unknown tags {sorted(unknown)} in {uuid}')
+        for other in (*task.requires, *task.blocks):
+            if other not in self:
+                raise ValueError(f'Task {uuid} refers to unknown task '
+                                 f'{other}')
+
+        valid = task._valid_child_states()
+        for child in node.children:
+            if self.task(child).state not in valid:
+                raise ValueError(f'Task {child} cannot be '
+                                 f'{self.task(child).state} under '
+                                 f'{task.state} task {uuid}')
+        if node.parent is not None:
+            parent = self.task(node.parent)
+            if task.state not in valid_child_states(parent.state):
+                raise ValueError(f'Task {uuid} cannot be {task.state} under '
+                                 f'{parent.state} task {parent.uuid}')
+        return self._with(dataclasses.replace(node, fields=new_fields))
+
+    def move(self, uuid: UUID, parent: Optional[UUID],
+             index: Optional[int] = None) -> 'Version':
+        # Returns a new version with the task moved to be a child of
+        # another, or to the top level if parent is None, at the given
+        # position or at the end.
+        node = self.task(uuid)
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor == uuid:
+                raise ValueError(f'Cannot move task {uuid} below itself')
+            ancestor = self.task(ancestor).parent
+        if parent is not None:
+            parent_node = self.task(parent)
+            if node.state not in valid_child_states(parent_node.state):
+                raise ValueError(f'Task {uuid} cannot be {node.state} under '
+                                 f'{parent_node.state} task {parent}')
+
+        def without(siblings: tuple[UUID, ...]) -> tuple[UUID, ...]:
+            return tuple(u for u in siblings if u != uuid)
+
+        def inserted(siblings: tuple[UUID, ...]) -> tuple[UUID, ...]:
+            if index is None:
+                return siblings + (uuid,)
+            return siblings[:index] + (uuid,) + siblings[index:]
+
+        roots = self.roots
+        changed: dict[UUID, TaskNode] = {}
+        if node.parent is None:
+            roots = without(roots)
+        else:
+            old_parent = self.task(node.parent)
+            changed[old_parent.uuid] = dataclasses.replace(
+                    old_parent, children=without(old_parent.children))
+        if parent is None:
+            roots = inserted(roots)
+        else:
+            new_parent = changed.get(parent) or self.task(parent)
+            changed[parent] = dataclasses.replace(
+                    new_parent, children=inserted(new_parent.children))
+        changed[uuid] = dataclasses.replace(node, parent=parent)
+        return self._with(*changed.values(), roots=roots)
+
+    def to_document(self) -> dict[str, Any]:
+        def task(uuid: UUID) -> dict[str, Any]:
+            node = self.task(uuid)
+            d = _thaw(node.fields)
+            d['uuid'] = str(uuid)
+            if node.children:
+                d['children'] = [task(c) for c in node.children]
+            return d
+
+        document = _thaw(self.settings)
+        document['tasks'] = [task(u) for u in self.roots]
+        return document
+
+    def to_tasklist(self) -> TaskList:
+        return TaskList.model_validate(self.to_document())
+
+
+class History:
+    # A sequence of versions with a current position, for undo and redo.
+    # Committing a new version discards anything that could be redone.
+
+    def __init__(self, version: Version) -> None:
+        self._versions = [version]
+        self._position = 0
+
+    @property
+    def current(self) -> Version:
+        return self._versions[self._position]
+
+    def snapshot(self) -> Version:
+        # Versions never change, so the current one is its own snapshot.
+        return self.current
+
+    def commit(self, version: Version) -> None:
+        del self._versions[self._position + 1:]
+        self._versions.append(version)
+        self._position += 1
+
+    @property
+    def can_undo(self) -> bool:
+        return self._position > 0
+
+    @property
+    def can_redo(self) -> bool:
+        return self._position < len(self._versions) - 1
+
+    def undo(self) -> Version:
+        if not self.can_undo:
+            raise IndexError('Nothing to undo')
+        self._position -= 1
+        return self.current
+
+    def redo(self) -> Version:
+        if not self.can_redo:
+            raise IndexError('Nothing to redo')
+        self._position += 1
+        return self.current
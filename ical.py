@@ -0,0 +1,345 @@
+import argparse
+import sys
+from datetime import date, datetime, timezone
+from pathlib import Path
+from typing import IO, Any, Iterator, Optional, Protocol
+from zoneinfo import ZoneInfo
+
+from pydantic import AwareDatetime
+
+import localtime
+from instrumentation import timed
+from recurrence import ComplexRecurrence, SimpleRecurrence
+from task import Task, TaskList, TaskRecurrenceSchedule, TaskTemplate
+from weekday import WeekdayName
+
+# Exports tasks and schedules as iCalendar (RFC 5545) VTODO components.  The
+# export is generated one component at a time and written out in fixed-size
+# blocks, so the memory it needs doesn't grow with the size of the list and
+# the first bytes go out straight away.
+#
+# Each task becomes a VTODO, linked to its parent and the tasks it requires
+# with RELATED-TO.  Each template of a SimpleRecurrence or ComplexRecurrence
+# schedule becomes a VTODO with the schedule's rules as RRULE, EXRULE, RDATE
+# and EXDATE lines, split across several VTODOs where its rules start at
+# different times.  Schedules with a RelativeTime have no fixed occurrences,
+# and dateutil's byeaster has no iCalendar equivalent, so those schedules are
+# left out.
+#
+# Times in a ZoneInfo timezone loaded by name are written as local times
+# with its TZID, so rules keep their wall-clock times across DST changes;
+# everything else is written in UTC.  No VTIMEZONE components are written:
+# calendar clients look IANA TZIDs up themselves.
+
+_PRODID = '-//Asmodeus//Task list//EN'
+_LINE_LIMIT = 75
+_BUFFER_SIZE = 64 * 1024
+
+_STATUS = {'todo': 'NEEDS-ACTION',
+           'placeholder': 'NEEDS-ACTION',
+           'done': 'COMPLETED',
+           'dropped': 'CANCELLED',
+           }
+
+_BY_PARTS = (('bymonth', 'BYMONTH'),
+             ('byweekno', 'BYWEEKNO'),
+             ('byyearday', 'BYYEARDAY'),
+             ('bymonthday', 'BYMONTHDAY'),
+             ('byhour', 'BYHOUR'),
+             ('byminute', 'BYMINUTE'),
+             ('bysecond', 'BYSECOND'),
+             ('bysetpos', 'BYSETPOS'),
+             )
+
+
+class _Sink(Protocol):
+    def write(self, data: bytes, /) -> Any: ...
+
+
+def _escape(text: str) -> str:
+    return (text.replace('\\', '\\\\')
+            .replace(';', '\\;')
+            .replace(',', '\\,')
+            .replace('\r\n', '\\n')
+            .replace('\n', '\\n'))
+
+
+def _fold(line: str) -> str:
+    # Splits lines longer than 75 octets, without splitting any UTF-8
+    # sequences, with each continuation starting with a space.
+    if len(line) <= _LINE_LIMIT and line.isascii():
+        return line + '\r\n'
+    parts = []
+    start = 0
+    size = 0
+    limit = _LINE_LIMIT
+    for i, c in enumerate(line):
+        n = len(c.encode())
+        if size + n > limit:
+            parts.append(line[start:i])
+            start = i
+            size = 0
+            # Leave room for the leading space.
+            limit = _LINE_LIMIT - 1
+        size += n
+    parts.append(line[start:])
+    return '\r\n '.join(parts) + '\r\n'
+
+
+def _utc(dt: datetime) -> str:
+    return dt.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _named_zone(tzinfo: Any) -> Optional[ZoneInfo]:
+    # Zones loaded from a file rather than by name have no key to use as
+    # a TZID.
+    if isinstance(tzinfo, ZoneInfo) and tzinfo.key is not None:
+        return tzinfo
+    return None
+
+
+def _datetime(name: str, dt: AwareDatetime,
+              zone: Optional[ZoneInfo] = None) -> str:
+    if zone is None:
+        zone = _named_zone(dt.tzinfo)
+    if zone is None:
+        return f'{name}:{_utc(dt)}'
+    local = dt.astimezone(zone)
+    return f'{name};TZID={zone.key}:{local.strftime("%Y%m%dT%H%M%S")}'
+
+
+def _date_or_datetime(name: str, value: date | datetime) -> str:
+    if isinstance(value, datetime):
+        return _datetime(name, value)
+    return f'{name};VALUE=DATE:{value.strftime("%Y%m%d")}'
+
+
+def _dtstart(rule: SimpleRecurrence) -> AwareDatetime:
+    if rule.dtstart is not None:
+        return rule.dtstart
+    # dateutil starts rules without one from when they were compiled, in
+    # naive local time.
+    return localtime.make_aware(rule._rrule._dtstart)
+
+
+def _weekday(wd: Any) -> str:
+    name = str(WeekdayName(wd.weekday))
+    return f'{wd.n:+d}{name}' if wd.n else name
+
+
+def _rrule_value(rule: SimpleRecurrence) -> str:
+    parts = [f'FREQ={rule.freq}']
+    if rule.interval != 1:
+        parts.append(f'INTERVAL={rule.interval}')
+    if rule.count_limit is not None:
+        parts.append(f'COUNT={rule.count_limit}')
+    if rule.until is not None:
+        # UNTIL is in UTC whenever DTSTART has a timezone.
+        parts.append(f'UNTIL={_utc(rule.until)}')
+    for name, part in _BY_PARTS:
+        values = getattr(rule, name)
+        if values:
+            parts.append(f'{part}={",".join(str(v) for v in values)}')
+    if rule.byweekday:
+        parts.append(
+                f'BYDAY={",".join(_weekday(wd) for wd in rule.byweekday)}')
+    if rule.wkst is not None:
+        parts.append(f'WKST={rule.wkst}')
+    return ';'.join(parts)
+
+
+def _date_list(name: str, dts: list[AwareDatetime],
+               zone: Optional[ZoneInfo]) -> str:
+    if zone is None:
+        return f'{name}:{",".join(_utc(dt) for dt in dts)}'
+    values = ','.join(dt.astimezone(zone).strftime('%Y%m%dT%H%M%S')
+                      for dt in dts)
+    return f'{name};TZID={zone.key}:{values}'
+
+
+def _recurrences(schedule: TaskRecurrenceSchedule,
+                 ) -> Optional[list[list[str]]]:
+    # DTSTART and the recurrence lines for the schedule, or None if it
+    # can't be expressed in iCalendar.  A component has only one DTSTART,
+    # which every rule in it starts from, so rules with different starts go
+    # in separate components, each with all the exclusions.
+    rule = schedule.schedule
+    if isinstance(rule, SimpleRecurrence):
+        rrules, exrules, rdates, exdates = [rule], [], [], []
+    elif isinstance(rule, ComplexRecurrence):
+        rrules, exrules = rule.rrules, rule.exrules
+        rdates, exdates = rule.rdates, rule.exdates
+    else:
+        return None
+    if any(r.byeaster for r in (*rrules, *exrules)):
+        return None
+
+    groups: dict[AwareDatetime, list[SimpleRecurrence]] = {}
+    for r in rrules:
+        groups.setdefault(_dtstart(r), []).append(r)
+    if not groups:
+        if not rdates:
+            return None
+        groups[min(rdates)] = []
+    # Exclusion rules are only kept when they all start with the rules
+    # they exclude from.
+    exrule_start = {_dtstart(r) for r in exrules}
+
+    recurrences = []
+    for i, (start, group) in enumerate(groups.items()):
+        zone = _named_zone(start.tzinfo)
+        if exrule_start and exrule_start != {start}:
+            return None
+        lines = [_datetime('DTSTART', start, zone)]
+        lines.extend(f'RRULE:{_rrule_value(r)}' for r in group)
+        lines.extend(f'EXRULE:{_rrule_value(r)}' for r in exrules)
+        if rdates and i == 0:
+            lines.append(_date_list('RDATE', rdates, zone))
+        if exdates:
+            lines.append(_date_list('EXDATE', exdates, zone))
+        recurrences.append(lines)
+    return recurrences
+
+
+def _common_lines(item: Task | TaskTemplate, parent: Any,
+                  uid: Optional[str] = None) -> list[str]:
+    lines = [f'UID:{uid or item.uuid}',
+             f'SUMMARY:{_escape(item.title)}',
+             ]
+    if item.tags:
+        lines.append(f'CATEGORIES:{",".join(_escape(t) for t in item.tags)}')
+    if parent is not None:
+        lines.append(f'RELATED-TO;RELTYPE=PARENT:{parent.uuid}')
+    for uuid in item.requires:
+        lines.append(f'RELATED-TO;RELTYPE=DEPENDS-ON:{uuid}')
+    return lines
+
+
+def _component(lines: list[str]) -> str:
+    return ''.join(_fold(line) for line in
+                   ('BEGIN:VTODO', *lines, 'END:VTODO'))
+
+
+def _task_component(task: Task, stamp: str) -> str:
+    lines = _common_lines(task, task._parent)
+    lines.append(stamp)
+    lines.append(f'CREATED:{_utc(task.created)}')
+    lines.append(f'STATUS:{_STATUS[task.state]}')
+    wait, due = task.wait, task.due
+    if (wait is not None and due is not None
+            and isinstance(wait, datetime) != isinstance(due, datetime)):
+        # DTSTART and DUE must both be dates or both be times, so the wait
+        # is given as the day it falls on or the start of its day.
+        if isinstance(wait, datetime):
+            wait = wait.astimezone(localtime.local_zone()).date()
+        else:
+            wait = localtime.start_of_day(wait)
+    if wait is not None:
+        lines.append(_date_or_datetime('DTSTART', wait))
+    if due is not None:
+        lines.append(_date_or_datetime('DUE', due))
+    if task.ended is not None and task.state == 'done':
+        lines.append(f'COMPLETED:{_utc(task.ended)}')
+    return _component(lines)
+
+
+def _template_components(schedule: TaskRecurrenceSchedule, stamp: str,
+                         ) -> Iterator[str]:
+    recurrences = _recurrences(schedule)
+    if recurrences is None:
+        return
+    to_process: list[TaskTemplate] = list(reversed(schedule.tasks))
+    while to_process:
+        template = to_process.pop()
+        for i, recurrence in enumerate(recurrences):
+            # Components after the first are linked back to it.
+            uid = f'{template.uuid}-{i}' if i else None
+            lines = _common_lines(template, template._parent, uid)
+            if i:
+                lines.append(f'RELATED-TO;RELTYPE=SIBLING:{template.uuid}')
+            lines.append(stamp)
+            lines.append('STATUS:NEEDS-ACTION')
+            lines.extend(recurrence)
+            # Relative waits and dues are relative to each occurrence, which
+            # iCalendar has no way to say.
+            if isinstance(template.due, (date, datetime)):
+                lines.append(_date_or_datetime('DUE', template.due))
+            yield _component(lines)
+        to_process.extend(reversed(template.children))
+
+
+def export(tasklist: TaskList, now: Optional[AwareDatetime] = None,
+           ) -> Iterator[str]:
+    # The calendar, a component at a time.  Tasks come in depth-first order,
+    # parents before their children, followed by the schedules.
+    if now is None:
+        now = localtime.now()
+    stamp = f'DTSTAMP:{_utc(now)}'
+    yield ''.join(_fold(line) for line in ('BEGIN:VCALENDAR',
+                                           'VERSION:2.0',
+                                           f'PRODID:{_PRODID}',
+                                           ))
+    tasklist.load_all()
+    to_process = list(reversed(tasklist.tasks))
+    while to_process:
+        task = to_process.pop()
+        yield _task_component(task, stamp)
+        to_process.extend(reversed(task.children))
+    for schedule in tasklist.recurring_tasks:
+        yield from _template_components(schedule, stamp)
+    yield _fold('END:VCALENDAR')
+
+
+def _write_all(out: Any) -> Any:
+    # Sockets take sendall rather than write, as write on a socket file
+    # can write less than it's given.
+    sendall = getattr(out, 'sendall', None)
+    return sendall if sendall is not None else out.write
+
+
+@timed('export.ical')
+def write(tasklist: TaskList, out: _Sink | IO[bytes],
+          now: Optional[AwareDatetime] = None,
+          buffer_size: int = _BUFFER_SIZE,
+          ) -> int:
+    # Writes the calendar to a binary file or a socket, returning the number
+    # of bytes written.  Components are gathered until there's about
+    # buffer_size bytes of them, so each write is a reasonable size without
+    # holding much more than that.
+    send = _write_all(out)
+    pending: list[str] = []
+    pending_size = 0
+    total = 0
+    for component in export(tasklist, now):
+        pending.append(component)
+        pending_size += len(component)
+        if pending_size >= buffer_size:
+            data = ''.join(pending).encode()
+            send(data)
+            total += len(data)
+            pending = []
+            pending_size = 0
+    data = ''.join(pending).encode()
+    send(data)
+    return total + len(data)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+            description='Export a task list as an iCalendar file')
+    parser.add_argument('tasklist', type=Path)
+    parser.add_argument('output', type=Path, nargs='?',
+                        help='File to write; defaults to standard output')
+    args = parser.parse_args(argv)
+
+    tasklist = TaskList.model_validate_json(args.tasklist.read_bytes())
+    if args.output is None:
+        write(tasklist, sys.stdout.buffer)
+    else:
+        with args.output.open('wb') as f:
+            write(tasklist, f)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
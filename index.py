@@ -0,0 +1,100 @@
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from datetime import tzinfo
+from typing import Iterator, Optional
+from uuid import UUID
+
+from pydantic import AwareDatetime
+
+import localtime
+from _type_meta import make_datetime_aware
+
+
+def as_datetime(d: date) -> AwareDatetime:
+    # Dates sort as the start of that day in the local timezone, so date and
+    # datetime values can share one ordering.
+    if isinstance(d, datetime):
+        return make_datetime_aware(d)
+    return localtime.start_of_day(d)
+
+
+class TimeIndex:
+    # A sorted list of (time, uuid) pairs, so range lookups are a couple of
+    # bisections rather than a scan over every task.  Each UUID is in the
+    # index at most once.
+    #
+    # Dates are placed in the local timezone, so they're placed again if
+    # that changes, which keeps them where range lookups expect them and lets
+    # them be removed.
+
+    __slots__ = ('_entries', '_times', '_dates', '_zone')
+
+    def __init__(self) -> None:
+        self._entries: list[tuple[AwareDatetime, UUID]] = []
+        self._times: dict[UUID, AwareDatetime] = {}
+        self._dates: dict[UUID, date] = {}
+        self._zone: Optional[tzinfo] = None
+
+    def _check_zone(self) -> None:
+        zone = localtime.local_zone()
+        if zone is self._zone:
+            return
+        self._zone = zone
+        if not self._dates:
+            return
+        for uuid, d in self._dates.items():
+            self._times[uuid] = localtime.start_of_day(d)
+        self._entries = sorted((t, u) for u, t in self._times.items())
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __iter__(self) -> Iterator[UUID]:
+        self._check_zone()
+        return (u for _, u in self._entries)
+
+    def add(self, key: date, uuid: UUID) -> None:
+        self._check_zone()
+        time = as_datetime(key)
+        insort(self._entries, (time, uuid))
+        self._times[uuid] = time
+        if not isinstance(key, datetime):
+            self._dates[uuid] = key
+
+    def remove(self, key: date, uuid: UUID) -> None:
+        self._check_zone()
+        entry = (as_datetime(key), uuid)
+        i = bisect_left(self._entries, entry)
+        if i < len(self._entries) and self._entries[i] == entry:
+            del self._entries[i]
+        else:
+            raise KeyError(uuid)
+        del self._times[uuid]
+        self._dates.pop(uuid, None)
+
+    def range(self,
+              lo: Optional[date] = None,
+              hi: Optional[date] = None,
+              lo_inc: bool = True,
+              hi_inc: bool = False,
+              ) -> Iterator[UUID]:
+        # The all-zeros and all-ones UUIDs sort before and after every other
+        # UUID, which lets bisect find the edges of a run of equal times.
+        self._check_zone()
+        if lo is None:
+            start = 0
+        elif lo_inc:
+            start = bisect_left(self._entries, (as_datetime(lo), _MIN_UUID))
+        else:
+            start = bisect_right(self._entries, (as_datetime(lo), _MAX_UUID))
+        if hi is None:
+            end = len(self._entries)
+        elif hi_inc:
+            end = bisect_right(self._entries, (as_datetime(hi), _MAX_UUID))
+        else:
+            end = bisect_left(self._entries, (as_datetime(hi), _MIN_UUID))
+        return (u for _, u in self._entries[start:end])
+
+
+_MIN_UUID = UUID(int=0)
+_MAX_UUID = UUID(int=(1 << 128) - 1)
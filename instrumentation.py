@@ -0,0 +1,148 @@
+import dataclasses
+import functools
+import inspect
+from contextlib import contextmanager
+from time import perf_counter_ns
+from typing import Any, Callable, Iterator, ParamSpec, TypeVar
+
+# Wall time and call counts for the phases of loading and querying task
+# lists.  Recording is off until enable() is called; while it's off, timed
+# functions cost one extra call and a flag check.  While it's on, each call
+# costs two clock reads and a few integer updates on a counter that's bound
+# when the function is decorated, so it's cheap enough to leave on.
+
+P = ParamSpec('P')
+R = TypeVar('R')
+
+_enabled = False
+
+
+class _Counter:
+    __slots__ = ('calls', 'total_ns', 'max_ns')
+
+    def __init__(self) -> None:
+        self.calls = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+    def record(self, elapsed_ns: int) -> None:
+        self.calls += 1
+        self.total_ns += elapsed_ns
+        if elapsed_ns > self.max_ns:
+            self.max_ns = elapsed_ns
+
+
+_counters: dict[str, _Counter] = {}
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class PhaseStats:
+    calls: int
+    total_ns: int
+    max_ns: int
+
+    @property
+    def mean_ns(self) -> float:
+        if self.calls == 0:
+            return 0
+        return self.total_ns / self.calls
+
+    def as_dict(self) -> dict[str, int | float]:
+        return {'calls': self.calls,
+                'totalSeconds': self.total_ns / 1e9,
+                'meanSeconds': self.mean_ns / 1e9,
+                'maxSeconds': self.max_ns / 1e9,
+                }
+
+
+def _counter(name: str) -> _Counter:
+    try:
+        return _counters[name]
+    except KeyError:
+        counter = _counters[name] = _Counter()
+        return counter
+
+
+def enable() -> None:
+    global _enabled
+    _enabled = True
+
+
+def disable() -> None:
+    global _enabled
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    # Counters are zeroed in place, as timed functions hold on to them.
+    for counter in _counters.values():
+        counter.calls = counter.total_ns = counter.max_ns = 0
+
+
+def snapshot() -> dict[str, PhaseStats]:
+    return {name: PhaseStats(c.calls, c.total_ns, c.max_ns)
+            for name, c in sorted(_counters.items())}
+
+
+def snapshot_dict() -> dict[str, dict[str, int | float]]:
+    # The same as snapshot(), but in a form ready to be dumped as JSON.
+    return {name: stats.as_dict() for name, stats in snapshot().items()}
+
+
+@contextmanager
+def phase(name: str) -> Iterator[None]:
+    if not _enabled:
+        yield
+        return
+    counter = _counter(name)
+    start = perf_counter_ns()
+    try:
+        yield
+    finally:
+        counter.record(perf_counter_ns() - start)
+
+
+def timed(name: str) -> Callable[[Callable[P, R]], Callable[P, R]]:
+    counter = _counter(name)
+
+    def decorator(f: Callable[P, R]) -> Callable[P, R]:
+        if inspect.isgeneratorfunction(f):
+            # Time spent in the generator is what matters, not the time the
+            # caller spends between items.
+            @functools.wraps(f)
+            def gen_wrapper(*args: P.args, **kwargs: P.kwargs) -> Any:
+                if not _enabled:
+                    return (yield from f(*args, **kwargs))
+                elapsed = 0
+                gen = f(*args, **kwargs)
+                try:
+                    while True:
+                        start = perf_counter_ns()
+                        try:
+                            item = next(gen)
+                        except StopIteration as e:
+                            elapsed += perf_counter_ns() - start
+                            return e.value
+                        elapsed += perf_counter_ns() - start
+                        yield item
+                finally:
+                    gen.close()
+                    counter.record(elapsed)
+            return gen_wrapper  # type: ignore[return-value]
+
+        @functools.wraps(f)
+        def wrapper(*args: P.args, **kwargs: P.kwargs) -> R:
+            if not _enabled:
+                return f(*args, **kwargs)
+            start = perf_counter_ns()
+            try:
+                return f(*args, **kwargs)
+            finally:
+                counter.record(perf_counter_ns() - start)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,82 @@
+import os
+import time
+import zoneinfo
+from datetime import date, datetime, tzinfo
+from typing import Iterable, Optional
+
+from dateutil import tz
+from pydantic import AwareDatetime
+
+# The local timezone, looked up once rather than for every datetime.  Naive
+# datetimes are given this zone rather than the fixed offset that
+# datetime.astimezone() gives, so times in recurrences keep the same local
+# time either side of a daylight saving change.
+#
+# Changing the TZ environment variable, or the system timezone, while the
+# process is running isn't noticed until refresh_local_zone is called.
+
+_local_zone: Optional[tzinfo] = None
+
+_LOCALTIME_PATH = '/etc/localtime'
+_ZONEINFO_DIR = 'zoneinfo' + os.sep
+
+
+def _resolve_local_zone() -> tzinfo:
+    name = os.environ.get('TZ', '').removeprefix(':')
+    if name:
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+            # Probably a POSIX TZ string that isn't also a zone name, which
+            # the C library understands and zoneinfo doesn't.
+            return tz.tzlocal()
+
+    try:
+        path = os.path.realpath(_LOCALTIME_PATH, strict=True)
+    except OSError:
+        return tz.tzlocal()
+    if _ZONEINFO_DIR in path:
+        try:
+            return zoneinfo.ZoneInfo(path.rsplit(_ZONEINFO_DIR, 1)[1])
+        except (ValueError, zoneinfo.ZoneInfoNotFoundError):
+            pass
+    # A copy of a zone file rather than a link to one, as is common in
+    # containers, doesn't say which zone it is.  A ZoneInfo read from it
+    # would have no real key to write out, and can't be pickled.
+    return tz.tzlocal()
+
+
+def local_zone() -> tzinfo:
+    global _local_zone
+    if _local_zone is None:
+        _local_zone = _resolve_local_zone()
+    return _local_zone
+
+
+def refresh_local_zone() -> tzinfo:
+    global _local_zone
+    # tzset is only available on Unix.
+    if hasattr(time, 'tzset'):
+        time.tzset()
+    _local_zone = _resolve_local_zone()
+    return _local_zone
+
+
+def now() -> AwareDatetime:
+    return datetime.now(local_zone())
+
+
+def make_aware(dt: datetime) -> AwareDatetime:
+    if dt.tzinfo is None:
+        return dt.replace(tzinfo=local_zone())
+    return dt
+
+
+def make_all_aware(dts: Iterable[datetime]) -> list[AwareDatetime]:
+    zone = local_zone()
+    return [dt if dt.tzinfo is not None else dt.replace(tzinfo=zone)
+            for dt in dts]
+
+
+def start_of_day(d: date) -> AwareDatetime:
+    return datetime(d.year, d.month, d.day, tzinfo=local_zone())
@@ -0,0 +1,141 @@
+import os
+from concurrent.futures import Executor, ProcessPoolExecutor
+from typing import Any, Iterator, Optional, TypeVar
+
+from instrumentation import timed
+from task import Task, TaskList, TaskRecurrenceSchedule, TaskTemplate
+
+# Loads a task list with the top-level tasks and schedules validated in a
+# pool of worker processes.  Each top-level task and schedule can be
+# validated independently of the others; everything that links them
+# together -- the TaskList's indexes, the tags, and the references from each
+# task to its parent and the list -- is rebuilt in the parent process, the
+# same way validating the whole list would build them.
+#
+# Validated models come back to the parent pickled.  The references from
+# each task to its parent are cleared before pickling, as they'd otherwise
+# have to be pickled as references back into the tree, and are restored
+# afterwards.
+
+T = TypeVar('T')
+
+# Chunks per worker, so a worker that gets a chunk of large trees doesn't
+# hold up the rest.
+_CHUNKS_PER_WORKER = 4
+
+
+def _chunks(items: list[T], n: int) -> Iterator[list[T]]:
+    size, extra = divmod(len(items), n)
+    start = 0
+    for i in range(n):
+        end = start + size + (1 if i < extra else 0)
+        if end > start:
+            yield items[start:end]
+        start = end
+
+
+def _validate_tasks(documents: list[Any]) -> list[Task]:
+    tasks = [Task.model_validate(d) for d in documents]
+    to_process = list(tasks)
+    while to_process:
+        task = to_process.pop()
+        task._parent = None
+        to_process.extend(task.children)
+    return tasks
+
+
+def _validate_schedules(documents: list[Any]) -> list[TaskRecurrenceSchedule]:
+    schedules = [TaskRecurrenceSchedule.model_validate(d) for d in documents]
+    for schedule in schedules:
+        to_process = list(schedule.tasks)
+        while to_process:
+            template = to_process.pop()
+            template._parent = None
+            del template._schedule
+            to_process.extend(template.children)
+    return schedules
+
+
+def _link_tasks(tasks: list[Task]) -> None:
+    to_process = list(tasks)
+    while to_process:
+        task = to_process.pop()
+        for child in task.children:
+            child._parent = task
+        to_process.extend(task.children)
+
+
+def _link_schedules(schedules: list[TaskRecurrenceSchedule]) -> None:
+    for schedule in schedules:
+        for template in schedule.tasks:
+            template._schedule = schedule
+        to_process: list[TaskTemplate] = list(schedule.tasks)
+        while to_process:
+            template = to_process.pop()
+            for child in template.children:
+                child._parent = template
+                child._schedule = schedule
+            to_process.extend(template.children)
+
+
+def _alias(name: str) -> str:
+    return TaskList.model_fields[name].alias or name
+
+
+def _items(document: dict[str, Any], name: str) -> list[Any]:
+    # The top-level items in the document, which may be given as a single
+    # item rather than a list.
+    value = document.get(_alias(name), [])
+    return value if isinstance(value, list) else [value]
+
+
+@timed('validation.task_list.parallel')
+def load_parallel(document: dict[str, Any],
+                  workers: Optional[int] = None,
+                  executor: Optional[Executor] = None,
+                  ) -> TaskList:
+    # Validates the task list document, as TaskList.model_validate would,
+    # with the work split across processes.  An existing executor can be
+    # given, so a pool can be reused across loads.
+    if workers is None:
+        workers = os.cpu_count() or 1
+    if workers <= 1 and executor is None:
+        # Sending everything to one other process would only add the cost
+        # of pickling.
+        return TaskList.model_validate(document)
+
+    aliases = {_alias('tasks'), _alias('recurring_tasks')}
+    task_documents = _items(document, 'tasks')
+    schedule_documents = _items(document, 'recurring_tasks')
+
+    # Everything except the tasks and schedules, including the tags, is
+    # validated here while the workers get on with the rest.
+    shell_document = {k: [] if k in aliases else v
+                      for k, v in document.items()}
+
+    own_executor = executor is None
+    if executor is None:
+        executor = ProcessPoolExecutor(workers)
+    try:
+        n = workers * _CHUNKS_PER_WORKER
+        task_futures = [executor.submit(_validate_tasks, chunk)
+                        for chunk in _chunks(task_documents, n)]
+        schedule_futures = [executor.submit(_validate_schedules, chunk)
+                            for chunk in _chunks(schedule_documents, n)]
+        tasklist = TaskList.model_validate(shell_document)
+        tasks = [t for f in task_futures for t in f.result()]
+        schedules = [s for f in schedule_futures for s in f.result()]
+    finally:
+        if own_executor:
+            executor.shutdown(cancel_futures=True)
+
+    _link_tasks(tasks)
+    _link_schedules(schedules)
+    # Put the validated trees in place without going through __setattr__,
+    # as validation would, and then index them.
+    tasklist.__dict__['tasks'] = tasklist._tracked('tasks', tasks)
+    tasklist.__dict__['recurring_tasks'] = tasklist._tracked(
+            'recurring_tasks', schedules)
+    tasklist._set_task_tasklist()
+    tasklist._set_schedule_tasklist()
+    return tasklist
@@ -0,0 +1,593 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import marshal
+import os
+import re
+import sys
+from datetime import date, datetime
+from functools import cache
+from pathlib import Path
+from types import CodeType
+from typing import Any, Callable, Iterator, Optional
+from uuid import UUID
+
+import yaml
+
+from instrumentation import timed
+from task import TaskList, valid_child_states
+
+# Checks raw documents against a JSON schema before they're turned into
+# models, so structurally broken input is turned away cheaply.  The schema is
+# compiled into Python source, with a function per subschema and every
+# constant written out as a literal, and the compiled code is cached on disk
+# keyed by a hash of the schema, so later processes only have to load it.
+#
+# Only what the schemas here need is supported: local $refs, the applicators
+# (allOf, anyOf, oneOf, not, if/then/else, properties, additionalProperties,
+# propertyNames, items) and the validation keywords for each type.  Anything
+# else is a compile error rather than being quietly ignored.  Formats are
+# checked leniently, with the parsers the models use, so nothing the models
+# would accept is rejected for its format.
+#
+# The default schema is the one the models publish, which has the $defs for
+# each model and the conditions on child states that schema.yaml's
+# stateChecker describes.  schema.yaml itself no longer matches the models,
+# but it, or any other schema, can be compiled with load_validator.
+#
+# A schema can't say everything the models check, so task_list_validator
+# also runs _check_task_list, which checks that every tag is one the list
+# defines, and applies the child state rules to tasks that leave their state
+# to default to todo.  Those are the only rules that span more than one part
+# of a document.  Validators for other schemas only check the schema, so a
+# document passing one may still be rejected by the models.
+
+# Bump this whenever the generated code changes, so old cache entries are
+# ignored.
+_COMPILER_VERSION = 1
+
+_ANNOTATIONS = frozenset(('$schema', '$id', '$comment', '$defs',
+                          'definitions', 'title', 'description', 'default',
+                          'examples', 'readOnly', 'writeOnly', 'deprecated'))
+
+_KEYWORDS = frozenset((
+        'type', 'enum', 'const', '$ref',
+        'allOf', 'anyOf', 'oneOf', 'not', 'if', 'then', 'else',
+        'properties', 'required', 'additionalProperties', 'propertyNames',
+        'minProperties', 'maxProperties',
+        'items', 'minItems', 'maxItems',
+        'minimum', 'maximum', 'exclusiveMinimum', 'exclusiveMaximum',
+        'multipleOf',
+        'minLength', 'maxLength', 'pattern', 'format'))
+
+_NUMBER = '(isinstance(v, (int, float)) and not isinstance(v, bool))'
+
+_TYPE_CHECKS = {
+    'object': 'isinstance(v, dict)',
+    'array': 'isinstance(v, list)',
+    'string': 'isinstance(v, str)',
+    'boolean': 'isinstance(v, bool)',
+    'null': 'v is None',
+    'number': _NUMBER,
+    'integer': '((isinstance(v, int) and not isinstance(v, bool)) '
+               'or (isinstance(v, float) and v.is_integer()))',
+}
+
+
+class SchemaError(ValueError):
+    def __init__(self, path: tuple[str | int, ...], message: str) -> None:
+        self.path = path
+        self.message = message
+        location = '/'.join(str(p) for p in path) or '(root)'
+        super().__init__(f'{location}: {message}')
+
+
+def _check_parser(parse: Callable[[str], Any]) -> Callable[[str], bool]:
+    def check(value: str) -> bool:
+        try:
+            parse(value)
+        except ValueError:
+            return False
+        return True
+    return check
+
+
+_FORMATS: dict[str, Callable[[str], bool]] = {
+    'date-time': _check_parser(datetime.fromisoformat),
+    'date': _check_parser(date.fromisoformat),
+    'uuid': _check_parser(UUID),
+}
+
+
+def _equal(a: Any, b: Any) -> bool:
+    # JSON equality: booleans aren't numbers, and arrays and objects compare
+    # by their contents.
+    if isinstance(a, bool) or isinstance(b, bool):
+        return type(a) is type(b) and a == b
+    if isinstance(a, list) and isinstance(b, list):
+        return len(a) == len(b) and all(map(_equal, a, b))
+    if isinstance(a, dict) and isinstance(b, dict):
+        return a.keys() == b.keys() and all(_equal(a[k], b[k]) for k in a)
+    if isinstance(a, (list, dict)) or isinstance(b, (list, dict)):
+        return False
+    return bool(a == b)
+
+
+def _member_check(values: list[Any]) -> str:
+    # An expression for whether v is one of the values.
+    if all(isinstance(x, str) for x in values):
+        return f'isinstance(v, str) and v in {frozenset(values)!r}'
+    return f'any(_equal(v, x) for x in {values!r})'
+
+
+def _pointer(base: str, *path: str | int) -> str:
+    parts = (str(p).replace('~', '~0').replace('/', '~1') for p in path)
+    return '/'.join((base, *parts))
+
+
+def _indent(condition: str, lines: list[str]) -> list[str]:
+    if not lines:
+        return []
+    return [condition, *('    ' + line for line in lines)]
+
+
+def _propagate(call: str, key: str = '') -> list[str]:
+    # Returns any error from the call, with the key added to its path.
+    if not key:
+        return [f'e = {call}',
+                'if e is not None:',
+                '    return e']
+    return [f'e = {call}',
+            'if e is not None:',
+            f'    return (({key},) + e[0], e[1])']
+
+
+class _Compiler:
+    def __init__(self, root: Any) -> None:
+        self.root = root
+        self.constants: list[str] = []
+        self.functions: list[str] = []
+        # Function names by the JSON pointer of their subschema.
+        self.names: dict[str, str] = {}
+        self.pending: list[tuple[str, str, Any]] = []
+
+    def resolve(self, ref: str) -> Any:
+        if not ref.startswith('#'):
+            raise ValueError(f'Only local $refs are supported: {ref!r}')
+        node = self.root
+        for part in ref[1:].split('/')[1:]:
+            part = part.replace('~1', '/').replace('~0', '~')
+            try:
+                node = node[int(part) if isinstance(node, list) else part]
+            except (KeyError, IndexError, ValueError, TypeError):
+                raise ValueError(f'Unresolvable $ref {ref!r}') from None
+        return node
+
+    def function(self, pointer: str, schema: Any) -> str:
+        # The name of the function checking the subschema at the pointer,
+        # queuing it to be generated if it hasn't been already.  A subschema
+        # that's only a $ref is checked by its target's function.
+        seen = set()
+        while (isinstance(schema, dict)
+               and schema.keys() - _ANNOTATIONS == {'$ref'}):
+            if pointer in seen:
+                raise ValueError(f'$ref loop at {pointer!r}')
+            seen.add(pointer)
+            pointer = schema['$ref']
+            schema = self.resolve(pointer)
+        try:
+            return self.names[pointer]
+        except KeyError:
+            pass
+        name = self.names[pointer] = f'_v{len(self.names)}'
+        self.pending.append((name, pointer, schema))
+        return name
+
+    def sub(self, pointer: str, schema: dict[str, Any],
+            *path: str | int) -> str:
+        node: Any = schema
+        for p in path:
+            node = node[p]
+        return self.function(_pointer(pointer, *path), node)
+
+    def constant(self, source: str) -> str:
+        name = f'_c{len(self.constants)}'
+        self.constants.append(f'{name} = {source}')
+        return name
+
+    def compile(self) -> str:
+        self.function('#', self.root)
+        while self.pending:
+            self._emit(*self.pending.pop())
+        return '\n'.join((*self.constants, *self.functions,
+                          f'check = {self.names["#"]}', ''))
+
+    def _emit(self, name: str, pointer: str, schema: Any) -> None:
+        # Each function returns None if the value is valid, or the path to
+        # the problem and a description of it.
+        if schema is True:
+            body = []
+        elif schema is False:
+            body = ["return ((), 'no value is allowed here')"]
+        elif isinstance(schema, dict):
+            unknown = schema.keys() - _ANNOTATIONS - _KEYWORDS
+            if unknown:
+                raise ValueError(f'Unsupported keywords {sorted(unknown)} '
+                                 f'at {pointer!r}')
+            body = [line
+                    for generate in _GENERATORS
+                    for line in generate(self, pointer, schema)]
+        else:
+            raise ValueError(f'Not a schema at {pointer!r}')
+        self.functions.append(f'def {name}(v):')
+        self.functions.extend('    ' + line for line in body)
+        self.functions.append('    return None')
+        self.functions.append('')
+
+
+_Generator = Callable[[_Compiler, str, dict[str, Any]], list[str]]
+
+
+def _type(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    if 'type' not in schema:
+        return []
+    types = schema['type']
+    if isinstance(types, str):
+        types = [types]
+    try:
+        check = ' or '.join(_TYPE_CHECKS[t] for t in types)
+    except KeyError as e:
+        raise ValueError(f'Unknown type {e} at {pointer!r}') from None
+    message = 'expected ' + ' or '.join(types)
+    return [f'if not ({check}):',
+            f'    return ((), {message!r})']
+
+
+def _enum(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    lines = []
+    if 'enum' in schema:
+        values = schema['enum']
+        message = f'expected one of {values!r}'
+        lines += [f'if not ({_member_check(values)}):',
+                  f'    return ((), {message!r})']
+    if 'const' in schema:
+        value = schema['const']
+        message = f'expected {value!r}'
+        lines += [f'if not ({_member_check([value])}):',
+                  f'    return ((), {message!r})']
+    return lines
+
+
+def _object(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    lines = []
+    properties = schema.get('properties', {})
+    for key in properties:
+        name = c.sub(pointer, schema, 'properties', key)
+        lines += _indent(f'if {key!r} in v:',
+                         _propagate(f'{name}(v[{key!r}])', repr(key)))
+    for key in schema.get('required', ()):
+        lines += [f'if {key!r} not in v:',
+                  f'    return ((), {"missing " + key!r})']
+    if 'minProperties' in schema:
+        lines += [f'if len(v) < {schema["minProperties"]!r}:',
+                  "    return ((), 'too few properties')"]
+    if 'maxProperties' in schema:
+        lines += [f'if len(v) > {schema["maxProperties"]!r}:',
+                  "    return ((), 'too many properties')"]
+
+    each = []
+    if schema.get('propertyNames', True) is not True:
+        name = c.sub(pointer, schema, 'propertyNames')
+        each += [f'if {name}(k) is not None:',
+                 "    return ((k,), 'invalid property name')"]
+    additional = schema.get('additionalProperties', True)
+    known = frozenset(properties)
+    if additional is False:
+        each += [f'if k not in {known!r}:',
+                 "    return ((k,), 'unexpected property')"]
+    elif additional is not True:
+        name = c.sub(pointer, schema, 'additionalProperties')
+        each += _indent(f'if k not in {known!r}:',
+                        _propagate(f'{name}(v[k])', 'k'))
+    lines += _indent('for k in v:', each)
+    return _indent('if isinstance(v, dict):', lines)
+
+
+def _array(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    lines = []
+    if 'minItems' in schema:
+        lines += [f'if len(v) < {schema["minItems"]!r}:',
+                  "    return ((), 'too few items')"]
+    if 'maxItems' in schema:
+        lines += [f'if len(v) > {schema["maxItems"]!r}:',
+                  "    return ((), 'too many items')"]
+    if schema.get('items', True) is not True:
+        name = c.sub(pointer, schema, 'items')
+        lines += _indent('for i, x in enumerate(v):',
+                         _propagate(f'{name}(x)', 'i'))
+    return _indent('if isinstance(v, list):', lines)
+
+
+def _number(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    lines = []
+    for keyword, op in (('minimum', '<'), ('maximum', '>'),
+                        ('exclusiveMinimum', '<='),
+                        ('exclusiveMaximum', '>=')):
+        if keyword in schema:
+            limit = schema[keyword]
+            message = f'{keyword} is {limit}'
+            lines += [f'if v {op} {limit!r}:',
+                      f'    return ((), {message!r})']
+    if 'multipleOf' in schema:
+        factor = schema['multipleOf']
+        message = f'not a multiple of {factor}'
+        lines += [f'if (v / {factor!r}) % 1:',
+                  f'    return ((), {message!r})']
+    return _indent(f'if {_NUMBER}:', lines)
+
+
+def _string(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    lines = []
+    if 'minLength' in schema:
+        lines += [f'if len(v) < {schema["minLength"]!r}:',
+                  "    return ((), 'too short')"]
+    if 'maxLength' in schema:
+        lines += [f'if len(v) > {schema["maxLength"]!r}:',
+                  "    return ((), 'too long')"]
+    if 'pattern' in schema:
+        pattern = c.constant(f'_re.compile({schema["pattern"]!r})')
+        message = f'does not match {schema["pattern"]}'
+        lines += [f'if not {pattern}.search(v):',
+                  f'    return ((), {message!r})']
+    # Formats with no checker are annotations only, as the specification
+    # allows.
+    if schema.get('format') in _FORMATS:
+        fmt = schema['format']
+        lines += [f'if not _FORMATS[{fmt!r}](v):',
+                  f'    return ((), {"not a valid " + fmt!r})']
+    return _indent('if isinstance(v, str):', lines)
+
+
+def _ref(c: _Compiler, pointer: str, schema: dict[str, Any]) -> list[str]:
+    if '$ref' not in schema:
+        return []
+    target = c.function(schema['$ref'], c.resolve(schema['$ref']))
+    return _propagate(f'{target}(v)')
+
+
+def _applicators(c: _Compiler, pointer: str,
+                 schema: dict[str, Any]) -> list[str]:
+    lines = []
+    for i in range(len(schema.get('allOf', ()))):
+        lines += _propagate(f'{c.sub(pointer, schema, "allOf", i)}(v)')
+    if 'anyOf' in schema:
+        # Reports the problem with the first alternative, as the one most
+        # likely to have been meant.
+        names = [c.sub(pointer, schema, 'anyOf', i)
+                 for i in range(len(schema['anyOf']))]
+        lines += [f'e = {names[0]}(v)']
+        for name in names[1:]:
+            lines += [f'if e is not None and {name}(v) is None:',
+                      '    e = None']
+        lines += ['if e is not None:',
+                  '    return e']
+    if 'oneOf' in schema:
+        names = [c.sub(pointer, schema, 'oneOf', i)
+                 for i in range(len(schema['oneOf']))]
+        lines += [f'n = sum(f(v) is None for f in ({", ".join(names)},))',
+                  'if n != 1:',
+                  "    return ((), f'matches {n} of the oneOf schemas')"]
+    if 'not' in schema:
+        lines += [f'if {c.sub(pointer, schema, "not")}(v) is None:',
+                  "    return ((), 'matches a schema it must not')"]
+    if 'if' in schema and ('then' in schema or 'else' in schema):
+        condition = f'{c.sub(pointer, schema, "if")}(v) is None'
+        then = (_propagate(f'{c.sub(pointer, schema, "then")}(v)')
+                if 'then' in schema else ['pass'])
+        otherwise = (_propagate(f'{c.sub(pointer, schema, "else")}(v)')
+                     if 'else' in schema else ['pass'])
+        lines += [*_indent(f'if {condition}:', then),
+                  *_indent('else:', otherwise)]
+    return lines
+
+
+# Checks are made in this order: the type first, as it's the cheapest and
+# the most likely problem.
+_GENERATORS: tuple[_Generator, ...] = (_type, _enum, _object, _array,
+                                       _number, _string, _ref, _applicators)
+
+
+def compile_schema(schema: Any) -> str:
+    # The generated source, which defines check(value).
+    return _Compiler(schema).compile()
+
+
+_Path = tuple[str | int, ...]
+
+
+def _items(document: dict[str, Any], key: str,
+           ) -> Iterator[tuple[_Path, Any]]:
+    # The items of a list field, which may be given as a single item.
+    value = document.get(key, [])
+    if isinstance(value, list):
+        for i, item in enumerate(value):
+            yield (key, i), item
+    else:
+        yield (key,), value
+
+
+def _check_task_list(document: Any) -> Optional[tuple[_Path, str]]:
+    # The first problem _Compiler can't express, in a document that's
+    # already been checked against the task list schema.
+    known_tags = {t if isinstance(t, str) else t['name']
+                  for _, t in _items(document, 'tags')}
+    # (path, task or template, whether it's a task, its parent task's state)
+    Item = tuple[_Path, dict[str, Any], bool, Any]
+    to_process: list[Item] = [(p, t, True, None)
+                              for p, t in _items(document, 'tasks')]
+    for path, schedule in _items(document, 'recurringTasks'):
+        to_process.extend((path + p, t, False, None)
+                          for p, t in _items(schedule, 'tasks'))
+    to_process.reverse()
+    while to_process:
+        path, item, is_task, parent_state = to_process.pop()
+        for p, tag in _items(item, 'tags'):
+            if tag not in known_tags:
+                return path + p, f'unknown tag {tag!r}'
+        state: Any = None
+        if is_task:
+            state = item.get('state', 'todo')
+            if (parent_state is not None
+                    and state not in valid_child_states(parent_state)):
+                return (path + ('state',),
+                        f'cannot be {state} under a {parent_state} task')
+        children: list[Item] = [(path + p, child, is_task, state)
+                                for p, child in _items(item, 'children')]
+        to_process.extend(reversed(children))
+    return None
+
+
+def _cache_dir() -> Path:
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'asmodeus'
+
+
+def _schema_key(schema: Any) -> str:
+    # Code objects only load in the Python version that compiled them, so
+    # its magic number is part of the key.
+    h = hashlib.sha256()
+    h.update(importlib.util.MAGIC_NUMBER)
+    h.update(str(_COMPILER_VERSION).encode())
+    h.update(json.dumps(schema, sort_keys=True, separators=(',', ':'),
+                        default=str).encode())
+    return f'{sys.implementation.cache_tag}-{h.hexdigest()}'
+
+
+# Each cache file starts with the key it was stored under, which is checked
+# before the code is loaded, so a file that was renamed, or written by
+# something else, is compiled again rather than run.
+def _cache_header(key: str) -> bytes:
+    return f'asmodeus-schema {key}\n'.encode()
+
+
+def _load_cached(path: Path, key: str) -> Optional[CodeType]:
+    header = _cache_header(key)
+    try:
+        data = path.read_bytes()
+    except OSError:
+        return None
+    if not data.startswith(header):
+        return None
+    try:
+        code = marshal.loads(data[len(header):])
+    except (EOFError, ValueError, TypeError):
+        return None
+    return code if isinstance(code, CodeType) else None
+
+
+def _store_cached(path: Path, key: str, code: CodeType) -> None:
+    tmp = path.with_name(f'{path.name}.{os.getpid()}.tmp')
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_bytes(_cache_header(key) + marshal.dumps(code))
+        os.replace(tmp, path)
+    except OSError:
+        # Nowhere to cache it, so it'll be compiled again next time.
+        tmp.unlink(missing_ok=True)
+
+
+_Check = Callable[[Any], Optional[tuple[_Path, str]]]
+
+
+class Validator:
+    def __init__(self, code: CodeType,
+                 cross_check: Optional[_Check] = None) -> None:
+        # cross_check, if given, is run on documents that pass the schema.
+        namespace = {'_equal': _equal, '_FORMATS': _FORMATS, '_re': re}
+        exec(code, namespace)
+        self._schema_check: _Check = namespace['check']
+        self._cross_check = cross_check
+
+    def _check(self, document: Any) -> Optional[tuple[_Path, str]]:
+        error = self._schema_check(document)
+        if error is None and self._cross_check is not None:
+            error = self._cross_check(document)
+        return error
+
+    @timed('validation.precheck')
+    def validate(self, document: Any) -> None:
+        # Raises SchemaError for the first problem found in the document,
+        # which should be as it came from json.loads or yaml.safe_load.
+        error = self._check(document)
+        if error is not None:
+            raise SchemaError(*error)
+
+    def is_valid(self, document: Any) -> bool:
+        return self._check(document) is None
+
+
+def load_validator(schema: Any,
+                   cache_dir: Optional[Path] = None,
+                   cross_check: Optional[_Check] = None) -> Validator:
+    # The validator for the schema, from the cache if it's been compiled
+    # before.
+    if cache_dir is None:
+        cache_dir = _cache_dir()
+    key = _schema_key(schema)
+    path = cache_dir / f'schema-{key}.marshal'
+    code = _load_cached(path, key)
+    if code is None:
+        code = compile(compile_schema(schema), f'<schema {path.name}>',
+                       'exec')
+        _store_cached(path, key, code)
+    return Validator(code, cross_check)
+
+
+def task_list_schema() -> dict[str, Any]:
+    return TaskList.model_json_schema()
+
+
+@cache
+def task_list_validator() -> Validator:
+    return load_validator(task_list_schema(), cross_check=_check_task_list)
+
+
+def load_schema(path: Path | str) -> Any:
+    # A schema from a YAML or JSON file, such as schema.yaml.
+    with open(path, encoding='utf-8') as f:
+        return yaml.safe_load(f)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+            description='Check task list files against the schema without '
+                        'loading them')
+    parser.add_argument('files', type=Path, nargs='*')
+    parser.add_argument('--schema', type=Path,
+                        help='Schema file to check against, instead of the '
+                             'one the task list models publish')
+    parser.add_argument('--show-code', action='store_true',
+                        help='Print the code the schema compiles to')
+    args = parser.parse_args(argv)
+
+    if args.schema is None:
+        schema = task_list_schema()
+        validator = task_list_validator()
+    else:
+        schema = load_schema(args.schema)
+        validator = load_validator(schema)
+    if args.show_code:
+        print(compile_schema(schema), end='')
+    status = 0
+    for path in args.files:
+        try:
+            validator.validate(json.loads(path.read_bytes()))
+        except (OSError, ValueError) as e:
+            print(f'{path}: {e}', file=sys.stderr)
+            status = 1
+    return status
+
+
+if __name__ == '__main__':
+    sys.exit(main())
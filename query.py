@@ -0,0 +1,470 @@
+from abc import ABC, abstractmethod
+from datetime import date, datetime, timedelta
+from typing import Callable, Iterable, Literal, Optional, Self, get_args
+from uuid import UUID
+import operator
+import re
+
+from pydantic import AwareDatetime
+
+import localtime
+from index import TimeIndex, as_datetime
+from instrumentation import timed
+from task import Task, TaskList, TaskState
+from timedelta import RelativeTime
+
+# Queries are whitespace-separated terms, implicitly ANDed together, e.g.
+#
+#     state:todo tag:work due<+7d urgency>3
+#
+# Terms can be grouped with parentheses, combined with "or", and negated with
+# "not" or a leading "-".  A term is a field, an operator and a value; a bare
+# word matches against task titles.  "state" and "tag" take a comma-separated
+# list of alternatives, and "tag" also takes a list of tags joined with "+",
+# all of which must be present.  Times are "now", "today", "none" (for unset fields),
+# an ISO 8601 date, datetime or duration, or a short relative time like "+7d"
+# or "-2w", which is relative to the time the query is run.
+
+Predicate = Callable[[Task], bool]
+Candidates = Optional[set[UUID]]
+Op = Literal[':', '=', '<', '<=', '>', '>=']
+
+_COMPARISONS: dict[str, Callable[[object, object], bool]] = {
+    ':': operator.eq,
+    '=': operator.eq,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    }
+
+_TOKEN_RE = re.compile(r'\(|\)|(?:[^\s()"]|"[^"]*")+')
+_TERM_RE = re.compile(r'^(?P<field>[a-z]+)(?P<op><=|>=|<|>|=|:)(?P<value>.+)$')
+_SHORT_RELATIVE_RE = re.compile(r'^(?P<sign>[+-])(?P<n>\d+)'
+                                r'(?P<unit>y|mo|w|d|h|min|s)$')
+_SHORT_RELATIVE_UNITS = {'y': 'P{}Y',
+                         'mo': 'P{}M',
+                         'd': 'P{}D',
+                         'h': 'PT{}H',
+                         'min': 'PT{}M',
+                         's': 'PT{}S',
+                         }
+
+
+def parse_relative_time(s: str) -> RelativeTime:
+    # Accepts "+7d" style shorthand as well as (optionally signed) ISO 8601
+    # durations; either way the value goes through RelativeTime.from_str.
+    m = _SHORT_RELATIVE_RE.match(s)
+    if m is not None:
+        n = int(m['n'])
+        if m['sign'] == '-':
+            n = -n
+        if m['unit'] == 'w':
+            # RelativeTime only accepts unsigned week counts.
+            return RelativeTime.from_str(f'P{n * 7}D')
+        return RelativeTime.from_str(_SHORT_RELATIVE_UNITS[m['unit']].format(n))
+    if s.startswith('-'):
+        return -RelativeTime.from_str(s[1:])
+    return RelativeTime.from_str(s.removeprefix('+'))
+
+
+class TimeBound:
+    __slots__ = ('_value',)
+
+    def __init__(self, value: date | RelativeTime | Literal['now', 'today']
+                 ) -> None:
+        self._value = value
+
+    @classmethod
+    def from_str(cls, s: str) -> Self:
+        if s in ('now', 'today'):
+            return cls(s)  # type: ignore[arg-type]
+        if s[0] in '+-P':
+            return cls(parse_relative_time(s))
+        try:
+            return cls(date.fromisoformat(s))
+        except ValueError:
+            pass
+        try:
+            return cls(datetime.fromisoformat(s))
+        except ValueError:
+            raise ValueError(f'Could not parse {s!r} as a time') from None
+
+    def is_whole_day(self) -> bool:
+        return (self._value == 'today'
+                or (isinstance(self._value, date)
+                    and not isinstance(self._value, datetime)))
+
+    def resolve(self, now: AwareDatetime) -> AwareDatetime:
+        match self._value:
+            case 'now':
+                return now
+            case 'today':
+                return as_datetime(now.date())
+            case RelativeTime():
+                return now + self._value
+            case date():
+                return as_datetime(self._value)
+        raise AssertionError(self._value)
+
+
+class Node(ABC):
+    @abstractmethod
+    def matches(self, task: Task, now: AwareDatetime) -> bool: ...
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        # Returns the set of candidate UUIDs that can be answered from the
+        # TaskList indexes, or None if they can't, and a predicate that still
+        # needs checking against each candidate, or None if the candidates are
+        # exact.
+        return None, lambda task: self.matches(task, now)
+
+
+class And(Node):
+    def __init__(self, children: Iterable[Node]) -> None:
+        self.children = list(children)
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return all(c.matches(task, now) for c in self.children)
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        candidates: Candidates = None
+        residuals: list[Predicate] = []
+        for child in self.children:
+            child_candidates, residual = child.plan(tasklist, now)
+            if child_candidates is not None:
+                if candidates is None:
+                    candidates = child_candidates
+                else:
+                    candidates &= child_candidates
+            if residual is not None:
+                residuals.append(residual)
+        return candidates, _all_of(residuals)
+
+
+class Or(Node):
+    def __init__(self, children: Iterable[Node]) -> None:
+        self.children = list(children)
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return any(c.matches(task, now) for c in self.children)
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        candidates: set[UUID] = set()
+        for child in self.children:
+            child_candidates, residual = child.plan(tasklist, now)
+            if child_candidates is None or residual is not None:
+                return super().plan(tasklist, now)
+            candidates |= child_candidates
+        return candidates, None
+
+
+class Not(Node):
+    def __init__(self, child: Node) -> None:
+        self.child = child
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return not self.child.matches(task, now)
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        child_candidates, residual = self.child.plan(tasklist, now)
+        if child_candidates is None or residual is not None:
+            return super().plan(tasklist, now)
+        return tasklist._tasks_by_uuid.keys() - child_candidates, None
+
+
+class StateTerm(Node):
+    def __init__(self, states: Iterable[TaskState]) -> None:
+        self.states = frozenset(states)
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return task.state in self.states
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        candidates: set[UUID] = set()
+        for state in self.states:
+            candidates.update(tasklist._tasks_by_state.get(state, ()))
+        return candidates, None
+
+
+class TagTerm(Node):
+    def __init__(self, tags: Iterable[str], require_all: bool = False,
+                 ) -> None:
+        self.tags = frozenset(tags)
+        self.require_all = require_all
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        tasklist = task._get_tasklist()
+        if tasklist is None:
+            if self.require_all:
+                return self.tags.issubset(task.tags)
+            return not self.tags.isdisjoint(task.tags)
+        known = [t for t in self.tags if t in tasklist._tag_ids]
+        if self.require_all and len(known) < len(self.tags):
+            return False
+        mask = tasklist.tag_mask(known)
+        if self.require_all:
+            return task.has_all_tags(mask)
+        return task.has_any_tags(mask)
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        if self.require_all:
+            candidates = None
+            for tag in self.tags:
+                tagged = tasklist._tasks_by_tag.get(tag, {}).keys()
+                if candidates is None:
+                    candidates = set(tagged)
+                else:
+                    candidates &= tagged
+            return candidates or set(), None
+        candidates: set[UUID] = set()
+        for tag in self.tags:
+            candidates.update(tasklist._tasks_by_tag.get(tag, ()))
+        return candidates, None
+
+
+class TimeTerm(Node):
+    def __init__(self,
+                 field: Literal['due', 'wait', 'created', 'ended'],
+                 op: Op,
+                 bound: Optional[TimeBound],
+                 ) -> None:
+        if bound is None and op not in (':', '='):
+            raise ValueError(f'Cannot compare {field} with none using {op}')
+        self.field = field
+        self.op = op
+        self.bound = bound
+
+    def _range(self, now: AwareDatetime,
+               ) -> tuple[Optional[AwareDatetime], Optional[AwareDatetime],
+                          bool, bool]:
+        assert self.bound is not None
+        t = self.bound.resolve(now)
+        match self.op:
+            case ':' | '=' if self.bound.is_whole_day():
+                return t, as_datetime(t.date() + timedelta(days=1)), True, False
+            case ':' | '=':
+                return t, t, True, True
+            case '<':
+                return None, t, True, False
+            case '<=':
+                return None, t, True, True
+            case '>':
+                return t, None, False, True
+            case '>=':
+                return t, None, True, True
+        raise AssertionError(self.op)
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        value = getattr(task, self.field)
+        if self.bound is None:
+            return value is None
+        if value is None:
+            return False
+        value = as_datetime(value)
+        lo, hi, lo_inc, hi_inc = self._range(now)
+        if lo is not None and (value < lo or (value == lo and not lo_inc)):
+            return False
+        if hi is not None and (value > hi or (value == hi and not hi_inc)):
+            return False
+        return True
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        index: TimeIndex
+        match self.field:
+            case 'due':
+                index = tasklist._tasks_by_due
+            case 'wait':
+                index = tasklist._tasks_by_wait
+            case _:
+                return super().plan(tasklist, now)
+        if self.bound is None:
+            return tasklist._tasks_by_uuid.keys() - set(index), None
+        return set(index.range(*self._range(now))), None
+
+
+class UrgencyTerm(Node):
+    def __init__(self, op: Op, value: float) -> None:
+        self.compare = _COMPARISONS[op]
+        self.value = value
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return self.compare(task.urgency_at(now), self.value)
+
+
+class TitleTerm(Node):
+    def __init__(self, word: str) -> None:
+        self.word = word.casefold()
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return self.word in task.title.casefold()
+
+
+class UUIDTerm(Node):
+    def __init__(self, prefix: str) -> None:
+        self.prefix = prefix.lower()
+
+    def matches(self, task: Task, now: AwareDatetime) -> bool:
+        return str(task.uuid).startswith(self.prefix)
+
+    def plan(self, tasklist: TaskList, now: AwareDatetime,
+             ) -> tuple[Candidates, Optional[Predicate]]:
+        try:
+            uuid = UUID(self.prefix)
+        except ValueError:
+            return super().plan(tasklist, now)
+        if uuid in tasklist._tasks_by_uuid:
+            return {uuid}, None
+        return set(), None
+
+
+def _all_of(predicates: list[Predicate]) -> Optional[Predicate]:
+    if not predicates:
+        return None
+    if len(predicates) == 1:
+        return predicates[0]
+
+    def check(task: Task) -> bool:
+        for p in predicates:
+            if not p(task):
+                return False
+        return True
+    return check
+
+
+def _split_alternatives(value: str) -> list[str]:
+    return [v for v in value.split(',') if v]
+
+
+def _parse_term(token: str) -> Node:
+    m = _TERM_RE.match(token)
+    if m is None:
+        return TitleTerm(token.replace('"', ''))
+
+    field = m['field']
+    op: Op = m['op']  # type: ignore[assignment]
+    value = m['value'].replace('"', '')
+    match field:
+        case 'state':
+            if op not in (':', '='):
+                raise ValueError(f'Cannot compare state using {op}')
+            states = _split_alternatives(value)
+            for state in states:
+                if state not in get_args(TaskState):
+                    raise ValueError(f'Unknown task state {state!r}')
+            return StateTerm(states)  # type: ignore[arg-type]
+        case 'tag' | 'tags':
+            if op not in (':', '='):
+                raise ValueError(f'Cannot compare tags using {op}')
+            if '+' in value:
+                return TagTerm([v for v in value.split('+') if v],
+                               require_all=True)
+            return TagTerm(_split_alternatives(value))
+        case 'due' | 'wait' | 'created' | 'ended':
+            if value == 'none':
+                return TimeTerm(field, op, None)
+            return TimeTerm(field, op, TimeBound.from_str(value))
+        case 'urgency':
+            return UrgencyTerm(op, float(value))
+        case 'title':
+            return TitleTerm(value)
+        case 'uuid':
+            return UUIDTerm(value)
+    raise ValueError(f'Unknown query field {field!r}')
+
+
+class _Parser:
+    def __init__(self, s: str) -> None:
+        self._tokens = _TOKEN_RE.findall(s)
+        self._pos = 0
+
+    def _peek(self) -> Optional[str]:
+        if self._pos < len(self._tokens):
+            return self._tokens[self._pos]
+        return None
+
+    def _next(self) -> str:
+        token = self._tokens[self._pos]
+        self._pos += 1
+        return token
+
+    def parse(self) -> Node:
+        node = self._parse_or()
+        if self._peek() is not None:
+            raise ValueError(f'Unexpected {self._peek()!r} in query')
+        return node
+
+    def _parse_or(self) -> Node:
+        children = [self._parse_and()]
+        while self._peek() == 'or':
+            self._next()
+            children.append(self._parse_and())
+        if len(children) == 1:
+            return children[0]
+        return Or(children)
+
+    def _parse_and(self) -> Node:
+        children: list[Node] = []
+        while self._peek() not in (None, ')', 'or'):
+            children.append(self._parse_unary())
+        if len(children) == 1:
+            return children[0]
+        # An empty And matches everything, which is what an empty query
+        # should do.
+        return And(children)
+
+    def _parse_unary(self) -> Node:
+        token = self._next()
+        if token == 'not':
+            if self._peek() in (None, ')', 'or'):
+                raise ValueError('Expected a term after "not"')
+            return Not(self._parse_unary())
+        if token == '(':
+            node = self._parse_or()
+            if self._peek() != ')':
+                raise ValueError('Unbalanced parentheses in query')
+            self._next()
+            return node
+        if token == ')':
+            raise ValueError('Unbalanced parentheses in query')
+        if token.startswith('-') and len(token) > 1:
+            return Not(_parse_term(token[1:]))
+        return _parse_term(token)
+
+
+class Query:
+    def __init__(self, s: str) -> None:
+        self.source = s
+        self.root = _Parser(s).parse()
+
+    def __repr__(self) -> str:
+        return f'{self.__class__.__name__}({self.source!r})'
+
+    def matches(self, task: Task, now: Optional[AwareDatetime] = None,
+                ) -> bool:
+        if now is None:
+            now = localtime.now()
+        return self.root.matches(task, now)
+
+    @timed('query.run')
+    def run(self, tasklist: TaskList, now: Optional[AwareDatetime] = None,
+            ) -> list[Task]:
+        if now is None:
+            now = localtime.now()
+        tasklist.load_all()
+        candidates, residual = self.root.plan(tasklist, now)
+        tasks: Iterable[Task]
+        if candidates is None:
+            tasks = tasklist.all_tasks()
+        else:
+            tasks = map(tasklist._tasks_by_uuid.__getitem__, candidates)
+        if residual is None:
+            return list(tasks)
+        return [t for t in tasks if residual(t)]
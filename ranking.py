@@ -0,0 +1,117 @@
+from datetime import timedelta
+from typing import Container, Optional
+
+from pydantic import AwareDatetime
+
+import localtime
+from task import Task, TaskList, TaskState
+
+# Task urgency only depends on the current time through its age term, which
+# grows linearly until it reaches the age maximum.  Between the times when
+# two tasks' urgencies cross, or when a task reaches its maximum, the ranking
+# by urgency can't change, so UrgencyRanking works out the earliest of those
+# times and serves the cached ranking until then.  After that, it recomputes
+# the urgencies and re-sorts the existing order, which is already nearly
+# sorted, so it's cheap.  Any change to the TaskList discards the cache.
+
+_DAY = timedelta(days=1)
+
+
+class _Line:
+    # The urgency of a single task as a function of time: "base" plus a term
+    # that changes by "slope" per day from "start", and is then held at
+    # "limit" from "limit_time" onwards.
+    __slots__ = ('task', 'base', 'start', 'slope', 'limit', 'limit_time')
+
+    def __init__(self, task: Task) -> None:
+        self.task = task
+        self.base = task.inherited_base_urgency + task.tag_urgency
+        self.start = task.created
+        self.slope = task.inherited_age_urgency_factor
+        self.limit: Optional[float] = task.inherited_age_urgency_max
+        self.limit_time: Optional[AwareDatetime] = None
+        if self.limit is not None and self.slope != 0:
+            self.limit_time = self.start + _DAY * (self.limit / self.slope)
+
+    def value(self, when: AwareDatetime) -> float:
+        age_urgency = ((when - self.start) / _DAY) * self.slope
+        if self.limit is not None:
+            age_urgency = min(age_urgency, self.limit)
+        return self.base + age_urgency
+
+    def slope_at(self, when: AwareDatetime) -> float:
+        if self.limit is None:
+            return self.slope
+        age_urgency = ((when - self.start) / _DAY) * self.slope
+        if age_urgency < self.limit:
+            return self.slope
+        return 0
+
+
+class UrgencyRanking:
+    def __init__(self,
+                 tasklist: TaskList,
+                 states: Container[TaskState] = ('todo',),
+                 ) -> None:
+        self.tasklist = tasklist
+        self.states = states
+        self._generation: Optional[int] = None
+        self._lines: list[_Line] = []
+        self._computed_at: Optional[AwareDatetime] = None
+        self._horizon: Optional[AwareDatetime] = None
+
+    @property
+    def horizon(self) -> Optional[AwareDatetime]:
+        # The time until which the current ranking is valid, or None if the
+        # ranking hasn't been computed or can never change.
+        return self._horizon
+
+    def _rebuild(self) -> None:
+        self._lines = [_Line(t) for t in self.tasklist.all_tasks()
+                       if t.state in self.states]
+        self._generation = self.tasklist._generation
+        self._computed_at = None
+
+    def _compute_horizon(self, now: AwareDatetime, values: dict[int, float],
+                         ) -> Optional[AwareDatetime]:
+        horizon: Optional[AwareDatetime] = None
+
+        def consider(t: AwareDatetime) -> None:
+            nonlocal horizon
+            if t > now and (horizon is None or t < horizon):
+                horizon = t
+
+        for line in self._lines:
+            if line.limit_time is not None:
+                consider(line.limit_time)
+
+        slopes = [line.slope_at(now) for line in self._lines]
+        for i in range(len(self._lines) - 1):
+            higher = values[id(self._lines[i])]
+            lower = values[id(self._lines[i + 1])]
+            closing = slopes[i + 1] - slopes[i]
+            if closing > 0:
+                consider(now + _DAY * ((higher - lower) / closing))
+        return horizon
+
+    def ranked(self, now: Optional[AwareDatetime] = None) -> list[Task]:
+        # Tasks in descending order of urgency at "now".
+        if now is None:
+            now = localtime.now()
+
+        if self._generation != self.tasklist._generation:
+            self._rebuild()
+        elif (self._computed_at is not None
+                and self._computed_at <= now
+                and (self._horizon is None or now < self._horizon)):
+            return [line.task for line in self._lines]
+
+        # Ties are broken by slope, so tasks with equal urgency are already in
+        # the order they'll be in a moment later.
+        values = {id(line): line.value(now) for line in self._lines}
+        self._lines.sort(key=lambda line: (values[id(line)],
+                                           line.slope_at(now)),
+                         reverse=True)
+        self._horizon = self._compute_horizon(now, values)
+        self._computed_at = now
+        return [line.task for line in self._lines]
@@ -1,13 +1,15 @@
 from datetime import datetime
-from abc import ABC
+from abc import ABC, abstractmethod
 from typing import (
         Annotated,
         Any,
+        Hashable,
         Iterator,
         Optional,
         Self,
         overload,
         )
+from weakref import WeakValueDictionary
 
 from pydantic import (
         AwareDatetime,
@@ -23,12 +25,14 @@ from annotated_types import Ge, Le
 
 from _type_meta import (
         BaseModel,
+        DatetimeListToAware,
         DatetimeToAware,
         IntEnumSchema,
         NotZero,
         SingletonToList,
         add_condition_to_json_schema,
         )
+from instrumentation import timed
 from weekday import WeekdayName, _dateutilWeekdayOffsetAnnotation
 
 
@@ -45,14 +49,62 @@ class Frequency(IntEnumSchema):
     SECONDLY = rrule.SECONDLY
 
 
+# Compiled rules, keyed on the values they were compiled from, so identical
+# recurrences share one rule object and its cache of occurrences.  Entries go
+# once no recurrence refers to them any more.
+_compiled: WeakValueDictionary[Hashable, rrule.rrule | rrule.rruleset]
+_compiled = WeakValueDictionary()
+
+
+def _key_value(value: Any) -> Hashable:
+    if isinstance(value, list):
+        return tuple(_key_value(v) for v in value)
+    if isinstance(value, datetime):
+        # Equal datetimes in different timezones produce occurrences in
+        # different timezones, so they can't share a rule.
+        return (value, value.tzinfo)
+    return value
+
+
+def _hashable_or_none(key: Hashable) -> Optional[Hashable]:
+    # Some timezones, such as dateutil's tzlocal, can't be hashed, so rules
+    # that use them can't be shared.
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
 class _BaseRecurrence(BaseModel, ABC):
     _rrule: rrule.rrule | rrule.rruleset
+    # The key of the compiled rule in _compiled, or None if it can't be
+    # shared.
+    _key: Optional[Hashable] = None
 
     model_config = ConfigDict(populate_by_name=True,
                               extra='forbid',
                               frozen=True,
                               )
 
+    def __getstate__(self) -> dict[Any, Any]:
+        # Compiled rules can't be pickled, as they hold a lock, so they're
+        # compiled again (or found in _compiled) when unpickling.
+        state = super().__getstate__()
+        private = dict(state['__pydantic_private__'] or {})
+        private.pop('_rrule', None)
+        private.pop('_key', None)
+        return state | {'__pydantic_private__': private}
+
+    def __setstate__(self, state: dict[Any, Any]) -> None:
+        super().__setstate__(state)
+        self._after_validator()
+
+    @abstractmethod
+    def _after_validator(self) -> Self:
+        # Compiles the rule; each subclass defines it as a model validator.
+        ...
+
     @overload
     def __getitem__(self, item: int) -> AwareDatetime: ...
     @overload
@@ -70,10 +122,12 @@ class _BaseRecurrence(BaseModel, ABC):
     def count(self) -> int:
         return self._rrule.count()
 
+    @timed('recurrence.before')
     def before(self, dt: AwareDatetime, inc: bool = False,
                ) -> Optional[AwareDatetime]:
         return self._rrule.before(dt, inc)
 
+    @timed('recurrence.after')
     def after(self, dt: AwareDatetime, inc: bool = False,
               ) -> Optional[AwareDatetime]:
         return self._rrule.after(dt, inc)
@@ -83,6 +137,7 @@ class _BaseRecurrence(BaseModel, ABC):
                inc: bool = False) -> Iterator[AwareDatetime]:
         return self._rrule.xafter(dt, count, inc)
 
+    @timed('recurrence.between')
     def between(self,
                 after: AwareDatetime,
                 before: AwareDatetime,
@@ -123,10 +178,25 @@ class SimpleRecurrence(_BaseRecurrence):
     _rrule: rrule.rrule
 
     @model_validator(mode='after')
+    @timed('recurrence.compile.simple')
     def _after_validator(self) -> Self:
         assert not hasattr(self, '_rrule')
         if self.count_limit is not None and self.until is not None:
             raise ValueError(f'Cannot set both count and until')
+
+        # Without a dtstart, dateutil starts the rule at the time it's
+        # compiled, so such rules are never shared.
+        if self.dtstart is not None:
+            self._key = _hashable_or_none(
+                    (SimpleRecurrence,
+                     *(_key_value(getattr(self, name))
+                       for name in type(self).model_fields)))
+        if self._key is not None:
+            compiled = _compiled.get(self._key)
+            if compiled is not None:
+                self._rrule = compiled  # type: ignore[assignment]
+                return self
+
         self._rrule = rrule.rrule(freq=self.freq,
                                   dtstart=self.dtstart,
                                   interval=self.interval,
@@ -143,7 +213,10 @@ class SimpleRecurrence(_BaseRecurrence):
                                   byhour=self.byhour,
                                   byminute=self.byminute,
                                   bysecond=self.bysecond,
+                                  cache=self._key is not None,
                                   )
+        if self._key is not None:
+            _compiled[self._key] = self._rrule
         return self
 
     @classmethod
@@ -177,19 +250,34 @@ class SimpleRecurrence(_BaseRecurrence):
 class ComplexRecurrence(_BaseRecurrence):
     rrules: list[SimpleRecurrence] = Field(default_factory=list)
     exrules: list[SimpleRecurrence] = Field(default_factory=list)
-    rdates: list[DatetimeToAware] = Field(default_factory=list)
-    exdates: list[DatetimeToAware] = Field(default_factory=list)
+    rdates: DatetimeListToAware = Field(default_factory=list)
+    exdates: DatetimeListToAware = Field(default_factory=list)
 
     _rrule: rrule.rruleset
 
     @model_validator(mode='after')
+    @timed('recurrence.compile.complex')
     def _after_validator(self) -> Self:
         assert not hasattr(self, '_rrule')
 
-        self._rrule = rrule.rruleset()
-
-        for rrule in self.rrules:
-            self._rrule.rrule(rrule._rrule)
+        if all(r._key is not None for r in (*self.rrules, *self.exrules)):
+            self._key = _hashable_or_none(
+                    (ComplexRecurrence,
+                     tuple(r._key for r in self.rrules),
+                     tuple(r._key for r in self.exrules),
+                     _key_value(self.rdates),
+                     _key_value(self.exdates),
+                     ))
+        if self._key is not None:
+            compiled = _compiled.get(self._key)
+            if compiled is not None:
+                self._rrule = compiled  # type: ignore[assignment]
+                return self
+
+        self._rrule = rrule.rruleset(cache=self._key is not None)
+
+        for r in self.rrules:
+            self._rrule.rrule(r._rrule)
         for rdate in self.rdates:
             self._rrule.rdate(rdate)
         for exrule in self.exrules:
@@ -197,4 +285,6 @@ class ComplexRecurrence(_BaseRecurrence):
         for exdate in self.exdates:
             self._rrule.exdate(exdate)
 
+        if self._key is not None:
+            _compiled[self._key] = self._rrule
         return self
@@ -0,0 +1,40 @@
+import dataclasses
+from datetime import date
+from typing import Optional
+
+from index import as_datetime
+
+
+@dataclasses.dataclass(slots=True)
+class Rollup:
+    # Aggregates over all of a task's descendants, not including the task
+    # itself.  max_urgency only considers tasks that are still to do.
+    todo: int = 0
+    placeholder: int = 0
+    done: int = 0
+    dropped: int = 0
+    max_urgency: Optional[float] = None
+    earliest_due: Optional[date] = None
+
+    @property
+    def total(self) -> int:
+        return self.todo + self.placeholder + self.done + self.dropped
+
+    def add_urgency(self, urgency: Optional[float]) -> None:
+        if urgency is not None and (self.max_urgency is None
+                                    or urgency > self.max_urgency):
+            self.max_urgency = urgency
+
+    def add_due(self, due: Optional[date]) -> None:
+        if due is not None and (self.earliest_due is None
+                                or as_datetime(due)
+                                < as_datetime(self.earliest_due)):
+            self.earliest_due = due
+
+    def add_descendants(self, other: 'Rollup') -> None:
+        self.todo += other.todo
+        self.placeholder += other.placeholder
+        self.done += other.done
+        self.dropped += other.dropped
+        self.add_urgency(other.max_urgency)
+        self.add_due(other.earliest_due)
@@ -0,0 +1,142 @@
+import heapq
+from typing import TYPE_CHECKING, Iterable, Mapping, Optional
+from uuid import UUID
+
+from pydantic import AwareDatetime
+
+import localtime
+from instrumentation import timed
+from recurrence import ComplexRecurrence, SimpleRecurrence
+from timedelta import RelativeTime
+
+if TYPE_CHECKING:
+    from task import TaskRecurrenceSchedule
+
+# Keeps every schedule's next occurrence in a heap, so finding which
+# schedules fire next is a look at the top of the heap rather than a call to
+# after() on every schedule.  Popping an occurrence re-arms the schedule with
+# its following occurrence.
+#
+# SimpleRecurrence and ComplexRecurrence schedules fire at each occurrence of
+# their rule.  RelativeTime schedules have no fixed occurrences, so they fire
+# at intervals of the relative time from the last time they fired, or from
+# when the scheduler started if it isn't told when that was.
+#
+# Replacing a heap entry leaves the old one in place, and stale entries are
+# skipped when they reach the top.
+
+
+def _is_naive(rule: SimpleRecurrence | ComplexRecurrence) -> bool:
+    # Rules without a dtstart produce naive times in the local timezone.
+    # Everything else in a rule is made aware when it's validated.
+    if isinstance(rule, SimpleRecurrence):
+        return rule.dtstart is None
+    return any(r.dtstart is None for r in (*rule.rrules, *rule.exrules))
+
+
+def next_occurrence(schedule: 'TaskRecurrenceSchedule', after: AwareDatetime,
+                    ) -> Optional[AwareDatetime]:
+    rule = schedule.schedule
+    if isinstance(rule, RelativeTime):
+        result = after + rule
+        # Relative times that set absolute fields can land on or before the
+        # time they're added to, and would then never move forward.
+        return result if result > after else None
+    if not _is_naive(rule):
+        return rule.after(after)
+    result = rule.after(
+            after.astimezone(localtime.local_zone()).replace(tzinfo=None))
+    return None if result is None else localtime.make_aware(result)
+
+
+class Scheduler:
+    def __init__(self,
+                 schedules: Iterable['TaskRecurrenceSchedule'] = (),
+                 now: Optional[AwareDatetime] = None,
+                 last_fired: Optional[Mapping[UUID, AwareDatetime]] = None,
+                 ) -> None:
+        if now is None:
+            now = localtime.now()
+        self._heap: list[tuple[AwareDatetime, int, UUID]] = []
+        self._seq = 0
+        self._schedules: dict[UUID, 'TaskRecurrenceSchedule'] = {}
+        # Each armed schedule's entry in the heap.
+        self._entries: dict[UUID, tuple[AwareDatetime, int]] = {}
+        # The time each schedule's next occurrence was worked out from.
+        self._anchors: dict[UUID, AwareDatetime] = {}
+        for schedule in schedules:
+            anchor = now
+            if last_fired is not None:
+                anchor = last_fired.get(schedule.uuid, now)
+            self.add(schedule, anchor)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def add(self, schedule: 'TaskRecurrenceSchedule', after: AwareDatetime,
+            ) -> None:
+        # Arms the schedule with its first occurrence after the given time,
+        # replacing any existing entry for it.
+        uuid = schedule.uuid
+        self._schedules[uuid] = schedule
+        self._anchors[uuid] = after
+        when = next_occurrence(schedule, after)
+        if when is None:
+            self._entries.pop(uuid, None)
+            return
+        self._seq += 1
+        self._entries[uuid] = (when, self._seq)
+        heapq.heappush(self._heap, (when, self._seq, uuid))
+
+    def rearm(self, schedule: 'TaskRecurrenceSchedule') -> None:
+        # Works out the schedule's next occurrence again, from the same
+        # point as before, after its rule has changed.
+        self.add(schedule, self._anchors.get(schedule.uuid, localtime.now()))
+
+    def remove(self, uuid: UUID) -> None:
+        self._schedules.pop(uuid, None)
+        self._entries.pop(uuid, None)
+        self._anchors.pop(uuid, None)
+
+    def next_fire(self, uuid: UUID) -> Optional[AwareDatetime]:
+        entry = self._entries.get(uuid)
+        return None if entry is None else entry[0]
+
+    def _discard_stale(self) -> None:
+        while self._heap:
+            when, seq, uuid = self._heap[0]
+            if self._entries.get(uuid) == (when, seq):
+                return
+            heapq.heappop(self._heap)
+
+    def peek(self) -> Optional[tuple[AwareDatetime, 'TaskRecurrenceSchedule']]:
+        self._discard_stale()
+        if not self._heap:
+            return None
+        when, _, uuid = self._heap[0]
+        return when, self._schedules[uuid]
+
+    def pop(self) -> tuple[AwareDatetime, 'TaskRecurrenceSchedule']:
+        # Removes the earliest occurrence of any schedule, and re-arms that
+        # schedule with its next occurrence.
+        self._discard_stale()
+        if not self._heap:
+            raise IndexError('No schedules are armed')
+        when, _, uuid = heapq.heappop(self._heap)
+        schedule = self._schedules[uuid]
+        self.add(schedule, when)
+        return when, schedule
+
+    @timed('scheduler.pop_due')
+    def pop_due(self, now: Optional[AwareDatetime] = None,
+                ) -> list[tuple[AwareDatetime, 'TaskRecurrenceSchedule']]:
+        # Every occurrence at or before now, in order.  A schedule that's
+        # fallen behind appears once for each occurrence it missed.
+        if now is None:
+            now = localtime.now()
+        due = []
+        while True:
+            top = self.peek()
+            if top is None or top[0] > now:
+                return due
+            due.append(self.pop())
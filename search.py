@@ -0,0 +1,187 @@
+import heapq
+import re
+from itertools import chain
+from typing import Iterable, Iterator, Optional
+from uuid import UUID
+
+# An index for finding tasks and templates by the words in their titles as
+# the user types.  Titles are split into casefolded words; each word maps to
+# the UUIDs whose titles contain it, and the words are also kept in a trie so
+# all the words starting with a prefix can be found without scanning the
+# whole vocabulary.
+
+_WORD_RE = re.compile(r'\w+')
+
+
+def tokenize(text: str) -> list[str]:
+    return _WORD_RE.findall(text.casefold())
+
+
+class _TrieNode:
+    __slots__ = ('children', 'is_word')
+
+    def __init__(self) -> None:
+        self.children: dict[str, _TrieNode] = {}
+        self.is_word = False
+
+
+class _Trie:
+    def __init__(self) -> None:
+        self._root = _TrieNode()
+
+    def add(self, word: str) -> None:
+        node = self._root
+        for c in word:
+            node = node.children.setdefault(c, _TrieNode())
+        node.is_word = True
+
+    def remove(self, word: str) -> None:
+        path = [self._root]
+        for c in word:
+            path.append(path[-1].children[c])
+        path[-1].is_word = False
+        # Prune the nodes that no longer lead to any word.
+        for i in range(len(word), 0, -1):
+            node = path[i]
+            if node.is_word or node.children:
+                break
+            del path[i - 1].children[word[i - 1]]
+
+    def with_prefix(self, prefix: str) -> Iterator[str]:
+        node: Optional[_TrieNode] = self._root
+        for c in prefix:
+            node = node.children.get(c)
+            if node is None:
+                return
+        to_process = [(prefix, node)]
+        while to_process:
+            word, node = to_process.pop()
+            if node.is_word:
+                yield word
+            to_process.extend((word + c, child)
+                              for c, child in node.children.items())
+
+
+class TitleIndex:
+    def __init__(self) -> None:
+        self._words_by_uuid: dict[UUID, tuple[str, ...]] = {}
+        # The UUIDs of the titles containing each word, by the number of
+        # words in the title, so shorter titles can be ranked first without
+        # sorting.
+        self._uuids_by_word: dict[str, dict[int, set[UUID]]] = {}
+        self._trie = _Trie()
+
+    def __len__(self) -> int:
+        return len(self._words_by_uuid)
+
+    def add(self, uuid: UUID, title: str) -> None:
+        if uuid in self._words_by_uuid:
+            self.remove(uuid)
+        words = tuple(tokenize(title))
+        self._words_by_uuid[uuid] = words
+        for word in set(words):
+            try:
+                by_length = self._uuids_by_word[word]
+            except KeyError:
+                by_length = self._uuids_by_word[word] = {}
+                self._trie.add(word)
+            by_length.setdefault(len(words), set()).add(uuid)
+
+    def remove(self, uuid: UUID) -> None:
+        words = self._words_by_uuid.pop(uuid, None)
+        if words is None:
+            return
+        for word in set(words):
+            by_length = self._uuids_by_word[word]
+            uuids = by_length[len(words)]
+            uuids.discard(uuid)
+            if not uuids:
+                del by_length[len(words)]
+                if not by_length:
+                    del self._uuids_by_word[word]
+                    self._trie.remove(word)
+
+    def _levels(self, term: str,
+                ) -> list[tuple[float, dict[int, list[set[UUID]]]]]:
+        # The titles with a word starting with the term, grouped by score,
+        # best first, and then by length, as the sets of titles with each
+        # matching word.  A word scores by how much of it the term covers, so
+        # an exact match scores 1.
+        by_score: dict[float, dict[int, list[set[UUID]]]] = {}
+        for word in self._trie.with_prefix(term):
+            level = by_score.setdefault(len(term) / len(word), {})
+            for length, uuids in self._uuids_by_word[word].items():
+                level.setdefault(length, []).append(uuids)
+        return sorted(by_score.items(), reverse=True)
+
+    def search(self, query: str, limit: Optional[int] = 20) -> list[UUID]:
+        # UUIDs of the titles with a word starting with every word of the
+        # query.  Titles are ranked by the total of each query word's best
+        # score against the title's words, with shorter titles first among
+        # equal scores.
+        terms = tokenize(query)
+        if not terms:
+            return []
+        levels = [self._levels(term) for term in terms]
+        if not all(levels):
+            return []
+
+        # Work through the combinations of score levels, one per term, from
+        # the highest total down, so only as many titles as are needed are
+        # looked at.  A title first turns up in the best combination it's
+        # in, so any title already seen can be skipped.
+        def total(combo: tuple[int, ...]) -> float:
+            return round(sum(levels[i][level][0]
+                             for i, level in enumerate(combo)), 9)
+
+        start = (0,) * len(terms)
+        to_process = [(-total(start), start)]
+        queued = {start}
+        seen: set[UUID] = set()
+        results: list[UUID] = []
+        # For each combination with the current total score, by title
+        # length, the sets of titles matching each term.  The sets are only
+        # combined once it's known how many titles are needed.
+        group: dict[int, list[list[list[set[UUID]]]]] = {}
+        group_score: Optional[float] = None
+
+        def titles(per_term: list[list[set[UUID]]]) -> Iterable[UUID]:
+            if len(per_term) == 1:
+                return chain.from_iterable(per_term[0])
+            unions = sorted((sets[0] if len(sets) == 1
+                             else set().union(*sets)
+                             for sets in per_term), key=len)
+            return unions[0].intersection(*unions[1:])
+
+        def flush() -> None:
+            for length in sorted(group):
+                for per_term in group[length]:
+                    for uuid in titles(per_term):
+                        if uuid not in seen:
+                            if limit is not None and len(results) >= limit:
+                                return
+                            seen.add(uuid)
+                            results.append(uuid)
+            group.clear()
+
+        while to_process:
+            score, combo = heapq.heappop(to_process)
+            if score != group_score:
+                flush()
+                if limit is not None and len(results) >= limit:
+                    break
+                group_score = score
+            by_length = [levels[i][level][1] for i, level in enumerate(combo)]
+            for length in set(by_length[0]).intersection(*by_length[1:]):
+                group.setdefault(length, []).append(
+                        [b[length] for b in by_length])
+            for i in range(len(combo)):
+                if combo[i] + 1 < len(levels[i]):
+                    next_combo = combo[:i] + (combo[i] + 1,) + combo[i + 1:]
+                    if next_combo not in queued:
+                        queued.add(next_combo)
+                        heapq.heappush(to_process,
+                                       (-total(next_combo), next_combo))
+        else:
+            flush()
+        return results
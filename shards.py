@@ -0,0 +1,256 @@
+import bisect
+import json
+import os
+from pathlib import Path
+from typing import Any, Generic, Iterator, Literal, Optional, Self, TypeVar
+from uuid import UUID
+
+from task import Task, TaskList, TaskRecurrenceSchedule
+
+# Stores a task list as a directory of files, so commands that only need a
+# few tasks don't have to load all of them:
+#
+#     root.json             The list without its tasks or schedules: the
+#                           defaults and the tags.
+#     manifest.json         The shards, in order, and the UUIDs in each.
+#     tasks/<uuid>.json     One file per top-level task and its subtree.
+#     schedules/<uuid>.json One file per schedule and its templates.
+#
+# A list opened from a store starts with no tasks or schedules.  Looking one
+# up by UUID loads the shard it's in, and anything that iterates over the
+# whole list loads every shard first.  Saving rewrites only the shards whose
+# contents changed since they were loaded or last saved.
+#
+# The tasks and recurring_tasks lists of a partly-loaded TaskList only hold
+# what's been loaded, so save it through the store rather than by dumping it.
+
+_ROOT = 'root.json'
+_MANIFEST = 'manifest.json'
+
+Kind = Literal['tasks', 'schedules']
+_KINDS: tuple[Kind, ...] = ('tasks', 'schedules')
+_FIELDS: dict[Kind, str] = {'tasks': 'tasks', 'schedules': 'recurring_tasks'}
+
+V = TypeVar('V')
+Shard = Task | TaskRecurrenceSchedule
+
+
+class _LazyIndex(dict[UUID, V], Generic[V]):
+    # Replaces the TaskList's dicts of tasks, schedules and templates by
+    # UUID, loading shards as they're needed.
+
+    def __init__(self, store: 'ShardedStore', *args: Any) -> None:
+        super().__init__(*args)
+        self._store = store
+
+    def __missing__(self, key: UUID) -> V:
+        if self._store._load_containing(key):
+            return dict.__getitem__(self, key)
+        raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return (dict.__contains__(self, key)
+                or (isinstance(key, UUID)
+                    and self._store._load_containing(key)
+                    and dict.__contains__(self, key)))
+
+    def get(self, key: UUID, default: Any = None) -> Any:  # type: ignore
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def __iter__(self) -> Iterator[UUID]:
+        self._store.load_all()
+        return super().__iter__()
+
+    def __len__(self) -> int:
+        self._store.load_all()
+        return super().__len__()
+
+    def keys(self) -> Any:
+        self._store.load_all()
+        return super().keys()
+
+    def values(self) -> Any:
+        self._store.load_all()
+        return super().values()
+
+    def items(self) -> Any:
+        self._store.load_all()
+        return super().items()
+
+
+def _write(path: Path, data: bytes) -> None:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_name(path.name + '.tmp')
+    tmp_path.write_bytes(data)
+    os.replace(tmp_path, path)
+
+
+def _subtree_uuids(shard: Shard) -> list[str]:
+    uuids = [str(shard.uuid)]
+    to_process: list[Any] = list(shard.tasks if isinstance(
+        shard, TaskRecurrenceSchedule) else shard.children)
+    while to_process:
+        item = to_process.pop()
+        uuids.append(str(item.uuid))
+        to_process.extend(item.children)
+    return uuids
+
+
+class ShardedStore:
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.tasklist: Optional[TaskList] = None
+        # The UUIDs of the shards of each kind, in order, and of everything
+        # in each shard.
+        self._order: dict[Kind, list[UUID]] = {k: [] for k in _KINDS}
+        self._contents: dict[UUID, list[str]] = {}
+        self._shard_of: dict[UUID, tuple[Kind, UUID]] = {}
+        # The generation of each loaded shard's top-level model when it was
+        # loaded or last saved.
+        self._saved: dict[UUID, int] = {}
+
+    def _shard_path(self, kind: Kind, uuid: UUID) -> Path:
+        return self.path / kind / f'{uuid}.json'
+
+    @classmethod
+    def create(cls, path: Path | str, tasklist: TaskList) -> Self:
+        # Writes out the whole task list as a new store.
+        store = cls(path)
+        store.tasklist = tasklist
+        tasklist._shards = store
+        store.save()
+        return store
+
+    def open(self) -> TaskList:
+        manifest = json.loads((self.path / _MANIFEST).read_bytes())
+        for kind in _KINDS:
+            for entry in manifest[kind]:
+                root = UUID(entry['root'])
+                self._order[kind].append(root)
+                self._contents[root] = entry['uuids']
+                for uuid in entry['uuids']:
+                    self._shard_of[UUID(uuid)] = (kind, root)
+
+        document = json.loads((self.path / _ROOT).read_bytes())
+        document['tasks'] = []
+        tasklist = TaskList.model_validate(document)
+        tasklist._tasks_by_uuid = _LazyIndex(self)
+        tasklist._task_schedules_by_uuid = _LazyIndex(self)
+        tasklist._task_templates_by_uuid = _LazyIndex(self)
+        tasklist._shards = self
+        self.tasklist = tasklist
+        return tasklist
+
+    def _loaded(self, root: UUID) -> bool:
+        return root in self._saved
+
+    def _load_containing(self, uuid: UUID) -> bool:
+        # Loads the shard with the given UUID in it, returning whether
+        # there was one that wasn't already loaded.
+        try:
+            kind, root = self._shard_of[uuid]
+        except KeyError:
+            return False
+        if self._loaded(root):
+            return False
+        self._load(kind, root)
+        return True
+
+    def load_all(self) -> None:
+        for kind in _KINDS:
+            for root in self._order[kind]:
+                if not self._loaded(root):
+                    self._load(kind, root)
+
+    def _load(self, kind: Kind, root: UUID) -> None:
+        tasklist = self.tasklist
+        assert tasklist is not None
+        data = self._shard_path(kind, root).read_bytes()
+        shard: Shard
+        if kind == 'tasks':
+            shard = Task.model_validate_json(data)
+        else:
+            shard = TaskRecurrenceSchedule.model_validate_json(data)
+
+        # Keep the top-level lists in the store's order.  Anything added
+        # since the list was opened goes at the end.
+        position = {u: i for i, u in enumerate(self._order[kind])}
+        items: list[Any] = getattr(tasklist, _FIELDS[kind])
+        bisect.insort(items, shard,
+                      key=lambda s: position.get(s.uuid, len(position)))
+        if isinstance(shard, Task):
+            tasklist._add_task_tree(shard)
+            tasklist._rollups_stale = True
+        else:
+            tasklist._add_schedule(shard)
+        self._saved[root] = shard._generation
+
+    def _merged_order(self, kind: Kind, current: list[Shard]) -> list[UUID]:
+        # Shards that haven't been loaded keep their places.  The places of
+        # the loaded ones that are still in the list are filled with them, in
+        # the order they're in now, and anything added since goes at the
+        # end, as it does when the list is loaded.
+        known = set(self._order[kind])
+        present = {s.uuid for s in current}
+        remaining = iter([s.uuid for s in current if s.uuid in known])
+        order = []
+        for uuid in self._order[kind]:
+            if not self._loaded(uuid):
+                order.append(uuid)
+            elif uuid in present:
+                order.append(next(remaining))
+        order.extend(s.uuid for s in current if s.uuid not in known)
+        return order
+
+    def save(self) -> list[Path]:
+        # Writes whatever has changed, returning the paths written.
+        tasklist = self.tasklist
+        assert tasklist is not None
+        written: list[Path] = []
+
+        def write(path: Path, data: bytes) -> None:
+            try:
+                if path.read_bytes() == data:
+                    return
+            except FileNotFoundError:
+                pass
+            _write(path, data)
+            written.append(path)
+
+        new_order: dict[Kind, list[UUID]] = {}
+        for kind in _KINDS:
+            current: list[Shard] = getattr(tasklist, _FIELDS[kind])
+            present = {s.uuid for s in current}
+            for shard in current:
+                if self._saved.get(shard.uuid) != shard._generation:
+                    path = self._shard_path(kind, shard.uuid)
+                    _write(path, shard.model_dump_json().encode())
+                    written.append(path)
+                    self._saved[shard.uuid] = shard._generation
+                    self._contents[shard.uuid] = _subtree_uuids(shard)
+            new_order[kind] = self._merged_order(kind, current)
+
+            # Loaded shards that are no longer at the top level have been
+            # removed, or moved into another shard.
+            for uuid in self._order[kind]:
+                if self._loaded(uuid) and uuid not in present:
+                    self._shard_path(kind, uuid).unlink(missing_ok=True)
+                    del self._saved[uuid]
+                    del self._contents[uuid]
+
+        self._order = new_order
+        self._shard_of = {UUID(uuid): (kind, root)
+                          for kind in _KINDS
+                          for root in self._order[kind]
+                          for uuid in self._contents[root]}
+        manifest = {kind: [{'root': str(root),
+                            'uuids': self._contents[root]}
+                           for root in self._order[kind]]
+                    for kind in _KINDS}
+        write(self.path / _MANIFEST, json.dumps(manifest).encode())
+        write(self.path / _ROOT, tasklist.model_dump_json(
+            exclude={'tasks', 'recurring_tasks'}).encode())
+        return written
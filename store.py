@@ -0,0 +1,200 @@
+import argparse
+import dataclasses
+import fcntl
+import mmap
+import os
+import struct
+import sys
+import zlib
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, Optional
+
+from instrumentation import timed
+from task import TaskList
+
+# Stores a task list in one file that several processes can read and write
+# at once without losing updates.  The file is an immutable snapshot:
+#
+#     _MAGIC, header, JSON
+#
+# where the header gives the snapshot's generation, the length of the JSON
+# and its CRC-32.  Saving never changes a snapshot in place.  A writer writes
+# the next snapshot to a temporary file and renames it over the old one, so
+# a reader that opens the file sees either the old snapshot or the new one,
+# whole, and never has to wait for a writer.  Readers map the file rather
+# than reading it, and don't take any lock.
+#
+# Writers serialize on an advisory lock on a separate lock file (the data
+# file itself is replaced on each save, so a lock on it wouldn't be held by
+# the next writer's file).  Each save says which generation it was edited
+# from; if another process has saved since, the save fails with a
+# ConflictError rather than overwriting that process's changes.  Either load
+# again and redo the edit, or use update(), which holds the lock from the
+# read through to the save so nothing can conflict:
+#
+#     with store.update() as tasklist:
+#         tasklist.get_task(uuid).state = 'done'
+#
+# A generation here counts saves of the file, and has nothing to do with the
+# in-memory DirtyTrackingModel._generation.  Generation 0 means there's no
+# file yet, so saving against generation 0 creates it.
+#
+# The lock is an flock, so it's POSIX-only, and won't work on some network
+# filesystems.
+
+_MAGIC = b'ASMSNAP1'
+_HEADER = struct.Struct('<QQI')
+_DATA_OFFSET = len(_MAGIC) + _HEADER.size
+
+
+class ConflictError(ValueError):
+    def __init__(self, expected: int, found: int) -> None:
+        self.expected = expected
+        self.found = found
+        super().__init__(f'Task list was saved by another process: expected '
+                         f'generation {expected}, found {found}')
+
+
+@dataclasses.dataclass(frozen=True)
+class Snapshot:
+    generation: int
+    tasklist: TaskList
+
+
+def _read_header(header: bytes, size: int, path: Path) -> tuple[int, int]:
+    # The generation and CRC from the start of a snapshot of the given size.
+    if len(header) < _DATA_OFFSET or header[:len(_MAGIC)] != _MAGIC:
+        raise ValueError(f'{path} is not a task list snapshot')
+    generation, length, crc = _HEADER.unpack_from(header, len(_MAGIC))
+    if size != _DATA_OFFSET + length:
+        raise ValueError(f'{path} is truncated')
+    return generation, crc
+
+
+def _fsync_directory(path: Path) -> None:
+    # Makes a rename in the directory durable.
+    fd = os.open(path, os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+class TaskStore:
+    def __init__(self, path: Path | str) -> None:
+        self.path = Path(path)
+        self.lock_path = self.path.with_name(self.path.name + '.lock')
+
+    def generation(self) -> int:
+        # The generation of the current snapshot, without loading it.
+        try:
+            with self.path.open('rb') as f:
+                header = f.read(_DATA_OFFSET)
+                size = os.fstat(f.fileno()).st_size
+        except FileNotFoundError:
+            return 0
+        return _read_header(header, size, self.path)[0]
+
+    @timed('store.read')
+    def read(self) -> Snapshot:
+        # The current snapshot.  Raises FileNotFoundError if nothing has been
+        # saved yet.
+        with self.path.open('rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                generation, crc = _read_header(data[:_DATA_OFFSET],
+                                               len(data), self.path)
+                document = data[_DATA_OFFSET:]
+        if zlib.crc32(document) != crc:
+            raise ValueError(f'{self.path} is corrupt')
+        return Snapshot(generation, TaskList.model_validate_json(document))
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        fd = os.open(self.lock_path, os.O_RDWR | os.O_CREAT | os.O_CLOEXEC,
+                     0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            # Closing the file releases the lock.
+            os.close(fd)
+
+    def _write(self, tasklist: TaskList, generation: int) -> None:
+        # Writes the snapshot and renames it into place.  Only called with
+        # the lock held, so the temporary file's name can be fixed.
+        document = tasklist.model_dump_json().encode()
+        tmp_path = self.path.with_name(self.path.name + '.tmp')
+        with tmp_path.open('wb') as out:
+            out.write(_MAGIC)
+            out.write(_HEADER.pack(generation, len(document),
+                                   zlib.crc32(document)))
+            out.write(document)
+            out.flush()
+            os.fsync(out.fileno())
+        os.replace(tmp_path, self.path)
+        _fsync_directory(self.path.parent)
+
+    @timed('store.save')
+    def save(self, tasklist: TaskList, generation: int) -> int:
+        # Saves the list, which was edited from the given generation, and
+        # returns its new generation.  Raises ConflictError if another
+        # process has saved since that generation.
+        with self._locked():
+            found = self.generation()
+            if found != generation:
+                raise ConflictError(generation, found)
+            self._write(tasklist, generation + 1)
+        return generation + 1
+
+    @contextmanager
+    def update(self) -> Iterator[TaskList]:
+        # Loads the list with the lock held and saves it when the block
+        # exits, unless it raises.  Other writers wait until then; readers
+        # carry on seeing the previous snapshot.  If nothing has been saved
+        # yet, the block gets an empty list, and saving it creates the file.
+        with self._locked():
+            try:
+                snapshot = self.read()
+            except FileNotFoundError:
+                snapshot = Snapshot(0, TaskList(tasks=[], tags=[]))
+            yield snapshot.tasklist
+            self._write(snapshot.tasklist, snapshot.generation + 1)
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+            description='Convert between task list files and snapshots')
+    commands = parser.add_subparsers(dest='command', required=True)
+    import_parser = commands.add_parser(
+            'import', help='Save a task list JSON file as the next snapshot')
+    import_parser.add_argument('store', type=Path)
+    import_parser.add_argument('tasklist', type=Path)
+    export_parser = commands.add_parser(
+            'export', help='Write the current snapshot as JSON')
+    export_parser.add_argument('store', type=Path)
+    export_parser.add_argument('output', type=Path, nargs='?',
+                               help='File to write; defaults to standard '
+                                    'output')
+    args = parser.parse_args(argv)
+
+    store = TaskStore(args.store)
+    if args.command == 'import':
+        tasklist = TaskList.model_validate_json(args.tasklist.read_bytes())
+        try:
+            generation = store.save(tasklist, store.generation())
+        except ConflictError as e:
+            print(e, file=sys.stderr)
+            return 1
+        print(f'Saved generation {generation}')
+    else:
+        data = store.read().tasklist.model_dump_json()
+        if args.output is None:
+            print(data)
+        else:
+            args.output.write_text(data)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
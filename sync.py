@@ -0,0 +1,385 @@
+import dataclasses
+from typing import Any, Iterator, Literal, Optional
+
+from pydantic import Field
+
+from _type_meta import BaseModel
+from task import TaskList, valid_child_states
+
+# Change sets describe the difference between two snapshots of the same task
+# list.  Everything is keyed by UUID (or by name, for tags), and each task and
+# template is compared as a flat record of its own fields plus the key of its
+# parent, so the size of a change set depends on how much changed rather than
+# on how big the list is.  Values are stored in their JSON form, so a change
+# set can be sent between machines with model_dump_json.
+
+_Record = tuple[Optional[str], dict[str, Any]]
+Prefer = Literal['ours', 'theirs']
+
+_SETTINGS = ('baseUrgency', 'ageUrgencyFactor', 'ageUrgencyMax')
+
+
+class NodeRecord(BaseModel):
+    parent: Optional[str] = None
+    fields: dict[str, Any]
+
+
+class NodeChange(BaseModel):
+    parent: Optional[tuple[Optional[str], Optional[str]]] = None
+    fields: dict[str, tuple[Any, Any]] = Field(default_factory=dict)
+
+
+class KindChanges(BaseModel):
+    added: dict[str, NodeRecord] = Field(default_factory=dict)
+    # Removed records as they were before removal, so a removal can be told
+    # apart from a removal of something the other copy has since edited.
+    removed: dict[str, NodeRecord] = Field(default_factory=dict)
+    changed: dict[str, NodeChange] = Field(default_factory=dict)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.removed or self.changed)
+
+
+class ChangeSet(BaseModel):
+    settings: dict[str, tuple[Any, Any]] = Field(default_factory=dict)
+    tags: KindChanges = Field(default_factory=KindChanges)
+    task_schedules: KindChanges = Field(default_factory=KindChanges)
+    task_templates: KindChanges = Field(default_factory=KindChanges)
+    tasks: KindChanges = Field(default_factory=KindChanges)
+
+    def __bool__(self) -> bool:
+        return bool(self.settings or self.tags or self.task_schedules
+                    or self.task_templates or self.tasks)
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class Conflict:
+    kind: str
+    key: str
+    field: Optional[str]
+    base: Any
+    ours: Any
+    theirs: Any
+
+
+@dataclasses.dataclass(slots=True)
+class _Kind:
+    records: dict[str, _Record] = dataclasses.field(default_factory=dict)
+    # Keys of the records under each parent, in order.  Top-level records
+    # are under None.
+    siblings: dict[Optional[str], list[str]] = dataclasses.field(
+            default_factory=dict)
+
+    def add(self, key: str, parent: Optional[str], fields: dict[str, Any]
+            ) -> None:
+        self.records[key] = (parent, fields)
+        self.siblings.setdefault(parent, []).append(key)
+
+    def move(self, key: str, parent: Optional[str]) -> None:
+        old_parent, fields = self.records[key]
+        self.siblings[old_parent].remove(key)
+        self.siblings.setdefault(parent, []).append(key)
+        self.records[key] = (parent, fields)
+
+    def ancestors(self, key: Optional[str]) -> Iterator[str]:
+        while key is not None and key in self.records:
+            yield key
+            key = self.records[key][0]
+
+
+@dataclasses.dataclass(slots=True)
+class _Snapshot:
+    settings: dict[str, Any]
+    tags: _Kind
+    task_schedules: _Kind
+    task_templates: _Kind
+    tasks: _Kind
+
+    def kinds(self) -> Iterator[tuple[str, _Kind]]:
+        # Containers come before their contents, so additions can be applied
+        # in this order.
+        yield 'tags', self.tags
+        yield 'task_schedules', self.task_schedules
+        yield 'task_templates', self.task_templates
+        yield 'tasks', self.tasks
+
+
+def _snapshot(tasklist: TaskList) -> _Snapshot:
+    snapshot = _Snapshot(
+            settings=tasklist.model_dump(
+                mode='json',
+                include={'base_urgency', 'age_urgency_factor',
+                         'age_urgency_max'},
+                exclude_defaults=False,
+                ),
+            tags=_Kind(),
+            task_schedules=_Kind(),
+            task_templates=_Kind(),
+            tasks=_Kind(),
+            )
+
+    for tag in tasklist.tags:
+        snapshot.tags.add(tag.name, None,
+                          {'urgencyFactor': tag.urgency_factor})
+
+    to_process: list[tuple[Optional[str], Any]]
+    to_process = [(None, t) for t in tasklist.tasks]
+    to_process.reverse()
+    while to_process:
+        parent, task = to_process.pop()
+        key = str(task.uuid)
+        snapshot.tasks.add(key, parent, task.model_dump(
+            mode='json', exclude={'uuid', 'children'}, exclude_defaults=False))
+        to_process.extend((key, c) for c in reversed(task.children))
+
+    for schedule in tasklist.recurring_tasks:
+        schedule_key = str(schedule.uuid)
+        snapshot.task_schedules.add(schedule_key, None, schedule.model_dump(
+            mode='json', exclude={'uuid', 'tasks'}, exclude_defaults=False))
+        to_process = [(schedule_key, t) for t in reversed(schedule.tasks)]
+        while to_process:
+            parent, template = to_process.pop()
+            key = str(template.uuid)
+            snapshot.task_templates.add(key, parent, template.model_dump(
+                mode='json', exclude={'uuid', 'children'},
+                exclude_defaults=False))
+            to_process.extend((key, c) for c in reversed(template.children))
+
+    return snapshot
+
+
+def _diff_kind(old: _Kind, new: _Kind) -> KindChanges:
+    changes = KindChanges()
+    for key, (parent, fields) in new.records.items():
+        try:
+            old_parent, old_fields = old.records[key]
+        except KeyError:
+            changes.added[key] = NodeRecord(parent=parent, fields=fields)
+            continue
+
+        change = NodeChange()
+        if parent != old_parent:
+            change.parent = (old_parent, parent)
+        for name in fields.keys() | old_fields.keys():
+            old_value = old_fields.get(name)
+            value = fields.get(name)
+            if old_value != value:
+                change.fields[name] = (old_value, value)
+        if change.parent is not None or change.fields:
+            changes.changed[key] = change
+
+    changes.removed = {key: NodeRecord(parent=parent, fields=fields)
+                       for key, (parent, fields) in old.records.items()
+                       if key not in new.records}
+    return changes
+
+
+def diff(old: TaskList, new: TaskList) -> ChangeSet:
+    old_snapshot = _snapshot(old)
+    new_snapshot = _snapshot(new)
+    changes = ChangeSet()
+    for name in _SETTINGS:
+        old_value = old_snapshot.settings.get(name)
+        value = new_snapshot.settings.get(name)
+        if old_value != value:
+            changes.settings[name] = (old_value, value)
+    for (name, old_kind), (_, new_kind) in zip(old_snapshot.kinds(),
+                                               new_snapshot.kinds()):
+        setattr(changes, name, _diff_kind(old_kind, new_kind))
+    return changes
+
+
+def _merge_value(base: Any, ours: Any, theirs: Any, prefer: Prefer,
+                 conflicts: list[Conflict], kind: str, key: str,
+                 field: Optional[str],
+                 ) -> Any:
+    # Returns the merged value given the base value, the value from the
+    # change set and the current value in the copy being updated.
+    if theirs == ours or theirs == base:
+        return ours
+    conflicts.append(Conflict(kind, key, field, base, ours, theirs))
+    return ours if prefer == 'ours' else theirs
+
+
+def _apply_kind(name: str, changes: KindChanges, kind: _Kind, prefer: Prefer,
+                conflicts: list[Conflict],
+                ) -> None:
+    for key, removed in changes.removed.items():
+        if key not in kind.records:
+            continue
+        parent, fields = kind.records[key]
+        # Removing a record's parent moves it up, which isn't an edit.
+        moved = (parent != removed.parent
+                 and removed.parent not in changes.removed)
+        if moved or fields != removed.fields:
+            # The other copy has edited what this one removed.
+            conflicts.append(Conflict(name, key, None, removed, None,
+                                      NodeRecord(parent=parent,
+                                                 fields=fields)))
+            if prefer == 'theirs':
+                continue
+        # Anything the other copy has added under a removed record is kept,
+        # by moving it up to the removed record's parent.
+        del kind.records[key]
+        kind.siblings[parent].remove(key)
+        for orphan in kind.siblings.pop(key, ()):
+            kind.records[orphan] = (parent, kind.records[orphan][1])
+            kind.siblings.setdefault(parent, []).append(orphan)
+
+    for key, record in changes.added.items():
+        if key in kind.records:
+            # Both sides added the same thing; treat it as an edit from
+            # nothing.
+            _, fields = kind.records[key]
+            for field in record.fields.keys() | fields.keys():
+                fields[field] = _merge_value(
+                        None, record.fields.get(field), fields.get(field),
+                        prefer, conflicts, name, key, field)
+        else:
+            kind.add(key, record.parent, dict(record.fields))
+
+    for key, change in changes.changed.items():
+        try:
+            parent, fields = kind.records[key]
+        except KeyError:
+            conflicts.append(Conflict(name, key, None, None, change, None))
+            continue
+        for field, (base, ours) in change.fields.items():
+            fields[field] = _merge_value(base, ours, fields.get(field), prefer,
+                                         conflicts, name, key, field)
+        if change.parent is not None:
+            base_parent, new_parent = change.parent
+            new_parent = _merge_value(base_parent, new_parent, parent, prefer,
+                                      conflicts, name, key, None)
+            if new_parent == parent:
+                continue
+            if key in kind.ancestors(new_parent):
+                # Moving here would make the record its own ancestor, because
+                # the other copy has moved things around too.
+                conflicts.append(
+                        Conflict(name, key, None, base_parent, new_parent,
+                                 parent))
+                continue
+            kind.move(key, new_parent)
+
+
+def _state_sides(changes: KindChanges, original: dict[str, _Record],
+                 key: str) -> tuple[Any, Any, Any]:
+    # The base value of a task's state, and its value on each side.
+    theirs = original[key][1].get('state') if key in original else None
+    if key in changes.added:
+        return None, changes.added[key].fields.get('state'), theirs
+    change = changes.changed.get(key)
+    if change is not None and 'state' in change.fields:
+        base, ours = change.fields['state']
+        return base, ours, theirs
+    return theirs, theirs, theirs
+
+
+def _resolve_child_states(changes: KindChanges, original: dict[str, _Record],
+                          kind: _Kind, prefer: Prefer,
+                          conflicts: list[Conflict],
+                          ) -> None:
+    # Each copy only has children in states their parents allow, but merged
+    # field by field they might not: one side can mark a task done while
+    # the other adds a todo child under it.  If the change set changed the
+    # parent's state and the target is preferred, the parent goes back to
+    # its state in the target.  Otherwise the child moves to the top level,
+    # so nothing is lost.  Either way the parent's state is recorded as a
+    # conflict.
+    resolved = False
+    while not resolved:
+        resolved = True
+        for key, (parent, fields) in list(kind.records.items()):
+            if parent is None or parent not in kind.records:
+                # Orphans are moved to the top level when building the list.
+                continue
+            parent_fields = kind.records[parent][1]
+            if (fields.get('state', 'todo') in
+                    valid_child_states(parent_fields.get('state', 'todo'))):
+                continue
+            resolved = False
+            base, ours, theirs = _state_sides(changes, original, parent)
+            conflicts.append(Conflict('tasks', parent, 'state',
+                                      base, ours, theirs))
+            parent_changed_by_ours = (parent in original
+                                      and ours != theirs
+                                      and parent_fields.get('state') == ours)
+            if parent_changed_by_ours and prefer == 'theirs':
+                parent_fields['state'] = theirs
+                parent_fields['ended'] = original[parent][1].get('ended')
+            else:
+                kind.move(key, None)
+
+
+def _build_tree(kind: _Kind, key: str, seen: set[str], children_field: str,
+                ) -> dict[str, Any]:
+    seen.add(key)
+    node = dict(kind.records[key][1])
+    node['uuid'] = key
+    children = kind.siblings.get(key)
+    if children:
+        node[children_field] = [_build_tree(kind, c, seen, children_field)
+                                for c in children]
+    return node
+
+
+def _build(snapshot: _Snapshot, conflicts: list[Conflict]) -> TaskList:
+    seen: set[str] = set()
+    tasks = [_build_tree(snapshot.tasks, k, seen, 'children')
+             for k in snapshot.tasks.siblings.get(None, ())]
+
+    # Tasks whose parent has gone, or which are caught in a parent cycle,
+    # become top-level tasks rather than being lost.
+    for key in snapshot.tasks.records:
+        if key in seen:
+            continue
+        parent, _ = snapshot.tasks.records[key]
+        conflicts.append(Conflict('tasks', key, None, None, None, parent))
+        snapshot.tasks.move(key, None)
+        tasks.append(_build_tree(snapshot.tasks, key, seen, 'children'))
+
+    recurring_tasks = []
+    for key in snapshot.task_schedules.siblings.get(None, ()):
+        schedule = dict(snapshot.task_schedules.records[key][1])
+        schedule['uuid'] = key
+        schedule['tasks'] = [
+                _build_tree(snapshot.task_templates, k, seen, 'children')
+                for k in snapshot.task_templates.siblings.get(key, ())]
+        recurring_tasks.append(schedule)
+
+    # Templates can't exist outside a schedule, so any left over are dropped.
+    for key, (parent, fields) in snapshot.task_templates.records.items():
+        if key not in seen:
+            conflicts.append(
+                    Conflict('task_templates', key, None, None, None, fields))
+
+    tags = [{'name': key, **snapshot.tags.records[key][1]}
+            for key in snapshot.tags.siblings.get(None, ())]
+
+    return TaskList.model_validate({**snapshot.settings,
+                                    'tasks': tasks,
+                                    'recurringTasks': recurring_tasks,
+                                    'tags': tags,
+                                    })
+
+
+def apply(changes: ChangeSet, target: TaskList, prefer: Prefer = 'theirs',
+          ) -> tuple[TaskList, list[Conflict]]:
+    # Three-way merge: the change set carries the base value of everything it
+    # changes, so edits made independently to the target are kept, and only
+    # edits to the same field from both sides conflict.  "prefer" says which
+    # side wins a conflict.
+    snapshot = _snapshot(target)
+    original = {key: (parent, dict(fields)) for key, (parent, fields)
+                in snapshot.tasks.records.items()}
+    conflicts: list[Conflict] = []
+    for name, (base, ours) in changes.settings.items():
+        snapshot.settings[name] = _merge_value(
+                base, ours, snapshot.settings.get(name), prefer, conflicts,
+                'settings', name, name)
+    for name, kind in snapshot.kinds():
+        _apply_kind(name, getattr(changes, name), kind, prefer, conflicts)
+    _resolve_child_states(changes.tasks, original, snapshot.tasks, prefer,
+                          conflicts)
+    return _build(snapshot, conflicts), conflicts
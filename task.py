@@ -1,8 +1,21 @@
 from abc import ABC
-from datetime import UTC, date, datetime, timedelta
-from typing import Any, Container, Iterator, Literal, Optional, Self, assert_never
+from datetime import UTC, date, timedelta
+from pathlib import Path
+from typing import (
+        TYPE_CHECKING,
+        Any,
+        Callable,
+        ClassVar,
+        Container,
+        Iterable,
+        Iterator,
+        Literal,
+        Optional,
+        Self,
+        TypeVar,
+        assert_never,
+        )
 from uuid import UUID, uuid4
-from itertools import chain
 
 from pydantic import (
         AwareDatetime,
@@ -20,10 +33,28 @@ from pydantic.functional_validators import ModelWrapValidatorHandler
 from pydantic.json_schema import JsonSchemaValue
 from pydantic_core.core_schema import CoreSchema, SerializerFunctionWrapHandler
 
-from _type_meta import BaseModel, DatetimeToAware, SingletonToList, add_condition_to_json_schema
+from _type_meta import (
+        BaseModel,
+        DatetimeToAware,
+        DirtyTrackingModel,
+        SingletonToList,
+        add_condition_to_json_schema,
+        )
+import localtime
+from index import TimeIndex
+from instrumentation import timed
+from rollup import Rollup
+from scheduler import Scheduler
+from search import TitleIndex
 from timedelta import RelativeTime
 from recurrence import SimpleRecurrence, ComplexRecurrence
 
+if TYPE_CHECKING:
+    from archive import Archive
+    from shards import ShardedStore
+
+T = TypeVar('T')
+
 TaskState = Literal['todo', 'placeholder', 'done', 'dropped']
 
 
@@ -32,10 +63,33 @@ TaskState = Literal['todo', 'placeholder', 'done', 'dropped']
 # etc fields itself.
 
 
+def valid_child_states(state: TaskState) -> Container[TaskState]:
+    # The states the children of a task in the given state can be in.
+    match state:
+        case 'placeholder':
+            return ('placeholder', 'todo', 'done', 'dropped')
+        case 'todo':
+            return ('todo', 'done', 'dropped')
+        case 'done' | 'dropped':
+            return ('done', 'dropped')
+        case _:
+            assert_never(state)
+
+
 class Tag(BaseModel):
     name: str
     urgency_factor: float = 0
 
+    _tasklist: Optional['TaskList'] = None
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if self._tasklist is None or name not in type(self).__pydantic_fields__:
+            return
+        if name == 'urgency_factor':
+            self._tasklist._tag_urgency_factors_changed()
+        self._tasklist.mark_dirty()
+
     @model_validator(mode='wrap')
     @classmethod
     def _validate(cls, value: Any, handler: ModelWrapValidatorHandler) -> Self:
@@ -59,17 +113,17 @@ class Tag(BaseModel):
                           ]}
 
 
-class Task(BaseModel):
+class Task(DirtyTrackingModel):
     title: str
     uuid: UUID = Field(default_factory=uuid4)
     state: TaskState = 'todo'
-    created: DatetimeToAware = Field(default_factory=datetime.now,
+    created: DatetimeToAware = Field(default_factory=localtime.now,
                                      validate_default=True)
     wait: date | DatetimeToAware | None = None
     due: date | DatetimeToAware | None = None
     ended: Optional[DatetimeToAware] = None
     #repetition_template: Optional[UUID] = None  # TODO
-    children: SingletonToList['TaskBase'] = Field(default_factory=list)
+    children: SingletonToList['Task'] = Field(default_factory=list)
     requires: SingletonToList[UUID] = Field(default_factory=list)
     blocks: SingletonToList[UUID] = Field(default_factory=list)
     #contexts: SingletonToList[Context] = Field(default_factory=list)  # TODO
@@ -81,13 +135,89 @@ class Task(BaseModel):
 
     _parent: Optional['Task'] = None  # TODO
     _tasklist: 'TaskList'
+    # Bit n is set if the task has the tag with ID n in its TaskList.
+    _tag_bits: int = 0
+    _rollup: Rollup
+
+    # Fields the TaskList keeps indexes over; assigning to any of these
+    # re-indexes the task.
+    _indexed_fields: ClassVar[frozenset[str]] = frozenset(
+            ('title', 'state', 'tags', 'due', 'wait'))
+    # Fields that feed into the rollups of the task's ancestors.
+    _rollup_fields: ClassVar[frozenset[str]] = frozenset(
+            ('state', 'tags', 'due', 'created'))
+    # Fields that the task's descendants inherit.
+    _inherited_fields: ClassVar[frozenset[str]] = frozenset(
+            ('base_urgency', 'age_urgency_factor', 'age_urgency_max'))
+    _tasklist_fields: ClassVar[frozenset[str]] = (
+            _indexed_fields | _rollup_fields | _inherited_fields)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        tasklist = None
+        if name in self._tasklist_fields:
+            tasklist = self._get_tasklist()
+        if tasklist is None:
+            super().__setattr__(name, value)
+            return
+
+        indexed = name in self._indexed_fields
+        if indexed:
+            if name == 'tags':
+                # Check the tags before anything is changed.
+                tasklist.tag_mask(value)
+            tasklist._unindex_task(self)
+        super().__setattr__(name, value)
+        if indexed:
+            tasklist._index_task(self)
+        tasklist._task_changed(self, name)
+
+    def _change_in_place(self, name: str, change: Callable[[], T]) -> T:
+        # The same bookkeeping as __setattr__, for a list field changed in
+        # place.
+        tasklist = None
+        if name in self._tasklist_fields:
+            tasklist = self._get_tasklist()
+        if tasklist is None:
+            return super()._change_in_place(name, change)
+
+        indexed = name in self._indexed_fields
+        if indexed:
+            old = list(getattr(self, name))
+            tasklist._unindex_task(self)
+        try:
+            result = change()
+            if name == 'tags':
+                try:
+                    tasklist.tag_mask(self.tags)
+                except ValueError:
+                    list.__setitem__(self.tags, slice(None), old)
+                    raise
+        finally:
+            if indexed:
+                tasklist._index_task(self)
+        self.mark_dirty()
+        tasklist._task_changed(self, name)
+        return result
+
+    def _get_tasklist(self) -> Optional['TaskList']:
+        # Tasks that haven't been attached to a TaskList yet, including while
+        # they're still being validated, don't have this set at all.
+        try:
+            return self._tasklist
+        except AttributeError:
+            return None
+
+    def _serialization_parent(self) -> Optional[DirtyTrackingModel]:
+        if self._parent is not None:
+            return self._parent
+        return self._get_tasklist()
 
     @model_validator(mode='after')
     def _clear_ended_if_invalid(self) -> Self:
         if self.state in ('placeholder', 'todo'):
             self.ended = None
         elif self.ended is None and self.state in ('done', 'dropped'):
-            self.ended = datetime.now().astimezone()
+            self.ended = localtime.now()
         return self
 
     @model_validator(mode='after')
@@ -97,15 +227,7 @@ class Task(BaseModel):
         return self
 
     def _valid_child_states(self) -> Container[TaskState]:
-        match self.state:
-            case 'placeholder':
-                return ('placeholder', 'todo', 'done', 'dropped')
-            case 'todo':
-                return ('todo', 'done', 'dropped')
-            case 'done' | 'dropped':
-                return ('done', 'dropped')
-            case _:
-                assert_never(self.state)
+        return valid_child_states(self.state)
 
     @model_validator(mode='after')
     def _check_child_states(self) -> Self:
@@ -147,13 +269,19 @@ class Task(BaseModel):
     # TODO Can we fix the typing here with some generic wrangling and
     # assertions?
     def _get_inherited_attribute(self, attr: str) -> Any:
-        t: Optional['TaskBase'] = self
+        t: Optional['Task'] = self
         while t is not None:
             v = getattr(t, attr)
             if v is not None:
                 return v
             t = t._parent
-        return getattr(self._tasklist, attr)
+        tasklist = self._get_tasklist()
+        if tasklist is None:
+            # Including tasks looked up in an archive, which aren't part of
+            # any list.
+            raise ValueError(f'Task {self.uuid} is not in a task list, so '
+                             f'has no {attr} to inherit')
+        return getattr(tasklist, attr)
 
     def _indirectly_blocked_tasks(self) -> Iterator['Task']:
         for task in self._tasklist.all_tasks():
@@ -165,14 +293,40 @@ class Task(BaseModel):
             if self.uuid in task.blocks:
                 yield task
 
+    @timed('query.blocked_tasks')
     def blocked_tasks(self) -> Iterator['Task']:
-        yield from map(self._tasklist._tasks_by_uuid.__getitem__, self.blocks)
+        yield from map(self._tasklist.get_task, self.blocks)
         yield from self._indirectly_blocked_tasks()
 
+    @timed('query.blocking_tasks')
     def blocking_tasks(self) -> Iterator['Task']:
-        yield from map(self._tasklist._tasks_by_uuid.__getitem__, self.requires)
+        yield from map(self._tasklist.get_task, self.requires)
         yield from self._indirectly_blocking_tasks()
 
+    @property
+    def rollup(self) -> Rollup:
+        tasklist = self._get_tasklist()
+        assert tasklist is not None
+        if tasklist._rollups_stale:
+            tasklist.refresh_rollups()
+        return self._rollup
+
+    def has_any_tags(self, mask: int) -> bool:
+        return bool(self._tag_bits & mask)
+
+    def has_all_tags(self, mask: int) -> bool:
+        return self._tag_bits & mask == mask
+
+    def has_no_tags(self, mask: int) -> bool:
+        return not self._tag_bits & mask
+
+    @property
+    def tag_urgency(self) -> float:
+        tasklist = self._get_tasklist()
+        if tasklist is None:
+            return 0
+        return tasklist._tag_urgency(self._tag_bits)
+
     @property
     def inherited_base_urgency(self) -> float:
         return self._get_inherited_attribute('base_urgency')
@@ -182,36 +336,49 @@ class Task(BaseModel):
         return self._get_inherited_attribute('age_urgency_factor')
 
     @property
-    def inherited_age_urgency_max(self) -> float:
+    def inherited_age_urgency_max(self) -> Optional[float]:
         return self._get_inherited_attribute('age_urgency_max')
 
     @property
+    @timed('query.urgency')
     def urgency(self) -> float:
-        age = datetime.now().astimezone() - self.created
-        age_days = age / timedelta(days=1)
-        age_urgency = max(age_days * self.inherited_age_urgency_factor,
-                          self.inherited_age_urgency_max)
-        return self.inherited_base_urgency + age_urgency
+        return self.urgency_at(localtime.now())
+
+    def urgency_at(self, when: AwareDatetime) -> float:
+        # Urgency grows linearly with age until it reaches the age maximum,
+        # if there is one.
+        age_days = (when - self.created) / timedelta(days=1)
+        age_urgency = age_days * self.inherited_age_urgency_factor
+        age_urgency_max = self.inherited_age_urgency_max
+        if age_urgency_max is not None:
+            age_urgency = min(age_urgency, age_urgency_max)
+        return self.inherited_base_urgency + age_urgency + self.tag_urgency
 
     def done(self) -> None:
         for c in self.children:
             assert c.state not in ('done', 'dropped')
         self.state = 'done'
-        self.ended = datetime.now().astimezone()
+        self.ended = localtime.now()
 
     def drop(self) -> None:
         for c in self.children:
             assert c.state not in ('done', 'dropped')
         self.state = 'dropped'
-        self.ended = datetime.now().astimezone()
+        self.ended = localtime.now()
 
     def add_child(self, child: 'Task') -> None:
         assert child.state in self._valid_child_states()
         self.children.append(child)
         child._parent = self
+        tasklist = self._get_tasklist()
+        if tasklist is not None:
+            tasklist._add_task_tree(child)
+            if not tasklist._rollups_stale:
+                tasklist._compute_subtree_rollups(child)
+                tasklist._update_rollup_path(self)
 
 
-class TaskTemplate(BaseModel):
+class TaskTemplate(DirtyTrackingModel):
     title: str
     uuid: UUID = Field(default_factory=uuid4)
     parent: Optional[UUID] = None
@@ -227,8 +394,27 @@ class TaskTemplate(BaseModel):
     age_urgency_factor: Optional[float] = None
     age_urgency_max: Optional[float] = None
 
+    _parent: Optional['TaskTemplate'] = None
     _tasklist: 'TaskList'
     _schedule: 'TaskRecurrenceSchedule'
+    _tag_bits: int = 0
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        tasklist = getattr(self, '_tasklist', None)
+        if tasklist is None:
+            return
+        if name == 'tags':
+            self._tag_bits = tasklist.tag_mask(self.tags)
+        elif name == 'title' and tasklist._title_index is not None:
+            tasklist._title_index.add(self.uuid, self.title)
+
+    def _change_in_place(self, name: str, change: Callable[[], T]) -> T:
+        result = super()._change_in_place(name, change)
+        tasklist = getattr(self, '_tasklist', None)
+        if tasklist is not None and name == 'tags':
+            self._tag_bits = tasklist.tag_mask(self.tags)
+        return result
 
     @model_validator(mode='after')
     def _set_children_parents(self) -> Self:
@@ -236,14 +422,29 @@ class TaskTemplate(BaseModel):
             t._parent = self
         return self
 
+    def _serialization_parent(self) -> Optional[DirtyTrackingModel]:
+        if self._parent is not None:
+            return self._parent
+        return getattr(self, '_schedule', None)
 
-class TaskRecurrenceSchedule(BaseModel):
+
+class TaskRecurrenceSchedule(DirtyTrackingModel):
     uuid: UUID = Field(default_factory=uuid4)
     schedule: RelativeTime | SimpleRecurrence | ComplexRecurrence
     tasks: SingletonToList[TaskTemplate]
 
     _tasklist: 'TaskList'
 
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name == 'schedule':
+            tasklist = getattr(self, '_tasklist', None)
+            if tasklist is not None and tasklist._scheduler is not None:
+                tasklist._scheduler.rearm(self)
+
+    def _serialization_parent(self) -> Optional[DirtyTrackingModel]:
+        return getattr(self, '_tasklist', None)
+
     @model_validator(mode='after')
     def _set_task_schedule(self) -> Self:
         to_process = self.tasks[:]
@@ -254,7 +455,7 @@ class TaskRecurrenceSchedule(BaseModel):
         return self
 
 
-class TaskList(BaseModel):
+class TaskList(DirtyTrackingModel):
     base_urgency: float = 0
     age_urgency_factor: float = 4/365
     age_urgency_max: Optional[float] = 4
@@ -263,43 +464,341 @@ class TaskList(BaseModel):
     tags: SingletonToList[Tag]
 
     _tasks_by_uuid: dict[UUID, Task]
+    # Task rollups are computed the first time one is needed, and then kept
+    # up to date along the path from each changed task to the root.  The
+    # maximum urgencies are as at _rollups_as_of; refresh_rollups brings them
+    # up to date.
+    _rollups_stale: bool = True
+    _rollups_as_of: AwareDatetime
+    _tasks_by_state: dict[TaskState, dict[UUID, Task]]
+    _tasks_by_tag: dict[str, dict[UUID, Task]]
+    _tasks_by_due: TimeIndex
+    _tasks_by_wait: TimeIndex
     _task_schedules_by_uuid: dict[UUID, TaskRecurrenceSchedule]
     _task_templates_by_uuid: dict[UUID, TaskTemplate]
     _tags_by_name: dict[str, Tag]
+    # Tags are interned as small integers, in the order they're listed, so
+    # each task's tags can be stored as a bitset.
+    _tag_ids: dict[str, int]
+    _tag_urgency_factors: list[float]
+    # Total urgency factor for each combination of tags seen so far.  Tasks
+    # tend to share a handful of combinations, so this is small.
+    _tag_urgency_by_mask: dict[int, float]
+    # Where to find tasks that have been moved out of the list by compaction.
+    _archive: Optional['Archive'] = None
+    # The store this list was opened from, if it's loaded lazily in shards.
+    _shards: Optional['ShardedStore'] = None
+    # Built the first time titles are searched, and kept up to date after
+    # that.
+    _title_index: Optional[TitleIndex] = None
+    # Built the first time it's needed, and re-armed when a schedule's rule
+    # changes after that.
+    _scheduler: Optional[Scheduler] = None
+
+    @classmethod
+    def load(cls, path: Path | str) -> Self:
+        # Reads a task list file, with the archive next to it, if there is
+        # one, attached.
+        from archive import Archive, default_archive_path
+        path = Path(path)
+        tasklist = cls.model_validate_json(path.read_bytes())
+        archive_path = default_archive_path(path)
+        if archive_path.exists():
+            tasklist.attach_archive(Archive(archive_path))
+        return tasklist
+
+    @model_validator(mode='wrap')
+    @classmethod
+    @timed('validation.task_list')
+    def _time_validation(cls,
+                         value: Any,
+                         handler: ModelWrapValidatorHandler[Self],
+                         ) -> Self:
+        return handler(value)
+
+    # This needs to run before the tasks are indexed, as indexing each task
+    # checks its tags against the interned IDs.
+    @model_validator(mode='after')
+    @timed('validation.task_list.check_tags')
+    def _check_tags(self) -> Self:
+        self._tags_by_name = {}
+        self._tag_ids = {}
+        for tag in self.tags:
+            self._intern_tag(tag)
+        self._tag_urgency_factors_changed()
+        return self
+
+    def _intern_tag(self, tag: Tag) -> None:
+        assert tag.name not in self._tags_by_name
+        self._tags_by_name[tag.name] = tag
+        self._tag_ids[tag.name] = len(self._tag_ids)
+        tag._tasklist = self
+
+    def _tag_urgency_factors_changed(self) -> None:
+        self._tag_urgency_factors = [t.urgency_factor
+                                     for t in self._tags_by_name.values()]
+        self._tag_urgency_by_mask = {}
+        self._rollups_stale = True
+
+    def _tag_urgency(self, mask: int) -> float:
+        try:
+            return self._tag_urgency_by_mask[mask]
+        except KeyError:
+            pass
+        total = 0.0
+        bits = mask
+        while bits:
+            low = bits & -bits
+            total += self._tag_urgency_factors[low.bit_length() - 1]
+            bits ^= low
+        self._tag_urgency_by_mask[mask] = total
+        return total
+
+    def add_tag(self, tag: Tag) -> None:
+        self._intern_tag(tag)
+        self.tags.append(tag)
+        self._tag_urgency_factors_changed()
+
+    def tag_mask(self, names: Iterable[str]) -> int:
+        mask = 0
+        for name in names:
+            try:
+                mask |= 1 << self._tag_ids[name]
+            except KeyError:
+                raise ValueError(f'Unknown tag {name!r}') from None
+        return mask
+
+    def tasks_with_tags(self,
+                        any_of: Iterable[str] = (),
+                        all_of: Iterable[str] = (),
+                        none_of: Iterable[str] = (),
+                        ) -> Iterator[Task]:
+        self.load_all()
+        any_mask = self.tag_mask(any_of)
+        all_mask = self.tag_mask(all_of)
+        none_mask = self.tag_mask(none_of)
+        for task in self._tasks_by_uuid.values():
+            bits = task._tag_bits
+            if any_mask and not bits & any_mask:
+                continue
+            if bits & all_mask != all_mask:
+                continue
+            if bits & none_mask:
+                continue
+            yield task
 
     @model_validator(mode='after')
+    @timed('validation.task_list.index_tasks')
     def _set_task_tasklist(self) -> Self:
         self._tasks_by_uuid = {}
-        to_process = self.tasks[:]
+        self._tasks_by_state = {}
+        self._tasks_by_tag = {}
+        self._tasks_by_due = TimeIndex()
+        self._tasks_by_wait = TimeIndex()
+        for task in self.tasks:
+            self._add_task_tree(task)
+        return self
+
+    def _add_task_tree(self, root: Task) -> None:
+        to_process = [root]
         while to_process:
             task = to_process.pop()
             task._tasklist = self
             self._tasks_by_uuid[task.uuid] = task
+            self._index_task(task)
             to_process.extend(task.children)
-        return self
+
+    def _remove_task_tree(self, root: Task) -> None:
+        to_process = [root]
+        while to_process:
+            task = to_process.pop()
+            self._unindex_task(task)
+            del self._tasks_by_uuid[task.uuid]
+            del task._tasklist
+            to_process.extend(task.children)
+
+    def remove_task(self, task: Task) -> None:
+        # Removes the task and all its descendants from the list.
+        parent = task._parent
+        if parent is None:
+            self.tasks.remove(task)
+        else:
+            parent.children.remove(task)
+        self._remove_task_tree(task)
+        task._parent = None
+        if not self._rollups_stale:
+            self._update_rollup_path(parent)
+
+    def load_all(self) -> None:
+        # Loads everything that hasn't been loaded yet, for lists opened
+        # from a sharded store.  Anything that looks at the whole list rather
+        # than going through the UUID lookups needs to call this first.
+        if self._shards is not None:
+            self._shards.load_all()
+
+    def attach_archive(self, archive: Optional['Archive']) -> None:
+        self._archive = archive
+
+    def get_task(self, uuid: UUID) -> Task:
+        # Finds a task by UUID, looking in the archive, if there is one, for
+        # tasks that aren't in the list itself.  Archived tasks aren't part
+        # of this list, so they're read-only records, with nothing inherited
+        # from the list, such as urgency.
+        try:
+            return self._tasks_by_uuid[uuid]
+        except KeyError:
+            if self._archive is None:
+                raise
+        task = self._archive.get(uuid)
+        if task is None:
+            raise KeyError(uuid)
+        return task
+
+    def _index_task(self, task: Task) -> None:
+        task._tag_bits = self.tag_mask(task.tags)
+        if self._title_index is not None:
+            self._title_index.add(task.uuid, task.title)
+        self._tasks_by_state.setdefault(task.state, {})[task.uuid] = task
+        for tag in task.tags:
+            self._tasks_by_tag.setdefault(tag, {})[task.uuid] = task
+        if task.due is not None:
+            self._tasks_by_due.add(task.due, task.uuid)
+        if task.wait is not None:
+            self._tasks_by_wait.add(task.wait, task.uuid)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        super().__setattr__(name, value)
+        if name in Task._inherited_fields:
+            self._rollups_stale = True
+
+    def _task_changed(self, task: Task, name: str) -> None:
+        if self._rollups_stale or not (name in Task._rollup_fields
+                                       or name in Task._inherited_fields):
+            return
+        if name in Task._inherited_fields:
+            # This changes the urgency of every task below this one too.
+            self._compute_subtree_rollups(task)
+        self._update_rollup_path(task._parent)
+
+    def refresh_rollups(self, now: Optional[AwareDatetime] = None) -> None:
+        if now is None:
+            now = localtime.now()
+        self.load_all()
+        self._rollups_as_of = now
+        for task in self.tasks:
+            self._compute_subtree_rollups(task)
+        self._rollups_stale = False
+
+    def _compute_subtree_rollups(self, root: Task) -> None:
+        # Children come after their parents in this order, so working
+        # through it backwards does every task after all its children.
+        order: list[Task] = []
+        to_process = [root]
+        while to_process:
+            task = to_process.pop()
+            order.append(task)
+            to_process.extend(task.children)
+        for task in reversed(order):
+            task._rollup = self._compute_rollup(task)
+
+    def _compute_rollup(self, task: Task) -> Rollup:
+        rollup = Rollup()
+        for child in task.children:
+            setattr(rollup, child.state, getattr(rollup, child.state) + 1)
+            rollup.add_descendants(child._rollup)
+            if child.state == 'todo':
+                rollup.add_urgency(child.urgency_at(self._rollups_as_of))
+            rollup.add_due(child.due)
+        return rollup
+
+    def _update_rollup_path(self, task: Optional[Task]) -> None:
+        while task is not None:
+            task._rollup = self._compute_rollup(task)
+            task = task._parent
+
+    def _unindex_task(self, task: Task) -> None:
+        if self._title_index is not None:
+            self._title_index.remove(task.uuid)
+        del self._tasks_by_state[task.state][task.uuid]
+        for tag in task.tags:
+            self._tasks_by_tag[tag].pop(task.uuid, None)
+        if task.due is not None:
+            self._tasks_by_due.remove(task.due, task.uuid)
+        if task.wait is not None:
+            self._tasks_by_wait.remove(task.wait, task.uuid)
 
     @model_validator(mode='after')
+    @timed('validation.task_list.index_schedules')
     def _set_schedule_tasklist(self) -> Self:
         self._task_schedules_by_uuid = {}
         self._task_templates_by_uuid = {}
         for schedule in self.recurring_tasks:
-            self._task_schedules_by_uuid[schedule.uuid] = schedule
-            to_process = schedule.tasks[:]
-            while to_process:
-                task = to_process.pop()
-                task._tasklist = self
-                self._task_templates_by_uuid[task.uuid] = task
-                to_process.extend(task.children)
+            self._add_schedule(schedule)
         return self
 
-    @model_validator(mode='after')
-    def _check_tags(self) -> Self:
-        self._tags_by_name = {}
-        for tag in self.tags:
-            self._tags_by_name[tag.name] = tag
-        for task in chain(self.all_tasks(), self.all_task_templates()):
-            for tag in task.tags:
-                assert tag in self._tags_by_name
+    def _add_schedule(self, schedule: TaskRecurrenceSchedule) -> None:
+        schedule._tasklist = self
+        self._task_schedules_by_uuid[schedule.uuid] = schedule
+        to_process = schedule.tasks[:]
+        while to_process:
+            task = to_process.pop()
+            task._tasklist = self
+            task._tag_bits = self.tag_mask(task.tags)
+            self._task_templates_by_uuid[task.uuid] = task
+            if self._title_index is not None:
+                self._title_index.add(task.uuid, task.title)
+            to_process.extend(task.children)
+        if self._scheduler is not None:
+            self._scheduler.add(schedule, localtime.now())
+
+    def _remove_schedule(self, schedule: TaskRecurrenceSchedule) -> None:
+        del self._task_schedules_by_uuid[schedule.uuid]
+        del schedule._tasklist
+        to_process = schedule.tasks[:]
+        while to_process:
+            task = to_process.pop()
+            del self._task_templates_by_uuid[task.uuid]
+            del task._tasklist
+            if self._title_index is not None:
+                self._title_index.remove(task.uuid)
+            to_process.extend(task.children)
+        if self._scheduler is not None:
+            self._scheduler.remove(schedule.uuid)
+
+    @property
+    def scheduler(self) -> Scheduler:
+        if self._scheduler is None:
+            self._scheduler = Scheduler(self.all_task_schedules())
+        return self._scheduler
+
+    def start_scheduler(self,
+                        now: Optional[AwareDatetime] = None,
+                        last_fired: Optional[dict[UUID, AwareDatetime]] = None,
+                        ) -> Scheduler:
+        # Starts the scheduler afresh from the given time, with the times
+        # schedules last fired where they're known.
+        self._scheduler = Scheduler(self.all_task_schedules(), now,
+                                    last_fired)
+        return self._scheduler
+
+    @property
+    def title_index(self) -> TitleIndex:
+        if self._title_index is None:
+            self.load_all()
+            index = TitleIndex()
+            for t in self.all_tasks():
+                index.add(t.uuid, t.title)
+            for template in self.all_task_templates():
+                index.add(template.uuid, template.title)
+            self._title_index = index
+        return self._title_index
+
+    @timed('query.search_titles')
+    def search_titles(self, query: str, limit: Optional[int] = 20,
+                      ) -> list[UUID]:
+        # UUIDs of tasks and templates whose titles have words starting with
+        # each word in the query, best matches first.
+        return self.title_index.search(query, limit)
 
     def all_tasks(self) -> Iterator[Task]:
         yield from self._tasks_by_uuid.values()
@@ -0,0 +1,56 @@
+import json
+from datetime import UTC, datetime
+from pathlib import Path
+
+import pytest
+
+from archive import Archive, compact, default_archive_path, main
+from task import TaskList
+
+OLD = '2020-01-01T00:00:00Z'
+
+
+@pytest.fixture
+def path(tmp_path: Path) -> Path:
+    path = tmp_path / 'tasks.json'
+    path.write_text(json.dumps({
+        'tags': [],
+        'tasks': [{'title': 'live',
+                   'uuid': '00000000-0000-0000-0000-000000000001',
+                   'requires': ['00000000-0000-0000-0000-000000000002']},
+                  {'title': 'old', 'state': 'done', 'ended': OLD,
+                   'uuid': '00000000-0000-0000-0000-000000000002',
+                   'children': [{'title': 'old child', 'state': 'done',
+                                 'ended': OLD}]}],
+        }))
+    return path
+
+
+def test_compact_moves_ended_subtrees(path: Path) -> None:
+    tasklist = TaskList.load(path)
+    archive = Archive(default_archive_path(path))
+    assert compact(tasklist, archive, datetime(2021, 1, 1, tzinfo=UTC)) == 2
+    assert [t.title for t in tasklist.all_tasks()] == ['live']
+    old = tasklist.tasks[0].requires[0]
+    assert tasklist.get_task(old).title == 'old'
+    assert archive.parent_of(old) is None
+    assert len(Archive(archive.path)) == 2
+
+
+def test_archive_is_attached_on_load(path: Path) -> None:
+    assert main([str(path), '--before', '2021-01-01T00:00:00Z']) == 0
+    tasklist = TaskList.load(path)
+    live = tasklist.tasks[0]
+    [old] = live.blocking_tasks()
+    assert old.title == 'old'
+    assert old.children[0].title == 'old child'
+    with pytest.raises(ValueError, match='not in a task list'):
+        old.urgency
+
+
+def test_nothing_to_archive(path: Path) -> None:
+    tasklist = TaskList.load(path)
+    archive = Archive(default_archive_path(path))
+    assert compact(tasklist, archive, datetime(2019, 1, 1, tzinfo=UTC)) == 0
+    assert len(archive) == 0
+    assert not archive.path.exists()
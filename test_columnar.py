@@ -0,0 +1,64 @@
+from datetime import UTC, datetime
+from uuid import uuid4
+from zoneinfo import ZoneInfo
+
+import pytest
+
+from columnar import ColumnarTaskList
+from task import TaskList
+from workload import WorkloadSpec, generate_document
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=UTC)
+_FIELDS = ('uuid', 'title', 'state', 'created', 'wait', 'due', 'ended',
+           'base_urgency', 'age_urgency_factor', 'age_urgency_max')
+_LIST_FIELDS = ('requires', 'blocks', 'tags')
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    document = generate_document(WorkloadSpec(tasks=200, schedules=5))
+    document['tasks'].append({
+            'title': 'zoned',
+            'due': datetime(2024, 7, 1, 9, tzinfo=ZoneInfo('Europe/London')),
+            'wait': '2024-06-20',
+            })
+    return TaskList.model_validate(document)
+
+
+def test_views_match_models(tasklist: TaskList) -> None:
+    columnar = ColumnarTaskList.from_tasklist(tasklist)
+    assert len(columnar) == sum(1 for _ in tasklist.all_tasks())
+    for task in tasklist.all_tasks():
+        view = columnar.get_task(task.uuid)
+        for name in _FIELDS:
+            assert getattr(view, name) == getattr(task, name), name
+        for name in _LIST_FIELDS:
+            assert getattr(view, name) == tuple(getattr(task, name)), name
+        assert [c.uuid for c in view.children] == [
+                c.uuid for c in task.children]
+        parent = view.parent
+        assert (None if parent is None else parent.uuid) == (
+                None if task._parent is None else task._parent.uuid)
+        assert view.urgency_at(NOW) == task.urgency_at(NOW)
+    zoned = columnar.tasks[-1]
+    assert zoned.due.tzinfo == ZoneInfo('Europe/London')
+
+
+def test_round_trip(tasklist: TaskList) -> None:
+    columnar = ColumnarTaskList.from_tasklist(tasklist)
+    assert columnar.to_tasklist().model_dump() == tasklist.model_dump()
+    from_document = ColumnarTaskList.from_document(
+            tasklist.model_dump(mode='json'))
+    assert from_document.to_tasklist().model_dump() == tasklist.model_dump()
+
+
+def test_lookups() -> None:
+    columnar = ColumnarTaskList.from_document(
+            {'tags': [], 'tasks': {'title': 'only'}})
+    [view] = columnar.tasks
+    assert view.to_task().title == 'only'
+    with pytest.raises(KeyError):
+        columnar.get_task(uuid4())
+    with pytest.raises(ValueError, match='Unknown tag'):
+        ColumnarTaskList.from_document(
+                {'tags': [], 'tasks': [{'title': 'a', 'tags': ['nowhere']}]})
@@ -0,0 +1,56 @@
+import copy
+import pickle
+
+import pytest
+
+from task import Task, TaskList
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    return TaskList.model_validate({
+        'tags': [{'name': 'home'}],
+        'tasks': [{'title': 'parent',
+                   'children': [{'title': 'child'}]}],
+        })
+
+
+def test_append_to_tags_updates_caches(tasklist: TaskList) -> None:
+    child = tasklist.tasks[0].children[0]
+    tasklist.model_dump_json()
+    generation = tasklist._generation
+    child.tags.append('home')
+    assert tasklist._generation > generation
+    assert tasklist.model_dump_json() == TaskList.model_validate(
+            tasklist.model_dump()).model_dump_json()
+    assert list(tasklist.tasks_with_tags(all_of=['home'])) == [child]
+
+
+def test_unknown_tag_is_not_added(tasklist: TaskList) -> None:
+    child = tasklist.tasks[0].children[0]
+    child.tags.append('home')
+    with pytest.raises(ValueError, match='Unknown tag'):
+        child.tags.append('nowhere')
+    assert child.tags == ['home']
+    assert list(tasklist.tasks_with_tags(all_of=['home'])) == [child]
+
+
+def test_append_to_children_marks_parent_dirty(tasklist: TaskList) -> None:
+    parent = tasklist.tasks[0]
+    tasklist.model_dump_json()
+    parent.children.append(Task(title='new'))
+    assert parent.dirty and tasklist.dirty
+    assert 'new' in tasklist.model_dump_json()
+
+
+def test_assigned_and_copied_lists_are_tracked(tasklist: TaskList) -> None:
+    task = tasklist.tasks[0]
+    task.requires = []
+    for model in (task,
+                  task.model_copy(),
+                  copy.deepcopy(task),
+                  pickle.loads(pickle.dumps(task))):
+        model.model_dump_json()
+        model.requires.append(task.uuid)
+        assert model.dirty
+    assert task.requires == [task.uuid]
@@ -0,0 +1,32 @@
+from uuid import uuid4
+
+import pytest
+
+from history import Version
+from task import TaskList
+
+
+@pytest.fixture
+def version() -> Version:
+    return Version.from_tasklist(TaskList.model_validate({
+        'tags': [{'name': 'home'}, {'name': 'work', 'urgencyFactor': 2}],
+        'tasks': [{'title': 'a'}, {'title': 'b'}],
+        }))
+
+
+def test_set_checks_tags(version: Version) -> None:
+    a = version.roots[0]
+    changed = version.set(a, tags=['home', 'work'])
+    assert changed.task(a).fields['tags'] == ('home', 'work')
+    with pytest.raises(ValueError, match='Unknown tags'):
+        version.set(a, tags=['home', 'nowhere'])
+
+
+def test_set_checks_requires(version: Version) -> None:
+    a, b = version.roots
+    changed = version.set(a, requires=[str(b)])
+    assert changed.to_tasklist().get_task(a).requires == [b]
+    with pytest.raises(ValueError, match='unknown task'):
+        version.set(a, requires=[str(uuid4())])
+    with pytest.raises(ValueError, match='unknown task'):
+        version.set(a, blocks=[str(uuid4())])
@@ -0,0 +1,116 @@
+import io
+from datetime import UTC, date, datetime
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+import pytest
+
+import ical
+import localtime
+from task import TaskList
+
+NOW = datetime(2024, 3, 1, 12, tzinfo=UTC)
+
+
+def _export(document: dict[str, object]) -> str:
+    out = io.BytesIO()
+    ical.write(TaskList.model_validate(document), out, NOW)
+    return out.getvalue().decode()
+
+
+def _lines(calendar: str, name: str) -> list[str]:
+    return [line for line in calendar.split('\r\n')
+            if line.split(';')[0].split(':')[0] == name]
+
+
+@pytest.fixture
+def london(monkeypatch: pytest.MonkeyPatch) -> ZoneInfo:
+    zone = ZoneInfo('Europe/London')
+    monkeypatch.setattr(localtime, '_local_zone', zone)
+    return zone
+
+
+def test_tasks_and_relations() -> None:
+    calendar = _export({
+            'tags': [{'name': 'home'}],
+            'tasks': [{'title': 'parent; with, escapes',
+                       'tags': ['home'],
+                       'state': 'done',
+                       'ended': '2024-02-01T00:00:00Z',
+                       'children': [{'title': 'child', 'state': 'dropped'}],
+                       }],
+            })
+    assert calendar.startswith('BEGIN:VCALENDAR\r\n')
+    assert calendar.endswith('END:VCALENDAR\r\n')
+    assert _lines(calendar, 'SUMMARY') == [
+            'SUMMARY:parent\\; with\\, escapes', 'SUMMARY:child']
+    assert _lines(calendar, 'STATUS') == ['STATUS:COMPLETED',
+                                          'STATUS:CANCELLED']
+    assert _lines(calendar, 'CATEGORIES') == ['CATEGORIES:home']
+    assert _lines(calendar, 'COMPLETED') == ['COMPLETED:20240201T000000Z']
+    assert len(_lines(calendar, 'RELATED-TO')) == 1
+
+
+def test_long_lines_are_folded() -> None:
+    calendar = _export({'tags': [], 'tasks': [{'title': 'é' * 100}]})
+    for line in calendar.split('\r\n'):
+        assert len(line.encode()) <= 75
+    summary = calendar.split('SUMMARY:')[1].split('\r\nDTSTAMP')[0]
+    assert summary.replace('\r\n ', '') == 'é' * 100
+
+
+@pytest.mark.parametrize(('wait', 'due', 'dtstart'), [
+        ('2024-03-04', '2024-03-05', 'DTSTART;VALUE=DATE:20240304'),
+        ('2024-03-04T23:30:00Z', '2024-03-05',
+         'DTSTART;VALUE=DATE:20240304'),
+        ('2024-03-04', '2024-03-05T12:00:00Z',
+         'DTSTART;TZID=Europe/London:20240304T000000'),
+        ])
+def test_dtstart_matches_due(london: ZoneInfo, wait: str, due: str,
+                             dtstart: str) -> None:
+    calendar = _export({'tags': [],
+                        'tasks': [{'title': 'a', 'wait': wait, 'due': due}]})
+    [line] = _lines(calendar, 'DTSTART')
+    assert line == dtstart
+    [due_line] = _lines(calendar, 'DUE')
+    assert ('VALUE=DATE' in line) == ('VALUE=DATE' in due_line)
+
+
+def test_named_zones() -> None:
+    calendar = _export({
+            'tags': [],
+            'tasks': [],
+            'recurringTasks': [{
+                'schedule': {'freq': 'WEEKLY',
+                             'byweekday': ['MO', 'TH'],
+                             'dtstart': datetime(
+                                 2024, 1, 1, 9,
+                                 tzinfo=ZoneInfo('Europe/London'))},
+                'tasks': {'title': 'weekly', 'due': date(2024, 6, 1)},
+                }],
+            })
+    assert _lines(calendar, 'DTSTART') == [
+            'DTSTART;TZID=Europe/London:20240101T090000']
+    assert _lines(calendar, 'RRULE') == ['RRULE:FREQ=WEEKLY;BYDAY=MO,TH']
+    assert _lines(calendar, 'DUE') == ['DUE;VALUE=DATE:20240601']
+
+
+def test_zone_without_key(zone_file: Path) -> None:
+    with open(zone_file, 'rb') as f:
+        zone = ZoneInfo.from_file(f)
+    calendar = _export({'tags': [],
+                        'tasks': [{'title': 'a',
+                                   'due': datetime(2024, 7, 1, 9,
+                                                   tzinfo=zone)}]})
+    assert _lines(calendar, 'DUE') == ['DUE:20240701T080000Z']
+
+
+def test_unexportable_schedules_are_left_out() -> None:
+    calendar = _export({
+            'tags': [],
+            'tasks': [],
+            'recurringTasks': [{'schedule': {'freq': 'YEARLY',
+                                             'byeaster': 0},
+                                'tasks': {'title': 'easter'}}],
+            })
+    assert 'easter' not in calendar
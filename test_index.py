@@ -0,0 +1,38 @@
+from datetime import UTC, date, datetime
+from typing import Callable, Iterator
+from uuid import uuid4
+
+import pytest
+
+import localtime
+from index import TimeIndex
+
+
+@pytest.fixture
+def set_zone(monkeypatch: pytest.MonkeyPatch,
+             ) -> Iterator[Callable[[str], None]]:
+    def set_zone(name: str) -> None:
+        monkeypatch.setenv('TZ', name)
+        localtime.refresh_local_zone()
+    yield set_zone
+    monkeypatch.undo()
+    localtime.refresh_local_zone()
+
+
+def test_dates_survive_zone_change(set_zone: Callable[[str], None]) -> None:
+    set_zone('Europe/London')
+    index = TimeIndex()
+    day, noon = uuid4(), uuid4()
+    index.add(date(2024, 1, 2), day)
+    index.add(datetime(2024, 1, 1, 20, tzinfo=UTC), noon)
+    assert list(index) == [noon, day]
+
+    # Midnight on the 2nd in Auckland is 11:00 UTC on the 1st, and 20:00
+    # UTC is on the 2nd there.
+    set_zone('Pacific/Auckland')
+    assert list(index) == [day, noon]
+    assert list(index.range(date(2024, 1, 2), date(2024, 1, 3))) == [
+            day, noon]
+    assert list(index.range(date(2024, 1, 1), date(2024, 1, 2))) == []
+    index.remove(date(2024, 1, 2), day)
+    assert list(index) == [noon]
@@ -0,0 +1,72 @@
+from typing import Iterator
+
+import pytest
+
+import instrumentation
+from instrumentation import phase, timed
+
+
+@pytest.fixture
+def enabled() -> Iterator[None]:
+    instrumentation.reset()
+    instrumentation.enable()
+    yield
+    instrumentation.disable()
+    instrumentation.reset()
+
+
+@timed('test.add')
+def _add(a: int, b: int) -> int:
+    return a + b
+
+
+@timed('test.count')
+def _count(n: int) -> Iterator[int]:
+    yield from range(n)
+    return n
+
+
+def test_nothing_recorded_while_disabled() -> None:
+    instrumentation.reset()
+    assert _add(1, 2) == 3
+    assert list(_count(3)) == [0, 1, 2]
+    with phase('test.phase'):
+        pass
+    stats = instrumentation.snapshot()
+    assert stats['test.add'].calls == 0
+    assert 'test.phase' not in stats
+
+
+def test_calls_and_phases(enabled: None) -> None:
+    _add(1, 2)
+    with pytest.raises(TypeError):
+        _add(1, None)  # type: ignore[arg-type]
+    with phase('test.phase'):
+        pass
+    stats = instrumentation.snapshot()
+    assert stats['test.add'].calls == 2
+    assert stats['test.add'].max_ns <= stats['test.add'].total_ns
+    assert stats['test.phase'].calls == 1
+    assert instrumentation.snapshot_dict()['test.add']['calls'] == 2
+
+
+def test_generators_are_timed_once(enabled: None) -> None:
+    gen = _count(3)
+    assert next(gen) == 0
+    with pytest.raises(StopIteration) as e:
+        next(gen), next(gen), next(gen)
+    assert e.value.value == 3
+    # A generator that's abandoned part way is recorded when it's closed.
+    partial = _count(3)
+    next(partial)
+    partial.close()
+    assert instrumentation.snapshot()['test.count'].calls == 2
+
+
+def test_reset_keeps_counters_bound(enabled: None) -> None:
+    _add(1, 2)
+    instrumentation.reset()
+    assert instrumentation.snapshot()['test.add'].calls == 0
+    _add(1, 2)
+    assert instrumentation.snapshot()['test.add'].calls == 1
+    assert instrumentation.PhaseStats(0, 0, 0).mean_ns == 0
@@ -0,0 +1,19 @@
+import pickle
+import shutil
+import zoneinfo
+from pathlib import Path
+
+import localtime
+
+
+def test_copied_zone_file(zone_file: Path, etc_localtime: Path) -> None:
+    shutil.copy(zone_file, etc_localtime)
+    zone = localtime._resolve_local_zone()
+    assert getattr(zone, 'key', None) != 'localtime'
+    assert pickle.loads(pickle.dumps(zone)) == zone
+
+
+def test_linked_zone_file(zone_file: Path, etc_localtime: Path) -> None:
+    etc_localtime.symlink_to(zone_file)
+    zone = localtime._resolve_local_zone()
+    assert zone == zoneinfo.ZoneInfo('Europe/London')
@@ -0,0 +1,48 @@
+import shutil
+from pathlib import Path
+from typing import Any
+from uuid import UUID
+
+import localtime
+from parallel import load_parallel
+from task import TaskList
+
+# Every time is naive, and every UUID and created time is given, so two
+# loads of it are the same.
+DOCUMENT: dict[str, Any] = {
+    'tags': [{'name': 'home'}],
+    'tasks': [{'title': f'task {i}',
+               'uuid': str(UUID(int=2 * i)),
+               'created': '2024-01-01T00:00:00',
+               'due': '2024-03-01T09:00:00',
+               'tags': ['home'],
+               'children': [{'title': f'child {i}',
+                             'uuid': str(UUID(int=2 * i + 1)),
+                             'created': '2024-01-01T00:00:00',
+                             'wait': '2024-02-01'}]}
+              for i in range(8)],
+    'recurringTasks': [{'uuid': str(UUID(int=100)),
+                        'schedule': {'freq': 'DAILY',
+                                     'dtstart': '2024-01-01T09:00:00'},
+                        'tasks': [{'title': 'daily',
+                                   'uuid': str(UUID(int=101))}]}],
+    }
+
+
+def test_matches_model_validate() -> None:
+    tasklist = load_parallel(DOCUMENT, workers=2)
+    expected = TaskList.model_validate(DOCUMENT)
+    assert tasklist.model_dump_json() == expected.model_dump_json()
+    child = tasklist.tasks[3].children[0]
+    assert child._parent is tasklist.tasks[3]
+    assert tasklist.get_task(child.uuid) is child
+    assert list(tasklist.tasks_with_tags(all_of=['home'])) == tasklist.tasks
+
+
+def test_naive_times_with_copied_zone_file(zone_file: Path,
+                                           etc_localtime: Path) -> None:
+    shutil.copy(zone_file, etc_localtime)
+    localtime.refresh_local_zone()
+    tasklist = load_parallel(DOCUMENT, workers=2)
+    assert tasklist.model_dump_json() == TaskList.model_validate(
+            DOCUMENT).model_dump_json()
@@ -0,0 +1,74 @@
+from pathlib import Path
+from typing import Any
+
+import pytest
+from pydantic import ValidationError
+
+from precheck import (
+        SchemaError,
+        _schema_key,
+        load_validator,
+        task_list_schema,
+        task_list_validator,
+        )
+from task import TaskList
+
+
+def _model_accepts(document: dict[str, Any]) -> bool:
+    try:
+        TaskList.model_validate(document)
+    except ValidationError:
+        return False
+    return True
+
+
+@pytest.mark.parametrize('document', [
+        {'tags': ['home'], 'tasks': [{'title': 'a', 'tags': ['home']}]},
+        {'tags': ['home'], 'tasks': [{'title': 'a', 'tags': 'work'}]},
+        {'tags': [], 'tasks': {'title': 'a', 'state': 'done',
+                               'children': [{'title': 'b'}]}},
+        {'tags': [], 'tasks': [{'title': 'a', 'state': 'done',
+                                'children': [{'title': 'b',
+                                              'state': 'dropped'}]}]},
+        {'tags': [], 'tasks': [{'title': 'a', 'state': 'placeholder',
+                                'children': [{'title': 'b'}]}]},
+        {'tags': [{'name': 'x', 'urgencyFactor': 1}], 'tasks': [],
+         'recurringTasks': [{'schedule': {'freq': 'DAILY'},
+                             'tasks': {'title': 't', 'tags': 'y'}}]},
+        {'tags': [], 'tasks': [{'title': 1}]},
+        {'tags': [], 'tasks': [{'title': 'a', 'state': 'finished'}]},
+        ])
+def test_agrees_with_model(document: dict[str, Any]) -> None:
+    validator = task_list_validator()
+    assert validator.is_valid(document) == _model_accepts(document)
+
+
+def test_error_path() -> None:
+    document = {'tags': [], 'tasks': [{'title': 'a', 'state': 'done',
+                                       'children': [{'title': 'b'}]}]}
+    with pytest.raises(SchemaError) as e:
+        task_list_validator().validate(document)
+    assert e.value.path == ('tasks', 0, 'children', 0, 'state')
+
+
+def test_cache(tmp_path: Path) -> None:
+    schema = {'type': 'object', 'required': ['a']}
+    load_validator(schema, tmp_path)
+    [path] = tmp_path.iterdir()
+    assert _schema_key(schema) in path.name
+
+    # A file under the right name that wasn't written for this key is
+    # compiled again, not run.
+    other = {'type': 'array'}
+    load_validator(other, tmp_path / 'other')
+    [other_path] = (tmp_path / 'other').iterdir()
+    path.write_bytes(other_path.read_bytes())
+    validator = load_validator(schema, tmp_path)
+    assert validator.is_valid({'a': 1})
+    assert not validator.is_valid([])
+    assert path.read_bytes() != other_path.read_bytes()
+
+
+def test_task_list_schema_compiles(tmp_path: Path) -> None:
+    validator = load_validator(task_list_schema(), tmp_path)
+    assert validator.is_valid({'tags': [], 'tasks': []})
@@ -0,0 +1,76 @@
+from datetime import UTC, date, datetime
+
+import pytest
+
+from query import Query, TimeBound, parse_relative_time
+from task import TaskList
+from timedelta import RelativeTime
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=UTC)
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    return TaskList.model_validate({
+        'tags': [{'name': 'work'}, {'name': 'home'}],
+        'ageUrgencyFactor': 1,
+        'ageUrgencyMax': None,
+        'tasks': [{'title': 'Write report', 'tags': ['work'],
+                   'created': '2024-05-30T12:00:00Z',
+                   'due': '2024-06-03T09:00:00Z'},
+                  {'title': 'Buy milk', 'tags': ['home'],
+                   'created': '2024-05-20T12:00:00Z',
+                   'due': '2024-05-31'},
+                  {'title': 'Old', 'state': 'done',
+                   'created': '2024-01-01T00:00:00Z'}],
+        })
+
+
+def _titles(query: str, tasklist: TaskList) -> list[str]:
+    return sorted(t.title for t in Query(query).run(tasklist, NOW))
+
+
+@pytest.mark.parametrize('text, expected', [
+        ('-P1D', RelativeTime(days=-1)),
+        ('-P1DT2H', RelativeTime(days=-1, hours=-2)),
+        ('-P2W', RelativeTime(days=-14)),
+        ('P-1D', RelativeTime(days=-1)),
+        ('+P1M', RelativeTime(months=1)),
+        ('-2w', RelativeTime(days=-14)),
+        ('+3d', RelativeTime(days=3)),
+        ])
+def test_parse_relative_time(text: str, expected: RelativeTime) -> None:
+    assert parse_relative_time(text) == expected
+
+
+def test_negative_iso_duration(tasklist: TaskList) -> None:
+    assert TimeBound.from_str('-P1D').resolve(NOW) == datetime(
+            2024, 5, 31, 12, tzinfo=UTC)
+    assert _titles('due>-P1D', tasklist) == ['Write report']
+
+
+def test_time_terms(tasklist: TaskList) -> None:
+    assert _titles('due<+7d', tasklist) == ['Buy milk', 'Write report']
+    assert _titles('due:none', tasklist) == ['Old']
+    assert _titles('state:todo tag:work', tasklist) == ['Write report']
+    assert _titles('-tag:work (milk or report)', tasklist) == [
+            'Buy milk']
+
+
+def test_urgency_uses_query_time(tasklist: TaskList) -> None:
+    # Urgency grows by one a day from creation.
+    assert _titles('state:todo urgency>5', tasklist) == ['Buy milk']
+    later = Query('state:todo urgency>5').run(
+            tasklist, datetime(2024, 6, 10, tzinfo=UTC))
+    assert sorted(t.title for t in later) == ['Buy milk', 'Write report']
+
+
+def test_bad_queries() -> None:
+    for bad in ('state:foo', 'x:1', '(a', 'a)', 'state<todo', 'due<+7q'):
+        with pytest.raises(ValueError):
+            Query(bad)
+
+
+def test_date_bound_is_whole_day() -> None:
+    assert TimeBound.from_str('2024-06-01').is_whole_day()
+    assert TimeBound(date(2024, 6, 1)).is_whole_day()
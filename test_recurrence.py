@@ -0,0 +1,37 @@
+import pickle
+from datetime import UTC, datetime
+
+from dateutil import tz
+
+from recurrence import ComplexRecurrence, SimpleRecurrence
+
+
+def test_identical_rules_share_compiled_rule() -> None:
+    one = SimpleRecurrence.model_validate(
+            {'freq': 'WEEKLY', 'dtstart': '2024-01-01T09:00:00Z'})
+    two = SimpleRecurrence.model_validate(
+            {'freq': 'WEEKLY', 'dtstart': '2024-01-01T09:00:00Z'})
+    other = SimpleRecurrence.model_validate(
+            {'freq': 'WEEKLY', 'dtstart': '2024-01-02T09:00:00Z'})
+    assert one._rrule is two._rrule
+    assert one._rrule is not other._rrule
+    assert pickle.loads(pickle.dumps(one))._rrule is one._rrule
+
+
+def test_rules_without_dtstart_are_not_shared() -> None:
+    one = SimpleRecurrence.model_validate({'freq': 'DAILY'})
+    two = SimpleRecurrence.model_validate({'freq': 'DAILY'})
+    assert one._key is None
+    assert one._rrule is not two._rrule
+
+
+def test_unhashable_zone() -> None:
+    dtstart = datetime(2024, 1, 1, 9, tzinfo=tz.tzlocal())
+    rule = SimpleRecurrence(freq='DAILY', dtstart=dtstart)
+    assert rule._key is None
+    assert rule.after(dtstart) == datetime(2024, 1, 2, 9, tzinfo=tz.tzlocal())
+    complex_rule = ComplexRecurrence(
+            rrules=[{'freq': 'DAILY', 'dtstart': dtstart}], rdates=[dtstart])
+    assert complex_rule._key is None
+    after = datetime(2024, 1, 5, tzinfo=UTC)
+    assert complex_rule.after(after) == rule.after(after)
@@ -0,0 +1,79 @@
+from datetime import UTC, date, datetime
+
+import pytest
+
+from rollup import Rollup
+from task import Task, TaskList
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=UTC)
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    tasklist = TaskList.model_validate({
+        'tags': [],
+        'ageUrgencyFactor': 0,
+        'tasks': [{'title': 'root',
+                   'children': [
+                       {'title': 'a', 'baseUrgency': 3,
+                        'due': '2024-06-10T09:00:00Z',
+                        'children': [{'title': 'a1', 'baseUrgency': 5,
+                                      'due': '2024-06-05'},
+                                     {'title': 'a2', 'state': 'done',
+                                      'baseUrgency': 9}]},
+                       {'title': 'b', 'state': 'dropped'},
+                       ]}],
+        })
+    tasklist.refresh_rollups(NOW)
+    return tasklist
+
+
+def _fresh(tasklist: TaskList) -> dict[str, Rollup]:
+    # The rollups computed from scratch, to check the incremental updates
+    # against.
+    fresh = TaskList.model_validate(tasklist.model_dump())
+    fresh.refresh_rollups(NOW)
+    return {t.title: t.rollup for t in fresh.all_tasks()}
+
+
+def _rollups(tasklist: TaskList) -> dict[str, Rollup]:
+    return {t.title: t.rollup for t in tasklist.all_tasks()}
+
+
+def test_rollup(tasklist: TaskList) -> None:
+    root = tasklist.tasks[0]
+    assert root.rollup == Rollup(todo=2, done=1, dropped=1, max_urgency=5,
+                                 earliest_due=date(2024, 6, 5))
+    assert root.rollup.total == 4
+    assert root.children[1].rollup == Rollup()
+
+
+def test_updates_match_recomputing(tasklist: TaskList) -> None:
+    root = tasklist.tasks[0]
+    a, b = root.children
+    a1 = a.children[0]
+
+    a1.state = 'done'
+    assert _rollups(tasklist) == _fresh(tasklist)
+    assert root.rollup.max_urgency == 3
+
+    a.due = date(2024, 6, 2)
+    assert _rollups(tasklist) == _fresh(tasklist)
+
+    b.add_child(Task.model_validate({'title': 'b1', 'state': 'done'}))
+    assert _rollups(tasklist) == _fresh(tasklist)
+
+    tasklist.remove_task(a)
+    assert _rollups(tasklist) == _fresh(tasklist)
+    assert root.rollup == Rollup(done=1, dropped=1)
+
+
+def test_inherited_changes_reach_descendants(tasklist: TaskList) -> None:
+    root = tasklist.tasks[0]
+    a = root.children[0]
+    root.base_urgency = 10
+    assert _rollups(tasklist) == _fresh(tasklist)
+    assert root.rollup.max_urgency == 5
+    a.base_urgency = None
+    assert _rollups(tasklist) == _fresh(tasklist)
+    assert root.rollup.max_urgency == 10
@@ -0,0 +1,37 @@
+from datetime import UTC, datetime
+
+from recurrence import ComplexRecurrence, SimpleRecurrence
+from scheduler import next_occurrence
+from task import TaskRecurrenceSchedule
+
+
+def _schedule(rule: object) -> TaskRecurrenceSchedule:
+    return TaskRecurrenceSchedule.model_validate(
+            {'schedule': rule, 'tasks': [{'title': 'task'}]})
+
+
+def test_rule_with_dtstart() -> None:
+    schedule = _schedule({'freq': 'DAILY',
+                          'dtstart': '2024-01-01T09:00:00Z'})
+    assert isinstance(schedule.schedule, SimpleRecurrence)
+    after = datetime(2024, 3, 1, 12, tzinfo=UTC)
+    assert next_occurrence(schedule, after) == datetime(2024, 3, 2, 9,
+                                                        tzinfo=UTC)
+
+
+def test_rules_without_dtstart_are_aware() -> None:
+    after = datetime(2024, 3, 1, 12, tzinfo=UTC)
+    for rule in ({'freq': 'DAILY'},
+                 {'rrules': [{'freq': 'DAILY'}]}):
+        schedule = _schedule(rule)
+        result = next_occurrence(schedule, after)
+        assert result is not None and result.tzinfo is not None
+        assert result > after
+
+
+def test_rule_with_only_dates() -> None:
+    schedule = _schedule({'rdates': ['2030-01-01T00:00:00Z']})
+    assert isinstance(schedule.schedule, ComplexRecurrence)
+    after = datetime(2024, 3, 1, tzinfo=UTC)
+    assert next_occurrence(schedule, after) == datetime(2030, 1, 1,
+                                                        tzinfo=UTC)
@@ -0,0 +1,76 @@
+from pathlib import Path
+from uuid import UUID
+
+import pytest
+
+from search import TitleIndex, tokenize
+from shards import ShardedStore
+from task import TaskList
+
+DOCUMENT = {
+        'tags': [],
+        'tasks': [{'title': 'Buy milk'},
+                  {'title': 'Write report',
+                   'children': [{'title': 'Milk run to the shop'}]}],
+        'recurringTasks': [{'schedule': {'freq': 'DAILY'},
+                            'tasks': {'title': 'Feed the cat milk'}}],
+        }
+
+
+def _titles(tasklist: TaskList, uuids: list[UUID]) -> list[str]:
+    titles = {t.uuid: t.title for t in tasklist.all_tasks()}
+    titles |= {t.uuid: t.title for t in tasklist.all_task_templates()}
+    return [titles[u] for u in uuids]
+
+
+def test_tokenize() -> None:
+    assert tokenize("Don't STOP, café") == ['don', 't', 'stop', 'café']
+
+
+def test_ranking() -> None:
+    index = TitleIndex()
+    uuids = [UUID(int=i) for i in range(4)]
+    index.add(uuids[0], 'milkshake')
+    index.add(uuids[1], 'milk the cows now')
+    index.add(uuids[2], 'milk')
+    index.add(uuids[3], 'cows')
+    # Exact matches first, shorter titles first among those.
+    assert index.search('milk') == [uuids[2], uuids[1], uuids[0]]
+    assert index.search('mi co') == [uuids[1]]
+    assert index.search('milk', limit=1) == [uuids[2]]
+    assert index.search('goats') == []
+    assert index.search('  ') == []
+
+
+def test_remove_and_replace() -> None:
+    index = TitleIndex()
+    uuid = UUID(int=1)
+    index.add(uuid, 'milk')
+    index.add(uuid, 'bread')
+    assert index.search('milk') == []
+    assert index.search('bre') == [uuid]
+    index.remove(uuid)
+    assert len(index) == 0 and index.search('bre') == []
+
+
+def test_tasklist_keeps_index_current() -> None:
+    tasklist = TaskList.model_validate(DOCUMENT)
+    assert _titles(tasklist, tasklist.search_titles('milk')) == [
+            'Buy milk', 'Feed the cat milk', 'Milk run to the shop']
+    task = tasklist.tasks[0]
+    task.title = 'Buy bread'
+    assert task.uuid not in tasklist.search_titles('milk')
+    assert tasklist.search_titles('bread') == [task.uuid]
+
+
+@pytest.mark.parametrize('first_load', [None, 0])
+def test_sharded_list(tmp_path: Path, first_load: int | None) -> None:
+    tasklist = TaskList.model_validate(DOCUMENT)
+    ShardedStore.create(tmp_path / 'store', tasklist)
+    opened = ShardedStore(tmp_path / 'store').open()
+    if first_load is not None:
+        # Having some shards loaded already doesn't stop the rest being
+        # searched.
+        opened.get_task(tasklist.tasks[first_load].uuid)
+    assert (sorted(opened.search_titles('milk'))
+            == sorted(tasklist.search_titles('milk')))
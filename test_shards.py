@@ -0,0 +1,74 @@
+from pathlib import Path
+
+import pytest
+
+from shards import ShardedStore
+from task import Task, TaskList
+
+DOCUMENT = {
+        'tags': ['home'],
+        'tasks': [{'title': 'a', 'children': [{'title': 'a1'}]},
+                  {'title': 'b', 'tags': ['home']},
+                  {'title': 'c'}],
+        'recurringTasks': [{'schedule': {'freq': 'DAILY'},
+                            'tasks': {'title': 'daily'}}],
+        }
+
+
+@pytest.fixture
+def original() -> TaskList:
+    return TaskList.model_validate(DOCUMENT)
+
+
+@pytest.fixture
+def store_path(tmp_path: Path, original: TaskList) -> Path:
+    path = tmp_path / 'store'
+    ShardedStore.create(path, original)
+    return path
+
+
+def test_loads_shards_as_needed(store_path: Path,
+                                original: TaskList) -> None:
+    store = ShardedStore(store_path)
+    tasklist = store.open()
+    assert tasklist.tasks == []
+    a1 = original.tasks[0].children[0]
+    assert tasklist.get_task(a1.uuid).title == 'a1'
+    assert [t.title for t in tasklist.tasks] == ['a']
+
+    # Anything that looks at the whole list loads the rest, in order.
+    assert [t.title for t in tasklist.tasks_with_tags(all_of=['home'])] == [
+            'b']
+    assert [t.title for t in tasklist.tasks] == ['a', 'b', 'c']
+    assert tasklist.model_dump() == original.model_dump()
+
+
+def test_saves_only_what_changed(store_path: Path,
+                                 original: TaskList) -> None:
+    store = ShardedStore(store_path)
+    tasklist = store.open()
+    b = tasklist.get_task(original.tasks[1].uuid)
+    b.title = 'b changed'
+    assert store.save() == [store_path / 'tasks' / f'{b.uuid}.json']
+    assert store.save() == []
+
+    reopened = ShardedStore(store_path).open()
+    reopened.load_all()
+    assert [t.title for t in reopened.tasks] == ['a', 'b changed', 'c']
+
+
+def test_add_and_remove(store_path: Path, original: TaskList) -> None:
+    store = ShardedStore(store_path)
+    tasklist = store.open()
+    a = tasklist.get_task(original.tasks[0].uuid)
+    tasklist.remove_task(a)
+    tasklist.tasks.append(Task(title='d'))
+    store.save()
+    assert not (store_path / 'tasks' / f'{a.uuid}.json').exists()
+
+    reopened = ShardedStore(store_path).open()
+    with pytest.raises(KeyError):
+        reopened.get_task(original.tasks[0].children[0].uuid)
+    reopened.load_all()
+    assert [t.title for t in reopened.tasks] == ['b', 'c', 'd']
+    assert [s.tasks[0].title for s in reopened.recurring_tasks] == ['daily']
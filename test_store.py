@@ -0,0 +1,36 @@
+from pathlib import Path
+
+import pytest
+
+from store import ConflictError, TaskStore
+from task import Task
+
+
+def test_update_creates_missing_file(tmp_path: Path) -> None:
+    store = TaskStore(tmp_path / 'tasks.snap')
+    assert store.generation() == 0
+    with store.update() as tasklist:
+        assert tasklist.tasks == []
+        tasklist.tasks.append(Task(title='first'))
+    snapshot = store.read()
+    assert snapshot.generation == 1
+    assert [t.title for t in snapshot.tasklist.tasks] == ['first']
+
+
+def test_update_is_not_saved_on_error(tmp_path: Path) -> None:
+    store = TaskStore(tmp_path / 'tasks.snap')
+    with pytest.raises(RuntimeError):
+        with store.update():
+            raise RuntimeError
+    assert store.generation() == 0
+    assert not store.path.exists()
+
+
+def test_stale_save_conflicts(tmp_path: Path) -> None:
+    store = TaskStore(tmp_path / 'tasks.snap')
+    with store.update():
+        pass
+    snapshot = store.read()
+    assert store.save(snapshot.tasklist, snapshot.generation) == 2
+    with pytest.raises(ConflictError):
+        store.save(snapshot.tasklist, snapshot.generation)
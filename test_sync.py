@@ -0,0 +1,83 @@
+import pytest
+
+import sync
+from task import Task, TaskList
+
+
+@pytest.fixture
+def base() -> TaskList:
+    return TaskList.model_validate({
+        'tags': [],
+        'tasks': [{'title': 'parent', 'children': [{'title': 'first'}]},
+                  {'title': 'other'}],
+        })
+
+
+def _copy(tasklist: TaskList) -> TaskList:
+    return TaskList.model_validate_json(tasklist.model_dump_json())
+
+
+@pytest.fixture
+def done_and_added_child(base: TaskList) -> tuple[sync.ChangeSet, TaskList]:
+    # Ours marks the parent done; theirs adds a todo child under it.
+    ours = _copy(base)
+    parent = ours.tasks[0]
+    parent.children[0].state = 'done'
+    parent.state = 'done'
+    theirs = _copy(base)
+    theirs.tasks[0].add_child(Task(title='added'))
+    return sync.diff(base, ours), theirs
+
+
+def test_child_state_conflict_prefer_theirs(
+        done_and_added_child: tuple[sync.ChangeSet, TaskList]) -> None:
+    changes, theirs = done_and_added_child
+    merged, conflicts = sync.apply(changes, theirs, prefer='theirs')
+    parent = merged.get_task(theirs.tasks[0].uuid)
+    assert parent.state == 'todo'
+    assert [c.title for c in parent.children] == ['first', 'added']
+    assert parent.children[0].state == 'done'
+    assert any(c.key == str(parent.uuid) and c.field == 'state'
+               and c.ours == 'done' and c.theirs == 'todo'
+               for c in conflicts)
+
+
+def test_child_state_conflict_prefer_ours(
+        done_and_added_child: tuple[sync.ChangeSet, TaskList]) -> None:
+    changes, theirs = done_and_added_child
+    merged, conflicts = sync.apply(changes, theirs, prefer='ours')
+    parent = merged.get_task(theirs.tasks[0].uuid)
+    assert parent.state == 'done'
+    assert [c.title for c in parent.children] == ['first']
+    assert [t.title for t in merged.tasks] == ['parent', 'other', 'added']
+    assert any(c.field == 'state' for c in conflicts)
+
+
+@pytest.fixture
+def deleted_and_edited(base: TaskList) -> tuple[sync.ChangeSet, TaskList]:
+    ours = _copy(base)
+    ours.tasks.pop(1)
+    ours.mark_dirty()
+    theirs = _copy(base)
+    theirs.tasks[1].title = 'renamed'
+    return sync.diff(base, ours), theirs
+
+
+@pytest.mark.parametrize('prefer,kept', [('theirs', True), ('ours', False)])
+def test_delete_of_edited_task_conflicts(
+        deleted_and_edited: tuple[sync.ChangeSet, TaskList],
+        prefer: sync.Prefer,
+        kept: bool) -> None:
+    changes, theirs = deleted_and_edited
+    merged, conflicts = sync.apply(changes, theirs, prefer=prefer)
+    assert ('renamed' in [t.title for t in merged.tasks]) == kept
+    assert [c.key for c in conflicts] == [str(theirs.tasks[1].uuid)]
+
+
+def test_delete_of_unedited_subtree_is_clean(base: TaskList) -> None:
+    ours = _copy(base)
+    ours.tasks.pop(0)
+    ours.mark_dirty()
+    merged, conflicts = sync.apply(sync.diff(base, ours), _copy(base))
+    assert [t.title for t in merged.tasks] == ['other']
+    assert conflicts == []
@@ -0,0 +1,72 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from query import Query
+from task import Tag, TaskList
+
+NOW = datetime(2024, 6, 1, 12, tzinfo=UTC)
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    return TaskList.model_validate({
+        'tags': [{'name': 'work', 'urgencyFactor': 2},
+                 {'name': 'home', 'urgencyFactor': 0.5},
+                 'errand'],
+        'ageUrgencyFactor': 0,
+        'tasks': [{'title': 'both', 'tags': ['work', 'home']},
+                  {'title': 'work', 'tags': ['work']},
+                  {'title': 'errand', 'tags': ['errand', 'home']},
+                  {'title': 'none'}],
+        })
+
+
+def _titles(tasks: object) -> list[str]:
+    return sorted(t.title for t in tasks)  # type: ignore[attr-defined]
+
+
+def test_tasks_with_tags(tasklist: TaskList) -> None:
+    assert _titles(tasklist.tasks_with_tags(any_of=['work', 'errand'])) == [
+            'both', 'errand', 'work']
+    assert _titles(tasklist.tasks_with_tags(all_of=['work', 'home'])) == [
+            'both']
+    assert _titles(tasklist.tasks_with_tags(none_of=['home'])) == [
+            'none', 'work']
+    assert _titles(tasklist.tasks_with_tags()) == [
+            'both', 'errand', 'none', 'work']
+    with pytest.raises(ValueError, match='Unknown tag'):
+        list(tasklist.tasks_with_tags(any_of=['nowhere']))
+
+
+def test_mask_methods(tasklist: TaskList) -> None:
+    both = tasklist.tasks[0]
+    mask = tasklist.tag_mask(['work', 'errand'])
+    assert both.has_any_tags(mask)
+    assert not both.has_all_tags(mask)
+    assert not both.has_no_tags(mask)
+    assert tasklist.tag_mask([]) == 0
+
+
+def test_all_tags_query(tasklist: TaskList) -> None:
+    assert _titles(Query('tag:work+home').run(tasklist, NOW)) == ['both']
+    assert _titles(Query('tag:work').run(tasklist, NOW)) == ['both', 'work']
+
+
+def test_tag_urgency(tasklist: TaskList) -> None:
+    both, work, errand, none = tasklist.tasks
+    assert both.tag_urgency == 2.5
+    assert errand.tag_urgency == 0.5
+    assert none.tag_urgency == 0
+    assert work.urgency_at(NOW) == work.inherited_base_urgency + 2
+
+    tasklist.model_dump_json()
+    tasklist.tags[0].urgency_factor = 4
+    assert both.tag_urgency == 4.5
+    assert tasklist.dirty
+
+    tasklist.add_tag(Tag.model_validate(
+            {'name': 'later', 'urgencyFactor': -1}))
+    none.tags.append('later')
+    assert none.tag_urgency == -1
+    assert 'later' in tasklist.model_dump_json()
@@ -0,0 +1,30 @@
+import warnings
+
+import pytest
+from pydantic import TypeAdapter, ValidationError
+
+from recurrence import SimpleRecurrence
+from timedelta import RelativeTime
+
+
+def test_schemas_build_without_warnings() -> None:
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        adapter = TypeAdapter(RelativeTime)
+        TypeAdapter(SimpleRecurrence)
+    assert adapter.validate_python('P1W') == RelativeTime(days=7)
+
+
+def test_folded_parameters_are_not_serialized() -> None:
+    value = RelativeTime(weeks=2, days=1, yearday=100)
+    assert 'weeks' not in value and 'yearday' not in value
+    assert 'days' in value
+    assert RelativeTime(**dict(value)) == value
+    adapter = TypeAdapter(RelativeTime)
+    assert adapter.validate_json(adapter.dump_json(value)) == value
+
+
+def test_forbidden_value_names_the_field() -> None:
+    with pytest.raises(ValidationError, match='bymonthday cannot be 0'):
+        SimpleRecurrence.model_validate({'freq': 'DAILY',
+                                         'bymonthday': [0]})
@@ -0,0 +1,62 @@
+from datetime import date
+
+import pytest
+from pydantic import ValidationError
+
+from task import TaskList
+from transaction import Transaction
+
+
+@pytest.fixture
+def tasklist() -> TaskList:
+    return TaskList.model_validate({
+        'tags': [{'name': 'home'}],
+        'tasks': [{'title': 'parent',
+                   'children': [{'title': 'child'}]},
+                  {'title': 'other'}],
+        })
+
+
+def test_set_validates_values(tasklist: TaskList) -> None:
+    task = tasklist.tasks[1]
+    with pytest.raises(ValidationError):
+        with Transaction(tasklist) as txn:
+            txn.set(task.uuid, title=123)
+    with pytest.raises(ValidationError):
+        with Transaction(tasklist) as txn:
+            txn.set(task.uuid, due='not a date')
+    assert task.title == 'other'
+    assert task.due is None
+
+
+def test_set_coerces_values(tasklist: TaskList) -> None:
+    task = tasklist.tasks[1]
+    with Transaction(tasklist) as txn:
+        txn.set(task.uuid, due='2024-01-01')
+    assert task.due == date(2024, 1, 1)
+    assert list(tasklist._tasks_by_due.range(date(2024, 1, 1),
+                                             date(2024, 1, 2))) == [task.uuid]
+
+
+def test_failed_commit_rolls_back(tasklist: TaskList) -> None:
+    parent = tasklist.tasks[0]
+    child = parent.children[0]
+    before = tasklist.model_dump_json()
+    with pytest.raises(ValueError):
+        with Transaction(tasklist) as txn:
+            txn.set(child.uuid, state='placeholder', due='2030-01-01')
+    assert child.state == 'todo'
+    assert child.due is None
+    assert tasklist.model_dump_json() == before
+    assert child.uuid in tasklist._tasks_by_state['todo']
+    assert child.uuid not in tasklist._tasks_by_state.get('placeholder', {})
+
+
+def test_unknown_tag_rolls_back(tasklist: TaskList) -> None:
+    task = tasklist.tasks[1]
+    with pytest.raises(ValueError, match='Unknown tag'):
+        with Transaction(tasklist) as txn:
+            txn.set(task.uuid, title='renamed')
+            txn.set(task.uuid, tags=['nowhere'])
+    assert task.title == 'other'
+    assert task.tags == []
@@ -0,0 +1,63 @@
+import json
+from typing import Any
+
+import pytest
+
+from task import TaskList
+from watch import Reloader
+
+
+@pytest.fixture
+def reloader() -> Reloader:
+    return Reloader()
+
+
+def _titles(tasklist: TaskList) -> list[str]:
+    return [task.title for task in tasklist.all_tasks()]
+
+
+def _matches_full_validation(reloader: Reloader,
+                             document: dict[str, Any]) -> TaskList:
+    tasklist = reloader.load(json.dumps(document))
+    expected = TaskList.model_validate(document)
+    assert [t.title for t in tasklist.tasks] == [
+            t.title for t in expected.tasks]
+    assert sorted(_titles(tasklist)) == sorted(_titles(expected))
+    assert len(tasklist._tasks_by_uuid) == len(expected._tasks_by_uuid)
+    return tasklist
+
+
+def test_identical_tasks_are_kept(reloader: Reloader) -> None:
+    document = {'tags': [],
+                'tasks': [{'title': 'buy milk'}, {'title': 'buy milk'}]}
+    tasklist = _matches_full_validation(reloader, document)
+    assert len(tasklist.tasks) == 2
+    assert tasklist.tasks[0] is not tasklist.tasks[1]
+
+
+def test_identical_tasks_across_reloads(reloader: Reloader) -> None:
+    one = {'tags': [], 'tasks': [{'title': 'buy milk'}]}
+    three = {'tags': [], 'tasks': [{'title': 'buy milk'}] * 3}
+    first = _matches_full_validation(reloader, one)
+    original = first.tasks[0]
+
+    tasklist = _matches_full_validation(reloader, three)
+    assert tasklist.tasks[0] is original
+    assert reloader.revalidated == 2
+    assert len({id(t) for t in tasklist.tasks}) == 3
+
+    tasklist = _matches_full_validation(reloader, one)
+    assert tasklist.tasks == [original]
+    assert reloader.revalidated == 0
+
+
+def test_edit_revalidates_only_changed_task(reloader: Reloader) -> None:
+    document = {'tags': [],
+                'tasks': [{'title': 'a'}, {'title': 'b'}, {'title': 'a'}]}
+    first = _matches_full_validation(reloader, document)
+    kept = first.tasks[0]
+    document['tasks'][1] = {'title': 'c'}
+    tasklist = _matches_full_validation(reloader, document)
+    assert reloader.revalidated == 1
+    assert tasklist.tasks[0] is kept
+    assert [t.title for t in tasklist.tasks] == ['a', 'c', 'a']
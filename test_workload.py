@@ -0,0 +1,48 @@
+from pathlib import Path
+
+import pytest
+
+import benchmark
+from task import TaskList
+from workload import WorkloadSpec, generate, generate_document
+
+SMALL = WorkloadSpec(tasks=50, schedules=5)
+
+
+def test_same_spec_same_document() -> None:
+    assert generate_document(SMALL) == generate_document(SMALL)
+    other = WorkloadSpec(tasks=50, schedules=5, seed=1)
+    assert generate_document(SMALL) != generate_document(other)
+
+
+def test_document_matches_spec() -> None:
+    tasklist = generate(SMALL)
+    assert sum(1 for _ in tasklist.all_tasks()) == SMALL.tasks
+    assert len(tasklist.recurring_tasks) == SMALL.schedules
+    assert len(tasklist.tags) == SMALL.tags
+    # The document is in its serialized form, so it survives a round trip.
+    assert TaskList.model_validate_json(
+            tasklist.model_dump_json()).model_dump() == tasklist.model_dump()
+
+
+def test_run_and_compare(tmp_path: Path,
+                         capsys: pytest.CaptureFixture[str]) -> None:
+    results = tmp_path / 'results.jsonl'
+    common = ['--results', str(results), '--tasks', '50', '--schedules', '5',
+              '--repeat', '1', '--min-time', '0']
+    assert benchmark.main(['run', *common]) == 0
+    assert benchmark.main(['run', 'load.', *common]) == 0
+    first, second = benchmark.load_results(results)
+    assert first['results'].keys() == {*benchmark._benchmarks,
+                                       *benchmark._memory_benchmarks}
+    assert second['results'].keys() == {
+            n for n in benchmark._benchmarks if 'load.' in n}
+    capsys.readouterr()
+
+    revision = first['revision'] or ''
+    assert benchmark.main(['compare', '--results', str(results),
+                           revision]) == 0
+    lines = capsys.readouterr().out.splitlines()
+    assert len(lines) == 1 + len(second['results'])
+    assert benchmark.main(['compare', '--results', str(results),
+                           'no-such-revision']) == 1
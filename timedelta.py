@@ -16,12 +16,9 @@ from inspect import get_annotations, signature
 import re
 
 from pydantic import (
-        Field,
         GetCoreSchemaHandler,
-        SerializerFunctionWrapHandler,
         TypeAdapter,
         )
-from pydantic.fields import FieldInfo
 from pydantic_core import core_schema
 import dateutil.relativedelta as relativedelta
 from annotated_types import Ge, Le
@@ -36,6 +33,22 @@ else:
     WeekdayOffset = WeekdayOffsetT[relativedelta.weekday]
 
 
+class _Excluded:
+    # Annotated metadata for __init__ parameters that relativedelta folds into
+    # other fields, so they're accepted but never serialized.  Pydantic's own
+    # Field(exclude=True) only applies to model fields, and it warns about it
+    # being used on anything else.
+    pass
+
+
+_EXCLUDED = _Excluded()
+
+
+def _is_excluded(annotation: Any) -> bool:
+    return (get_origin(annotation) is Annotated
+            and any(a is _EXCLUDED for a in get_args(annotation)))
+
+
 class RelativeTime(relativedelta.relativedelta,
                     Mapping[str, int | WeekdayOffset | None]):
     _re: ClassVar[re.Pattern[str]] = re.compile(
@@ -58,7 +71,7 @@ class RelativeTime(relativedelta.relativedelta,
             months: int = 0,
             days: int = 0,
             leapdays: int = 0,
-            weeks: Annotated[int, Field(exclude=True)] = 0,
+            weeks: Annotated[int, _EXCLUDED] = 0,
             hours: int = 0,
             minutes: int = 0,
             seconds: int = 0,
@@ -66,8 +79,8 @@ class RelativeTime(relativedelta.relativedelta,
             month: Optional[Annotated[int, Ge(1), Le(12)]] = None,
             day: Optional[Annotated[int, Ge(1), Le(31)]] = None,
             weekday: Optional[WeekdayOffset] = None,
-            yearday: Annotated[Optional[int], Field(exclude=True)] = None,
-            nlyearday: Annotated[Optional[int], Field(exclude=True)] = None,
+            yearday: Annotated[Optional[int], _EXCLUDED] = None,
+            nlyearday: Annotated[Optional[int], _EXCLUDED] = None,
             hour: Optional[Annotated[int, Ge(0), Le(23)]] = None,
             minute: Optional[Annotated[int, Ge(0), Le(59)]] = None,
             second: Optional[Annotated[int, Ge(0), Le(59)]] = None,
@@ -105,16 +118,7 @@ class RelativeTime(relativedelta.relativedelta,
         except KeyError:
             return False
 
-        if get_origin(type_info) is Annotated:
-            try:
-                field_info = next(a for a in get_args(type_info)
-                                  if isinstance(a, FieldInfo))
-            except StopIteration:
-                return True
-            else:
-                return not field_info.exclude
-        else:
-            return True
+        return not _is_excluded(type_info)
 
     def __iter__(self) -> Iterator[str]:
         for key in get_annotations(RelativeTime.__init__):
@@ -124,6 +128,25 @@ class RelativeTime(relativedelta.relativedelta,
     def __len__(self) -> int:
         return sum(1 for _ in iter(self))
 
+    def __neg__(self) -> Self:
+        # relativedelta's version passes microseconds, which this class
+        # doesn't take.
+        return type(self)(years=-self.years,
+                          months=-self.months,
+                          days=-self.days,
+                          hours=-self.hours,
+                          minutes=-self.minutes,
+                          seconds=-self.seconds,
+                          leapdays=self.leapdays,
+                          year=self.year,
+                          month=self.month,
+                          day=self.day,
+                          weekday=self.weekday,
+                          hour=self.hour,
+                          minute=self.minute,
+                          second=self.second,
+                          )
+
     def _to_dict(self) -> dict[str, int | WeekdayOffset]:
         d: dict[str, int | WeekdayOffset] = {}
         for key in self:
@@ -190,13 +213,11 @@ class RelativeTime(relativedelta.relativedelta,
                          seconds=self.seconds,
                          )
 
-    def _serialize(self, handler: SerializerFunctionWrapHandler) -> Any:
-        v: timedelta | dict[str, int | WeekdayOffset]
+    def _serialize(self) -> timedelta | dict[str, int | WeekdayOffset]:
         try:
-            v = self._to_timedelta()
+            return self._to_timedelta()
         except ValueError:
-            v = self._to_dict()
-        return handler(v)
+            return self._to_dict()
 
     @classmethod
     def __get_pydantic_core_schema__(cls,
@@ -218,15 +239,13 @@ class RelativeTime(relativedelta.relativedelta,
             if name == 'self':
                 continue
             param = sig.parameters[name]
-            field = FieldInfo.from_annotated_attribute(param.annotation,
-                                                       param.default)
             schema = core_schema.with_default_schema(
                     handler.generate_schema(param.annotation),
                     default=param.default,
                     )
             param_schemas.append(core_schema.arguments_parameter(
                     name, schema, mode='keyword_only'))
-            if not field.exclude:
+            if not _is_excluded(param.annotation):
                 ser_param_schemas[name] = core_schema.typed_dict_field(schema)
 
         class_call_schema = core_schema.call_schema(
@@ -240,7 +259,11 @@ class RelativeTime(relativedelta.relativedelta,
                 json_schema=full_schema,
                 python_schema=core_schema.union_schema(
                     [core_schema.is_instance_schema(cls), full_schema]),
-                serialization=core_schema.wrap_serializer_function_ser_schema(
+                # This needs to be a plain serializer that relies on
+                # return_schema: a wrap serializer's handler would be given
+                # this type's own schema, which can't serialize the timedelta
+                # or dict, and that breaks when this type is part of a union.
+                serialization=core_schema.plain_serializer_function_ser_schema(
                     cls._serialize,
                     return_schema=core_schema.union_schema([
                         core_schema.timedelta_schema(),
@@ -0,0 +1,274 @@
+from functools import cache
+from types import TracebackType
+from typing import Annotated, Any, Callable, Literal, Optional, Self
+from uuid import UUID
+
+from pydantic import TypeAdapter
+
+import localtime
+from task import Task, TaskList, TaskState
+
+# Batches changes to many tasks in a TaskList.  Nothing changes until the
+# transaction is committed.  At that point every change is applied at once,
+# the rules about which states a task's children can be in are checked once
+# over everything that was touched, and the indexes, rollups and cached
+# serializations are updated in bulk.  If any rule is broken, every change is
+# undone and a ValueError is raised.  The on_commit callback, if there is
+# one, is called once after a successful commit, so the list is only saved
+# once however many tasks changed.
+#
+#     with Transaction(tasklist, on_commit=save) as txn:
+#         for uuid in finished:
+#             txn.done(uuid)
+
+_Operation = (tuple[Literal['set'], UUID, dict[str, Any]]
+              | tuple[Literal['move'], UUID, Optional[UUID], Optional[int]])
+
+# Changing these would corrupt the TaskList's structure; use move instead of
+# setting children.
+_UNSETTABLE_FIELDS = frozenset(('uuid', 'children'))
+
+
+@cache
+def _field_adapter(name: str) -> TypeAdapter[Any]:
+    # Validates a value for one of Task's fields the same way validating a
+    # whole Task would.
+    field = Task.model_fields[name]
+    annotation = field.annotation
+    if field.metadata:
+        annotation = Annotated[annotation, *field.metadata]
+    return TypeAdapter(annotation)
+
+
+class Transaction:
+    def __init__(self,
+                 tasklist: TaskList,
+                 on_commit: Optional[Callable[[TaskList], None]] = None,
+                 ) -> None:
+        self.tasklist = tasklist
+        self.on_commit = on_commit
+        self._operations: list[_Operation] = []
+        self._finished = False
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(self,
+                 exc_type: Optional[type[BaseException]],
+                 exc_value: Optional[BaseException],
+                 traceback: Optional[TracebackType],
+                 ) -> None:
+        if exc_type is None:
+            self.commit()
+        else:
+            self.rollback()
+
+    def _check_open(self) -> None:
+        if self._finished:
+            raise RuntimeError('Transaction has already finished')
+
+    def set(self, uuid: UUID, **fields: Any) -> None:
+        # Values are validated now, so a bad one is reported where it was
+        # given rather than when the transaction commits.
+        self._check_open()
+        for name in fields:
+            if name in _UNSETTABLE_FIELDS or name not in Task.model_fields:
+                raise ValueError(f'Cannot set {name!r} in a transaction')
+        fields = {name: _field_adapter(name).validate_python(value)
+                  for name, value in fields.items()}
+        self._operations.append(('set', uuid, fields))
+
+    def set_state(self, uuid: UUID, state: TaskState) -> None:
+        self.set(uuid, state=state)
+
+    def done(self, uuid: UUID) -> None:
+        self.set_state(uuid, 'done')
+
+    def drop(self, uuid: UUID) -> None:
+        self.set_state(uuid, 'dropped')
+
+    def move(self, uuid: UUID, parent: Optional[UUID],
+             index: Optional[int] = None) -> None:
+        # Moves a task to be a child of another, or to the top level if
+        # parent is None, at the given position or at the end.
+        self._check_open()
+        self._operations.append(('move', uuid, parent, index))
+
+    def rollback(self) -> None:
+        self._operations.clear()
+        self._finished = True
+
+    def commit(self) -> None:
+        self._check_open()
+        self._finished = True
+        if self._operations:
+            _Commit(self.tasklist, self._operations).run()
+            if self.on_commit is not None:
+                self.on_commit(self.tasklist)
+
+
+class _Commit:
+    def __init__(self, tasklist: TaskList, operations: list[_Operation],
+                 ) -> None:
+        self.tasklist = tasklist
+        self.operations = operations
+        # Tasks whose fields change, and tasks whose children change.
+        self.changed: dict[UUID, Task] = {}
+        self.reparented: dict[UUID, Task] = {}
+        # Tasks whose changes alter the urgency of everything below them.
+        self.inheritance_changed: dict[UUID, Task] = {}
+        self.structure_changed = False
+        self.undo: list[Callable[[], None]] = []
+
+    def _task(self, uuid: UUID) -> Task:
+        try:
+            return self.tasklist._tasks_by_uuid[uuid]
+        except KeyError:
+            raise ValueError(f'No task with UUID {uuid}') from None
+
+    def _siblings(self, parent: Optional[Task]) -> list[Task]:
+        if parent is None:
+            return self.tasklist.tasks
+        return parent.children
+
+    def run(self) -> None:
+        # Resolve everything first, so an unknown UUID fails before any
+        # changes are made.
+        for op in self.operations:
+            self._task(op[1])
+            if op[0] == 'move' and op[2] is not None:
+                self._task(op[2])
+
+        touched = {op[1]: self._task(op[1]) for op in self.operations}
+        for task in touched.values():
+            self.tasklist._unindex_task(task)
+        indexed: list[Task] = []
+        try:
+            for op in self.operations:
+                if op[0] == 'set':
+                    self._apply_set(self._task(op[1]), op[2])
+                else:
+                    self._apply_move(self._task(op[1]),
+                                     None if op[2] is None
+                                     else self._task(op[2]),
+                                     op[3])
+            self._check_states()
+            for task in touched.values():
+                self.tasklist._index_task(task)
+                indexed.append(task)
+        except BaseException:
+            # Take the tasks out of the indexes in whatever state they were
+            # indexed in, undo everything, and index them as they were.
+            for task in indexed:
+                self.tasklist._unindex_task(task)
+            for undo in reversed(self.undo):
+                undo()
+            for task in touched.values():
+                self.tasklist._index_task(task)
+            raise
+        self._refresh()
+
+    def _apply_set(self, task: Task, fields: dict[str, Any]) -> None:
+        fields = dict(fields)
+        if 'state' in fields and 'ended' not in fields:
+            # The same rule as Task._clear_ended_if_invalid.
+            if fields['state'] in ('todo', 'placeholder'):
+                fields['ended'] = None
+            elif task.ended is None or task.state != fields['state']:
+                fields['ended'] = localtime.now()
+        if 'tags' in fields:
+            self.tasklist.tag_mask(fields['tags'])
+
+        # Write straight to the model's fields: the per-assignment bookkeeping
+        # in Task.__setattr__ is done once for everything in _refresh.
+        values = task.__dict__
+        old = {name: values[name] for name in fields}
+        values.update({name: task._tracked(name, value)
+                       for name, value in fields.items()})
+        self.undo.append(lambda: values.update(old))
+        self.changed[task.uuid] = task
+        if not Task._inherited_fields.isdisjoint(fields):
+            self.inheritance_changed[task.uuid] = task
+
+    def _apply_move(self, task: Task, parent: Optional[Task],
+                    index: Optional[int]) -> None:
+        ancestor = parent
+        while ancestor is not None:
+            if ancestor is task:
+                raise ValueError(f'Cannot move task {task.uuid} below itself')
+            ancestor = ancestor._parent
+
+        old_parent = task._parent
+        old_siblings = self._siblings(old_parent)
+        old_index = next(i for i, t in enumerate(old_siblings) if t is task)
+        del old_siblings[old_index]
+        new_siblings = self._siblings(parent)
+        if index is None:
+            new_siblings.append(task)
+        else:
+            new_siblings.insert(index, task)
+        task._parent = parent
+
+        def undo() -> None:
+            new_siblings.remove(task)
+            old_siblings.insert(old_index, task)
+            task._parent = old_parent
+        self.undo.append(undo)
+
+        self.reparented[task.uuid] = task
+        self.inheritance_changed[task.uuid] = task
+        for t in (old_parent, parent):
+            if t is not None:
+                self.changed[t.uuid] = t
+        self.structure_changed = True
+
+    def _check_states(self) -> None:
+        problems: list[str] = []
+        checked: set[tuple[UUID, UUID]] = set()
+
+        def check(parent: Task, child: Task) -> None:
+            if (parent.uuid, child.uuid) in checked:
+                return
+            checked.add((parent.uuid, child.uuid))
+            if child.state not in parent._valid_child_states():
+                problems.append(f'Task {child.uuid} cannot be {child.state} '
+                                f'under {parent.state} task {parent.uuid}')
+
+        for task in (*self.changed.values(), *self.reparented.values()):
+            if task._parent is not None:
+                check(task._parent, task)
+            for child in task.children:
+                check(task, child)
+        if problems:
+            raise ValueError('; '.join(problems))
+
+    def _refresh(self) -> None:
+        tasklist = self.tasklist
+        for task in (*self.changed.values(), *self.reparented.values()):
+            task.mark_dirty()
+        if self.structure_changed:
+            tasklist.mark_dirty()
+
+        if tasklist._rollups_stale:
+            return
+        # Moved tasks may inherit different urgency settings now, so their
+        # whole subtrees need recomputing, as do those of tasks whose
+        # inherited settings changed.  After that, every changed task and all
+        # their ancestors need recomputing, deepest first so each is done
+        # after its children.
+        for task in self.inheritance_changed.values():
+            tasklist._compute_subtree_rollups(task)
+        depths: dict[UUID, tuple[int, Task]] = {}
+        for task in (*self.changed.values(), *self.reparented.values()):
+            ancestors = []
+            t = task._parent
+            while t is not None:
+                ancestors.append(t)
+                t = t._parent
+            for depth, t in enumerate(reversed(ancestors)):
+                depths[t.uuid] = (depth, t)
+            if task.uuid in self.changed:
+                depths.setdefault(task.uuid, (len(ancestors), task))
+        for _, task in sorted(depths.values(), key=lambda d: d[0],
+                              reverse=True):
+            task._rollup = tasklist._compute_rollup(task)
@@ -0,0 +1,318 @@
+import argparse
+import ctypes
+import ctypes.util
+import hashlib
+import json
+import os
+import select
+import struct
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Iterator, Optional, TypeVar
+
+from pydantic import ValidationError
+
+from instrumentation import timed
+from task import Task, TaskList, TaskRecurrenceSchedule
+
+# Reloads a task list file each time it changes, for long-running views of a
+# file that's being edited by hand.  Each top-level task and schedule is
+# fingerprinted by a hash of its JSON, and only the ones whose fingerprints
+# are new are validated and indexed: everything else keeps the models, and
+# the caches on them, from the previous load.  If anything other than the
+# tasks and schedules changes, the rest of the list is validated again and
+# every task re-indexed against it, but the unchanged models are still kept.
+#
+# Changes are picked up with inotify where it's available, and by polling the
+# file's size and modification time where it isn't.
+
+T = TypeVar('T', Task, TaskRecurrenceSchedule)
+
+_FIELDS = ('tasks', 'recurring_tasks')
+
+
+def _alias(name: str) -> str:
+    return TaskList.model_fields[name].alias or name
+
+
+def _fingerprint(document: Any) -> bytes:
+    data = json.dumps(document, sort_keys=True, separators=(',', ':'))
+    return hashlib.blake2b(data.encode(), digest_size=16).digest()
+
+
+def _items(document: dict[str, Any], name: str) -> list[Any]:
+    # The top-level items in the document, which may be given as a single
+    # item rather than a list.
+    value = document.get(_alias(name), [])
+    return value if isinstance(value, list) else [value]
+
+
+def _tags(root: Task | TaskRecurrenceSchedule) -> set[str]:
+    tags: set[str] = set()
+    to_process: list[Any] = [root]
+    while to_process:
+        item = to_process.pop()
+        tags.update(getattr(item, 'tags', ()))
+        if isinstance(item, TaskRecurrenceSchedule):
+            to_process.extend(item.tasks)
+        else:
+            to_process.extend(item.children)
+    return tags
+
+
+class Reloader:
+    def __init__(self) -> None:
+        self.tasklist: Optional[TaskList] = None
+        self._shell_fingerprint: Optional[bytes] = None
+        # The models from the last load, by fingerprint.  Identical items
+        # each have their own model, in the order they appear.
+        self._tasks: dict[bytes, list[Task]] = {}
+        self._schedules: dict[bytes, list[TaskRecurrenceSchedule]] = {}
+        # How many top-level tasks and schedules the last load validated.
+        self.revalidated = 0
+
+    def _match(self, model: type[T], documents: list[Any],
+               previous: dict[bytes, list[T]],
+               ) -> tuple[dict[bytes, list[T]], list[T], list[T]]:
+        # The models for the documents by fingerprint and in order, reusing
+        # previous ones where the fingerprints match, and the ones that are
+        # new.  Each previous model is only reused once, so identical
+        # documents still get a model each, as they would from validating
+        # the whole list.
+        available = {f: iter(models) for f, models in previous.items()}
+        current: dict[bytes, list[T]] = {}
+        items: list[T] = []
+        new: list[T] = []
+        for document in documents:
+            fingerprint = _fingerprint(document)
+            item = next(available.get(fingerprint, iter(())), None)
+            if item is None:
+                item = model.model_validate(document)
+                new.append(item)
+            current.setdefault(fingerprint, []).append(item)
+            items.append(item)
+        return current, items, new
+
+    @timed('validation.task_list.reload')
+    def load(self, data: bytes | str) -> TaskList:
+        # Loads the list from the file's contents, reusing what it can from
+        # the last load.  The list is only changed once everything has
+        # validated, so a failed load leaves the last one in place.
+        document = json.loads(data)
+        shell_document = {k: v for k, v in document.items()
+                          if k not in {_alias(f) for f in _FIELDS}}
+        shell_fingerprint = _fingerprint(shell_document)
+        tasks, task_items, new_tasks = self._match(
+                Task, _items(document, 'tasks'), self._tasks)
+        schedules, schedule_items, new_schedules = self._match(
+                TaskRecurrenceSchedule, _items(document, 'recurring_tasks'),
+                self._schedules)
+        self.revalidated = len(new_tasks) + len(new_schedules)
+
+        tasklist = self.tasklist
+        if tasklist is None or shell_fingerprint != self._shell_fingerprint:
+            shell_document['tasks'] = []
+            shell = TaskList.model_validate(shell_document)
+            known_tags = set(shell._tag_ids)
+        else:
+            shell = None
+            known_tags = set(tasklist._tag_ids)
+        # Tags are otherwise only checked while indexing, after the list has
+        # been changed.
+        roots: list[Task | TaskRecurrenceSchedule] = [
+                *(task_items if shell is not None else new_tasks),
+                *(schedule_items if shell is not None else new_schedules)]
+        for root in roots:
+            unknown = _tags(root) - known_tags
+            if unknown:
+                raise ValueError(
+                        f'Unknown tags {sorted(unknown)} in {root.uuid}')
+
+        if tasklist is None or shell is not None:
+            tasklist = self._replace_shell(shell, task_items, schedule_items)
+        else:
+            self._update(tasklist, task_items, new_tasks,
+                         schedule_items, new_schedules)
+        self.tasklist = tasklist
+        self._shell_fingerprint = shell_fingerprint
+        self._tasks = tasks
+        self._schedules = schedules
+        return tasklist
+
+    def _replace_shell(self, shell: TaskList,
+                       tasks: list[Task],
+                       schedules: list[TaskRecurrenceSchedule],
+                       ) -> TaskList:
+        # Puts the tasks and schedules into the newly-validated list, and
+        # indexes them, as validating the whole list would.  Nothing from the
+        # list itself is in the top-level models' serializations, so their
+        # caches stay valid.
+        shell.__dict__['tasks'] = shell._tracked('tasks', tasks)
+        shell.__dict__['recurring_tasks'] = shell._tracked('recurring_tasks',
+                                                           schedules)
+        shell._set_task_tasklist()
+        shell._set_schedule_tasklist()
+        return shell
+
+    def _update(self, tasklist: TaskList,
+                tasks: list[Task], new_tasks: list[Task],
+                schedules: list[TaskRecurrenceSchedule],
+                new_schedules: list[TaskRecurrenceSchedule],
+                ) -> None:
+        # Swaps the changed tasks and schedules in the existing list.  A
+        # changed item has a new fingerprint, so the old model is removed and
+        # the new one added in its place.
+        kept = {id(task) for task in tasks}
+        for task in tasklist.tasks:
+            if id(task) not in kept:
+                tasklist._remove_task_tree(task)
+        kept = {id(schedule) for schedule in schedules}
+        for schedule in tasklist.recurring_tasks:
+            if id(schedule) not in kept:
+                tasklist._remove_schedule(schedule)
+        tasklist.__dict__['tasks'] = tasklist._tracked('tasks', tasks)
+        tasklist.__dict__['recurring_tasks'] = tasklist._tracked(
+                'recurring_tasks', schedules)
+        for task in new_tasks:
+            tasklist._add_task_tree(task)
+            if not tasklist._rollups_stale:
+                tasklist._compute_subtree_rollups(task)
+        for schedule in new_schedules:
+            tasklist._add_schedule(schedule)
+        tasklist.mark_dirty()
+
+
+def _signature(path: Path) -> Optional[tuple[int, int, int]]:
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return st.st_ino, st.st_size, st.st_mtime_ns
+
+
+class _Poller:
+    def __init__(self, path: Path, interval: float) -> None:
+        self.path = path
+        self.interval = interval
+        self._signature = _signature(path)
+
+    def wait(self) -> None:
+        while True:
+            time.sleep(self.interval)
+            signature = _signature(self.path)
+            if signature != self._signature:
+                self._signature = signature
+                return
+
+    def close(self) -> None:
+        pass
+
+
+class _Inotify:
+    # Watches the file's directory rather than the file, as editors often
+    # save by writing a new file and renaming it over the old one.
+    _IN_CLOSE_WRITE = 0x008
+    _IN_MOVED_TO = 0x080
+    _IN_CREATE = 0x100
+    _EVENT = struct.Struct('iIII')
+    # Time to wait for the rest of a burst of events from one save.
+    _SETTLE = 0.05
+
+    def __init__(self, path: Path) -> None:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        self.path = path
+        self._fd = libc.inotify_init1(os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        mask = self._IN_CLOSE_WRITE | self._IN_MOVED_TO | self._IN_CREATE
+        directory = os.fsencode(path.parent.resolve())
+        if libc.inotify_add_watch(self._fd, directory, mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self._fd)
+            raise OSError(errno, 'inotify_add_watch failed')
+
+    def _names(self) -> Iterator[bytes]:
+        data = os.read(self._fd, 64 * 1024)
+        offset = 0
+        while offset < len(data):
+            _, _, _, length = self._EVENT.unpack_from(data, offset)
+            offset += self._EVENT.size
+            yield data[offset:offset + length].rstrip(b'\0')
+            offset += length
+
+    def wait(self) -> None:
+        name = os.fsencode(self.path.name)
+        while True:
+            select.select([self._fd], [], [])
+            if name in self._names():
+                break
+        while select.select([self._fd], [], [], self._SETTLE)[0]:
+            list(self._names())
+
+    def close(self) -> None:
+        os.close(self._fd)
+
+
+def _watcher(path: Path, interval: float) -> _Poller | _Inotify:
+    if sys.platform.startswith('linux'):
+        try:
+            return _Inotify(path)
+        except (OSError, AttributeError):
+            # No inotify in this libc, or no watches left.
+            pass
+    return _Poller(path, interval)
+
+
+def watch(path: Path | str,
+          interval: float = 1.0,
+          on_error: Optional[Callable[[Exception], None]] = None,
+          ) -> Iterator[TaskList]:
+    # Yields the task list, and then the list again each time the file
+    # changes.  If there's no error handler, a file that fails to load
+    # stops the watch; with one, the error is passed to it and the watch
+    # waits for the next change.  The list yielded is the same object from
+    # one change to the next unless something outside the tasks and
+    # schedules changed.
+    path = Path(path)
+    reloader = Reloader()
+    yield reloader.load(path.read_bytes())
+    watcher = _watcher(path, interval)
+    try:
+        while True:
+            watcher.wait()
+            try:
+                tasklist = reloader.load(path.read_bytes())
+            except (OSError, ValueError, ValidationError) as e:
+                if on_error is None:
+                    raise
+                on_error(e)
+                continue
+            yield tasklist
+    finally:
+        watcher.close()
+
+
+def main(argv: Optional[list[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+            description='Reload a task list each time it changes')
+    parser.add_argument('tasklist', type=Path)
+    parser.add_argument('--interval', type=float, default=1.0,
+                        help='Seconds between checks where inotify is not '
+                             'available (default %(default)s)')
+    args = parser.parse_args(argv)
+
+    def report(e: Exception) -> None:
+        print(f'Failed to reload: {e}', file=sys.stderr)
+
+    try:
+        for tasklist in watch(args.tasklist, args.interval, report):
+            count = sum(1 for _ in tasklist.all_tasks())
+            print(f'Loaded {count} tasks')
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -56,7 +56,7 @@ class _dateutilWeekdayOffsetAnnotation(Generic[WDT]):
     def _serialize(wd: weekday,
                    handler: SerializerFunctionWrapHandler,
                    ) -> DayName | dict[DayName, int]:
-        name = cast(DayName, str(WeekdayName._from_weekday))
+        name = cast(DayName, str(WeekdayName._from_weekday(wd)))
         if wd.n:
             return handler({name: wd.n})
         return handler(name)
@@ -0,0 +1,219 @@
+import dataclasses
+import random
+from datetime import datetime, timedelta
+from typing import Any, Optional
+from uuid import UUID
+
+from task import TaskList, TaskState
+
+# Generates synthetic task lists for benchmarking.  Everything is driven by a
+# seeded random number generator, so the same spec always produces the same
+# document, and documents are built in their serialized (JSON) form so that
+# loading them exercises the same validation as loading a real file.
+
+_CHILD_STATES: dict[TaskState, tuple[TaskState, ...]] = {
+    'placeholder': ('placeholder', 'todo', 'done', 'dropped'),
+    'todo': ('todo', 'done', 'dropped'),
+    'done': ('done', 'dropped'),
+    'dropped': ('done', 'dropped'),
+    }
+
+_WORDS = ('write', 'review', 'fix', 'plan', 'call', 'email', 'buy', 'book',
+          'clean', 'update', 'report', 'meeting', 'budget', 'garden',
+          'invoice', 'design', 'release', 'holiday', 'doctor', 'car',
+          'kitchen', 'website', 'draft', 'tickets', 'backup', 'server',
+          )
+
+_FREQUENCIES = ('YEARLY', 'MONTHLY', 'WEEKLY', 'DAILY')
+_DAYS = ('MO', 'TU', 'WE', 'TH', 'FR', 'SA', 'SU')
+
+
+@dataclasses.dataclass(frozen=True, slots=True)
+class WorkloadSpec:
+    tasks: int = 1000
+    max_depth: int = 4
+    max_children: int = 8
+    # Probability that a task starts a new tree rather than being added as
+    # a child of an existing task.
+    top_level_fraction: float = 0.2
+    # Expected number of requires and blocks links per task.
+    dependency_density: float = 0.05
+    tags: int = 20
+    max_tags_per_task: int = 3
+    tagged_urgency_fraction: float = 0.25
+    due_fraction: float = 0.3
+    wait_fraction: float = 0.1
+    # Proportions of new top-level tasks by state; children are then picked
+    # from the states their parent allows.
+    state_weights: tuple[float, float, float, float] = (0.05, 0.55, 0.3, 0.1)
+    schedules: int = 50
+    max_templates_per_schedule: int = 3
+    # Relative weights of RelativeTime, SimpleRecurrence and
+    # ComplexRecurrence schedules.
+    schedule_mix: tuple[float, float, float] = (0.3, 0.5, 0.2)
+    seed: int = 0
+    now: datetime = datetime(2024, 6, 1, 12).astimezone()
+
+
+class _Generator:
+    def __init__(self, spec: WorkloadSpec) -> None:
+        self.spec = spec
+        self.rng = random.Random(spec.seed)
+        self.tag_names = [f'tag{i}' for i in range(spec.tags)]
+
+    def uuid(self) -> str:
+        return str(UUID(int=self.rng.getrandbits(128), version=4))
+
+    def title(self) -> str:
+        n = self.rng.randint(2, 5)
+        return ' '.join(self.rng.choice(_WORDS) for _ in range(n)).capitalize()
+
+    def time(self, days_before: float, days_after: float) -> datetime:
+        offset = self.rng.uniform(-days_before, days_after)
+        return self.spec.now + timedelta(days=offset)
+
+    def when(self, days_before: float, days_after: float) -> str:
+        # A mix of dates and datetimes, as real files have both.
+        t = self.time(days_before, days_after)
+        if self.rng.random() < 0.5:
+            return t.date().isoformat()
+        return t.replace(microsecond=0).isoformat()
+
+    def tags(self) -> list[str]:
+        if not self.tag_names:
+            return []
+        n = self.rng.randint(0, min(self.spec.max_tags_per_task,
+                                    len(self.tag_names)))
+        return self.rng.sample(self.tag_names, n)
+
+    def task(self, state: TaskState) -> dict[str, Any]:
+        spec = self.spec
+        created = self.time(730, 0)
+        task: dict[str, Any] = {'title': self.title(),
+                                'uuid': self.uuid(),
+                                'state': state,
+                                'created': created.isoformat(),
+                                }
+        if state in ('done', 'dropped'):
+            ended = created + (spec.now - created) * self.rng.random()
+            task['ended'] = ended.isoformat()
+        if self.rng.random() < spec.due_fraction:
+            task['due'] = self.when(30, 90)
+        if self.rng.random() < spec.wait_fraction:
+            task['wait'] = self.when(10, 30)
+        tags = self.tags()
+        if tags:
+            task['tags'] = tags
+        return task
+
+    def tasks(self) -> list[dict[str, Any]]:
+        spec = self.spec
+        roots: list[dict[str, Any]] = []
+        all_tasks: list[dict[str, Any]] = []
+        # Tasks that can still take children, with their depth.
+        open_parents: list[tuple[dict[str, Any], int]] = []
+
+        for _ in range(spec.tasks):
+            if not open_parents or self.rng.random() < spec.top_level_fraction:
+                state = self.rng.choices(tuple(_CHILD_STATES),
+                                         spec.state_weights)[0]
+                task = self.task(state)
+                roots.append(task)
+                depth = 1
+            else:
+                i = self.rng.randrange(len(open_parents))
+                parent, parent_depth = open_parents[i]
+                task = self.task(self.rng.choice(
+                    _CHILD_STATES[parent['state']]))
+                children = parent.setdefault('children', [])
+                children.append(task)
+                if len(children) >= spec.max_children:
+                    open_parents[i] = open_parents[-1]
+                    open_parents.pop()
+                depth = parent_depth + 1
+            all_tasks.append(task)
+            if depth < spec.max_depth:
+                open_parents.append((task, depth))
+
+        uuids = [t['uuid'] for t in all_tasks]
+        if len(uuids) > 1:
+            links = int(len(uuids) * spec.dependency_density)
+            for field in ('requires', 'blocks'):
+                for _ in range(links):
+                    task, other = self.rng.sample(all_tasks, 2)
+                    task.setdefault(field, []).append(other['uuid'])
+        return roots
+
+    def simple_recurrence(self) -> dict[str, Any]:
+        freq = self.rng.choice(_FREQUENCIES)
+        rule: dict[str, Any] = {'freq': freq,
+                                'dtstart': self.time(365, 0).replace(
+                                    microsecond=0).isoformat(),
+                                }
+        if self.rng.random() < 0.3:
+            rule['interval'] = self.rng.randint(2, 4)
+        if freq == 'WEEKLY':
+            rule['byweekday'] = self.rng.sample(_DAYS, self.rng.randint(1, 3))
+        elif freq == 'MONTHLY':
+            rule['bymonthday'] = self.rng.randint(1, 28)
+        elif freq == 'YEARLY':
+            rule['bymonth'] = self.rng.randint(1, 12)
+        return rule
+
+    def schedule(self) -> dict[str, Any]:
+        kind = self.rng.choices(('relative', 'simple', 'complex'),
+                                self.spec.schedule_mix)[0]
+        schedule: Any
+        match kind:
+            case 'relative':
+                schedule = self.rng.choice(
+                        (f'P{self.rng.randint(1, 30)}D',
+                         f'P{self.rng.randint(1, 6)}M',
+                         f'P{self.rng.randint(1, 4)}W',
+                         ))
+            case 'simple':
+                schedule = self.simple_recurrence()
+            case 'complex':
+                schedule = {'rrules': [self.simple_recurrence()
+                                       for _ in range(self.rng.randint(1, 2))],
+                            'exdates': [self.time(0, 365).replace(
+                                microsecond=0).isoformat()],
+                            'rdates': [self.time(0, 365).replace(
+                                microsecond=0).isoformat()],
+                            }
+
+        templates = []
+        for _ in range(self.rng.randint(1, self.spec.max_templates_per_schedule)):
+            template: dict[str, Any] = {'title': self.title(),
+                                        'uuid': self.uuid(),
+                                        }
+            tags = self.tags()
+            if tags:
+                template['tags'] = tags
+            if self.rng.random() < 0.3:
+                template['due'] = f'P{self.rng.randint(1, 14)}D'
+            templates.append(template)
+        return {'uuid': self.uuid(), 'schedule': schedule, 'tasks': templates}
+
+    def document(self) -> dict[str, Any]:
+        tags: list[Any] = []
+        for name in self.tag_names:
+            if self.rng.random() < self.spec.tagged_urgency_fraction:
+                tags.append({'name': name,
+                             'urgencyFactor': round(self.rng.uniform(-2, 5), 2),
+                             })
+            else:
+                tags.append(name)
+        return {'tasks': self.tasks(),
+                'recurringTasks': [self.schedule()
+                                   for _ in range(self.spec.schedules)],
+                'tags': tags,
+                }
+
+
+def generate_document(spec: Optional[WorkloadSpec] = None) -> dict[str, Any]:
+    return _Generator(spec or WorkloadSpec()).document()
+
+
+def generate(spec: Optional[WorkloadSpec] = None) -> TaskList:
+    return TaskList.model_validate(generate_document(spec))